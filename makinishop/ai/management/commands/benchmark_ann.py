@@ -0,0 +1,47 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from ai.services.ann import IVFIndex, default_nlist, recall_at_k, train_centroids
+from ai.services.vector_index import EmbeddingIndex
+
+
+class Command(BaseCommand):
+    help = "Measure IVF recall@k and latency against exact search over the product embeddings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--queries", type=int, default=200, help="Products sampled as queries")
+        parser.add_argument("--nlist", type=int, default=0, help="0 = sqrt(number of products)")
+        parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        index = EmbeddingIndex.from_db()
+        if not len(index):
+            raise CommandError("No product embeddings to benchmark.")
+
+        rng = np.random.default_rng(options["seed"])
+        sample = rng.choice(len(index), min(options["queries"], len(index)), replace=False)
+        queries = index.matrix[sample]
+        k = options["k"]
+
+        started = time.perf_counter()
+        exact = index.top_k_batch(queries, k=k, exact=True)
+        exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+        self.stdout.write(f"{len(index)} products, {len(queries)} queries, k={k}")
+        self.stdout.write(f"exact: {exact_ms:.3f} ms/query")
+
+        nlist = options["nlist"] or default_nlist(len(index))
+        started = time.perf_counter()
+        index.ann = IVFIndex(train_centroids(index.matrix, nlist), index.matrix)
+        self.stdout.write(f"ivf: trained nlist={index.ann.nlist} in {time.perf_counter() - started:.2f}s")
+
+        for nprobe in options["nprobe"]:
+            started = time.perf_counter()
+            approx = index.top_k_batch(queries, k=k, nprobe=nprobe)
+            approx_ms = (time.perf_counter() - started) * 1000 / len(queries)
+            self.stdout.write(
+                f"ivf nprobe={nprobe:<4} recall@{k}={recall_at_k(exact, approx):.3f} {approx_ms:.3f} ms/query"
+            )
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:15
+
+import numpy as np
+import pgvector.django.indexes
+import pgvector.django.vector
+from django.db import migrations
+from pgvector.django import VectorExtension
+
+BATCH_SIZE = 1000
+
+
+def copy_bytes_to_vectors(apps, schema_editor):
+    for model_name in ("ProductEmbedding", "UserEmbedding"):
+        model = apps.get_model("ai", model_name)
+        batch = []
+        for row in model.objects.only("id", "embedding").iterator(chunk_size=BATCH_SIZE):
+            vector = np.frombuffer(bytes(row.embedding), dtype=np.float32)
+            if vector.shape != (128,):
+                continue
+            row.embedding_vector = vector
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_update(batch, ["embedding_vector"])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ["embedding_vector"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0001_initial"),
+        ("catalog", "0003_productimage_cloudinary_url"),
+    ]
+
+    operations = [
+        VectorExtension(),
+        migrations.AddField(
+            model_name="productembedding",
+            name="embedding_vector",
+            field=pgvector.django.vector.VectorField(
+                blank=True, dimensions=128, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="userembedding",
+            name="embedding_vector",
+            field=pgvector.django.vector.VectorField(
+                blank=True, dimensions=128, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productembedding",
+            index=pgvector.django.indexes.HnswIndex(
+                ef_construction=64,
+                fields=["embedding_vector"],
+                m=16,
+                name="ai_productemb_vector_hnsw",
+                opclasses=["vector_cosine_ops"],
+            ),
+        ),
+        migrations.RunPython(copy_bytes_to_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0002_pgvector_embeddings"),
+        ("catalog", "0003_productimage_cloudinary_url"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="productrecommendation",
+            name="ai_productr_product_682e33_idx",
+        ),
+        migrations.AlterUniqueTogether(
+            name="productrecommendation",
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name="productrecommendation",
+            index=models.Index(
+                fields=["product", "-score"], name="ai_productrec_product_score"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="productrecommendation",
+            constraint=models.UniqueConstraint(
+                fields=("user", "product", "recommended_product"),
+                name="ai_productrec_user_product_rec_uniq",
+                nulls_distinct=False,
+            ),
+        ),
+    ]
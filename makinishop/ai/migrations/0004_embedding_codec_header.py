@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:40
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+DIM = 128
+CODECS = ("float32", "float16", "int8")  # position = header byte
+
+
+def legacy_codec(raw):
+    # Rows written before the header existed are identified by their length.
+    if len(raw) == 2 * DIM:
+        return CODECS.index("float16")
+    if len(raw) == DIM + 4:
+        return CODECS.index("int8")
+    return CODECS.index("float32")
+
+
+def _rewrite(apps, convert):
+    for model_name in ("ProductEmbedding", "UserEmbedding"):
+        model = apps.get_model("ai", model_name)
+        batch = []
+        for row in model.objects.only("id", "embedding").iterator(chunk_size=BATCH_SIZE):
+            row.embedding = convert(bytes(row.embedding))
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_update(batch, ["embedding"])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ["embedding"])
+
+
+def add_codec_header(apps, schema_editor):
+    _rewrite(apps, lambda raw: bytes([legacy_codec(raw)]) + raw)
+
+
+def strip_codec_header(apps, schema_editor):
+    _rewrite(apps, lambda raw: raw[1:])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0003_productrecommendation_upserts"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_codec_header, strip_codec_header),
+    ]
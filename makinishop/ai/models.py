@@ -2,8 +2,11 @@ from django.db import models
 from django.conf import settings
 from catalog.models import Product
 from django.utils import timezone
+from pgvector.django import VectorField, HnswIndex
 import uuid
 
+VECTOR_DIM = 128  # embedding dimension shared by products and users
+
 # ==========================================================
 # PRODUCT RECOMMENDATION
 # ==========================================================
@@ -21,9 +24,16 @@ class ProductRecommendation(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
-        unique_together = ('user', 'product', 'recommended_product')
+        constraints = [
+            # NULLS NOT DISTINCT so item-to-item rows (user=NULL) can be upserted too
+            models.UniqueConstraint(
+                fields=['user', 'product', 'recommended_product'],
+                name='ai_productrec_user_product_rec_uniq',
+                nulls_distinct=False,
+            ),
+        ]
         indexes = [
-            models.Index(fields=['product']),
+            models.Index(fields=['product', '-score'], name='ai_productrec_product_score'),
             models.Index(fields=['user']),
         ]
 
@@ -39,9 +49,22 @@ class ProductEmbedding(models.Model):
         Product, on_delete=models.CASCADE, related_name='ai_embedding'
     )
     embedding = models.BinaryField()  # Serialized vector
+    # Native pgvector copy of `embedding`, searched in SQL when AI_EMBEDDING_STORAGE = 'pgvector'
+    embedding_vector = VectorField(dimensions=VECTOR_DIM, null=True, blank=True)
     model = models.CharField(max_length=255)
     updated_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            HnswIndex(
+                name='ai_productemb_vector_hnsw',
+                fields=['embedding_vector'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_cosine_ops'],
+            ),
+        ]
+
     def __str__(self):
         return f"Embedding: {self.product.name}"
 
@@ -54,6 +77,7 @@ class UserEmbedding(models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='ai_embedding'
     )
     embedding = models.BinaryField()
+    embedding_vector = VectorField(dimensions=VECTOR_DIM, null=True, blank=True)
     model = models.CharField(max_length=255)
     updated_at = models.DateTimeField(default=timezone.now)
 
@@ -33,3 +33,11 @@ class ChatSessionSerializer(serializers.ModelSerializer):
 class ChatbotRequestSerializer(serializers.Serializer):
     message = serializers.CharField(help_text="The message to send to the chatbot")
     session_id = serializers.IntegerField(required=False, help_text="Optional session ID to continue a conversation")
+
+
+class BatchUserRecommendationRequestSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=1000,
+        help_text="IDs of the users to score in one batch"
+    )
+    limit = serializers.IntegerField(required=False, default=10, min_value=1, max_value=100)
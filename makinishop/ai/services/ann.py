@@ -0,0 +1,100 @@
+"""
+Inverted-file (IVF) approximate nearest-neighbour search for product embeddings.
+
+A spherical k-means coarse quantizer splits the catalog into ``nlist`` cells.
+A query only scores the products in its ``nprobe`` closest cells, trading a
+little recall for a large cut in work. Only the trained centroids are
+shared (see ``ai.services.vector_index``): assigning products to cells is one
+matrix product, so a worker can rebuild the inverted lists from fresh
+embeddings whenever the index reloads.
+"""
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ASSIGN_BLOCK_SIZE = 4096
+
+
+def assign(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest (highest cosine) centroid for every row of ``matrix``."""
+    labels = np.empty(len(matrix), dtype=np.int64)
+    for start in range(0, len(matrix), ASSIGN_BLOCK_SIZE):
+        block = matrix[start:start + ASSIGN_BLOCK_SIZE]
+        labels[start:start + ASSIGN_BLOCK_SIZE] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def train_centroids(matrix: np.ndarray, nlist: int, n_iter: int = 15, seed: int = 0) -> np.ndarray:
+    """Spherical k-means over the (already normalised) rows of ``matrix``."""
+    rng = np.random.default_rng(seed)
+    nlist = max(1, min(nlist, len(matrix)))
+    centroids = matrix[rng.choice(len(matrix), nlist, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = assign(matrix, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, matrix)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty cells with random products so every list stays useful.
+            sums[empty] = matrix[rng.choice(len(matrix), int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+def default_nlist(n: int) -> int:
+    return max(1, int(np.sqrt(n)))
+
+
+class IVFIndex:
+    """Inverted lists over the rows of an ``EmbeddingIndex`` matrix."""
+
+    def __init__(self, centroids: np.ndarray, matrix: np.ndarray, nprobe: int = 8):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.nprobe = nprobe
+        labels = assign(matrix, self.centroids)
+        self.list_rows = np.argsort(labels, kind="stable")
+        self.offsets = np.searchsorted(labels[self.list_rows], np.arange(len(self.centroids) + 1))
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Row positions stored in the ``nprobe`` cells closest to ``query``."""
+        nprobe = min(nprobe, self.nlist)
+        cell_scores = self.centroids @ query
+        cells = np.argpartition(-cell_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([self.list_rows[self.offsets[c]:self.offsets[c + 1]] for c in cells])
+
+    def search_batch(self, matrix, ids, queries, k, excluded_rows=(), nprobe=None):
+        """Approximate counterpart of ``EmbeddingIndex.top_k_batch``; ``queries`` must be normalised."""
+        nprobe = nprobe or self.nprobe
+        excluded_rows = np.asarray(list(excluded_rows), dtype=np.int64)
+        results = []
+        for query in queries:
+            rows = self.candidates(query, nprobe)
+            if len(excluded_rows):
+                rows = rows[~np.isin(rows, excluded_rows)]
+            kk = min(k, len(rows))
+            if kk <= 0:
+                results.append(([], []))
+                continue
+            scores = matrix[rows] @ query
+            top = np.argpartition(-scores, kk - 1)[:kk]
+            top = top[np.argsort(-scores[top])]
+            results.append((ids[rows[top]].tolist(), scores[top].tolist()))
+        return results
+
+
+def recall_at_k(exact_results, approx_results) -> float:
+    """Mean fraction of the exact top-k ids that the approximate search also returned."""
+    hits = total = 0
+    for (exact_ids, _), (approx_ids, _) in zip(exact_results, approx_results):
+        hits += len(set(exact_ids) & set(approx_ids))
+        total += len(exact_ids)
+    return hits / total if total else 1.0
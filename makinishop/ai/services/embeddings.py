@@ -1,40 +1,130 @@
+"""
+Streaming, bulk recomputation of product and user embeddings.
+
+Rows are streamed in primary-key order with ``.iterator()``, embedded a
+batch at a time and upserted with one ``bulk_create(update_conflicts=True)``
+per batch. The last committed primary key is checkpointed in the cache so an
+interrupted run resumes where it stopped instead of starting over.
+"""
+import logging
+import time
+
 import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
 from catalog.models import Product
-from ai.models import ProductEmbedding, UserEmbedding
+from ai.models import ProductEmbedding, UserEmbedding, VECTOR_DIM
 from users.models import UserAccount
-from django.db import transaction
+from .quantization import encode_embedding
+from .vector_index import bump_index_version, publish_snapshot
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+PRODUCT_MODEL = 'mock-product-v1'
+USER_MODEL = 'mock-user-v1'
+CHECKPOINT_KEY = 'ai:embeddings:checkpoint:{kind}:{start}:{end}'
+CHECKPOINT_TIMEOUT = 60 * 60 * 24
+
+
+def generate_product_embeddings(texts) -> np.ndarray:
+    """One row per product text (``name + description``)."""
+    texts = [text.lower() for text in texts]
+    return np.random.rand(len(texts), VECTOR_DIM).astype(np.float32)  # mock embedding
+
+
+def generate_user_embeddings(user_ids) -> np.ndarray:
+    return np.random.rand(len(user_ids), VECTOR_DIM).astype(np.float32)
+
 
-VECTOR_DIM = 128  # example dimension
-
-def generate_product_embedding(product: Product) -> np.ndarray:
-    text_features = (product.name + " " + product.description).lower()
-    vector = np.random.rand(VECTOR_DIM).astype(np.float32)  # mock embedding
-    return vector
-
-def generate_user_embedding(user: UserAccount) -> np.ndarray:
-    vector = np.random.rand(VECTOR_DIM).astype(np.float32)
-    return vector
-
-def update_product_embeddings():
-    products = Product.objects.all()
-    for product in products:
-        vector = generate_product_embedding(product)
-        ProductEmbedding.objects.update_or_create(
-            product=product,
-            defaults={
-                'embedding': vector.tobytes(),
-                'model': 'mock-product-v1'
-            }
+def _checkpoint_key(kind, start_id, end_id):
+    return CHECKPOINT_KEY.format(kind=kind, start=start_id or '', end=end_id or '')
+
+
+def _recompute(kind, queryset, embed, build, unique_field, update_fields, batch_size, start_id, end_id, resume):
+    """Shared driver: stream ``queryset`` rows, embed and upsert them batch by batch."""
+    key = _checkpoint_key(kind, start_id, end_id)
+    cursor = cache.get(key) if resume else None
+    if cursor is not None:
+        queryset = queryset.filter(pk__gt=cursor)
+        logger.info(f"{kind} embeddings: resuming after pk {cursor}")
+    elif start_id is not None:
+        queryset = queryset.filter(pk__gte=start_id)
+    if end_id is not None:
+        queryset = queryset.filter(pk__lt=end_id)
+
+    stats = {'kind': kind, 'rows': 0, 'batches': 0, 'resumed_from': cursor}
+    started = time.perf_counter()
+
+    def flush(batch):
+        vectors = embed(batch)
+        now = timezone.now()
+        objs = [build(row, vector, now) for row, vector in zip(batch, vectors)]
+        with transaction.atomic():
+            type(objs[0]).objects.bulk_create(
+                objs, update_conflicts=True, unique_fields=[unique_field], update_fields=update_fields
+            )
+        last_pk = batch[-1][0]
+        cache.set(key, last_pk, timeout=CHECKPOINT_TIMEOUT)
+        stats['rows'] += len(batch)
+        stats['batches'] += 1
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"{kind} embeddings: {stats['rows']} rows up to pk {last_pk} "
+            f"({stats['rows'] / elapsed if elapsed else 0:.0f} rows/s)"
         )
 
-def update_user_embeddings():
-    users = UserAccount.objects.all()
-    for user in users:
-        vector = generate_user_embedding(user)
-        UserEmbedding.objects.update_or_create(
-            user=user,
-            defaults={
-                'embedding': vector.tobytes(),
-                'model': 'mock-user-v1'
-            }
-        )
\ No newline at end of file
+    batch = []
+    for row in queryset.order_by('pk').iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    cache.delete(key)
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+    stats['rows_per_sec'] = round(stats['rows'] / stats['seconds'], 1) if stats['seconds'] else 0.0
+    return stats
+
+
+def update_product_embeddings(batch_size=BATCH_SIZE, start_id=None, end_id=None, resume=True, invalidate=True):
+    """Recompute product embeddings for ``start_id <= pk < end_id`` (all products by default).
+
+    Sharded runs pass ``invalidate=False`` and let the finalizer reload indexes once.
+    """
+    stats = _recompute(
+        'product',
+        Product.objects.values_list('pk', 'name', 'description'),
+        embed=lambda rows: generate_product_embeddings([f"{name} {description or ''}" for _, name, description in rows]),
+        build=lambda row, vector, now: ProductEmbedding(
+            product_id=row[0], embedding=encode_embedding(vector), embedding_vector=vector,
+            model=PRODUCT_MODEL, updated_at=now,
+        ),
+        unique_field='product',
+        update_fields=['embedding', 'embedding_vector', 'model', 'updated_at'],
+        batch_size=batch_size, start_id=start_id, end_id=end_id, resume=resume,
+    )
+    if stats['rows'] and invalidate:
+        # bulk_create skips post_save, so invalidate the in-process indexes here
+        bump_index_version()
+        publish_snapshot(model=PRODUCT_MODEL)
+    return stats
+
+
+def update_user_embeddings(batch_size=BATCH_SIZE, start_id=None, end_id=None, resume=True):
+    """Recompute user embeddings for ``start_id <= pk < end_id`` (all users by default)."""
+    return _recompute(
+        'user',
+        UserAccount.objects.values_list('pk'),
+        embed=lambda rows: generate_user_embeddings([pk for pk, in rows]),
+        build=lambda row, vector, now: UserEmbedding(
+            user_id=row[0], embedding=encode_embedding(vector), embedding_vector=vector,
+            model=USER_MODEL, updated_at=now,
+        ),
+        unique_field='user',
+        update_fields=['embedding', 'embedding_vector', 'model', 'updated_at'],
+        batch_size=batch_size, start_id=start_id, end_id=end_id, resume=resume,
+    )
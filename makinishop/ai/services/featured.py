@@ -1,51 +1,107 @@
-from catalog.models import FeaturedProduct, Wishlist, ProductEmbedding, ProductReview
+from catalog.models import FeaturedProduct, Wishlist, ProductReview
 from user_events.models import UserEvent
-from ai.models import UserEmbedding
+from ai.models import ProductEmbedding, UserEmbedding
+from django.conf import settings
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import Q, Max, Case, When, Value, FloatField
 import numpy as np
 
-def personalized_featured(user_id: int, top_n=20):
-    featured = FeaturedProduct.objects.filter(
-        start_date__lte=timezone.now(),
+from .quantization import decode_embedding
+
+CANDIDATES = 50  # featured items considered before personal ranking
+
+# Overridable through settings.AI_PERSONALIZATION['WEIGHTS'] / ['EVENT_WEIGHTS']
+DEFAULT_WEIGHTS = {
+    'wishlist': 0.4,
+    'rating': 0.3,
+    'embedding': 0.2,
+    'events': 0.1,
+}
+DEFAULT_EVENT_WEIGHTS = {
+    'product_view': 0.1,
+    'featured_view': 0.1,
+    'wishlist_add': 0.5,
+    'purchase': 1.0,
+}
+
+
+def personalization_weights():
+    conf = getattr(settings, 'AI_PERSONALIZATION', {})
+    return (
+        {**DEFAULT_WEIGHTS, **conf.get('WEIGHTS', {})},
+        {**DEFAULT_EVENT_WEIGHTS, **conf.get('EVENT_WEIGHTS', {})},
+    )
+
+
+def active_featured(now=None):
+    now = now or timezone.now()
+    return FeaturedProduct.objects.filter(
+        start_date__lte=now,
     ).filter(
-        Q(end_date__isnull=True) | Q(end_date__gte=timezone.now())
-    ).order_by('-priority', '-start_date')[:50]
-
-    # Compute personalization score
-    scored = []
-    wishlist_ids = set(Wishlist.objects.filter(user_id=user_id).values_list('product_id', flat=True))
-    # Use ProductReview for ratings
-    user_ratings = {r.product_id: r.rating for r in ProductReview.objects.filter(user_id=user_id, rating__isnull=False)}
-    user_events = {e.product_id: e.event_type for e in UserEvent.objects.filter(user_id=user_id)}
-
-    user_emb = UserEmbedding.objects.filter(user_id=user_id).first()
-    if user_emb:
-        user_vector = np.frombuffer(user_emb.embedding, dtype=np.float32)
-    else:
-        user_vector = None
-
-    for f in featured:
-        score = 0
-        score += 0.4 if f.product_id in wishlist_ids else 0
-        score += 0.3 * (user_ratings.get(f.product_id, 0) / 5.0)
-        if user_vector:
-            prod_emb = ProductEmbedding.objects.filter(product=f.product).first()
-            if prod_emb:
-                prod_vector = np.frombuffer(prod_emb.embedding, dtype=np.float32)
-                # Avoid division by zero
-                denom = np.linalg.norm(user_vector) * np.linalg.norm(prod_vector)
-                if denom > 0:
-                    score += 0.2 * (np.dot(user_vector, prod_vector) / denom)
-        # Events weight
-        event_score = 0
-        if f.product_id in user_events:
-            event_type = user_events[f.product_id]
-            if event_type == 'view': event_score = 0.1
-            elif event_type == 'cart': event_score = 0.5
-            elif event_type == 'purchase': event_score = 1.0
-        score += 0.1 * event_score
-        scored.append((score, f.product))
-
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [p for _, p in scored[:top_n]]
\ No newline at end of file
+        Q(end_date__isnull=True) | Q(end_date__gte=now)
+    ).select_related('product').order_by('-priority', '-start_date')[:CANDIDATES]
+
+
+def event_scores(user_id, product_ids, event_weights):
+    """Strongest event weight per product, aggregated in SQL."""
+    strongest = Max(Case(
+        *[When(event_type=event_type, then=Value(weight)) for event_type, weight in event_weights.items()],
+        default=Value(0.0),
+        output_field=FloatField(),
+    ))
+    rows = UserEvent.objects.filter(
+        user_id=user_id, product_id__in=product_ids, event_type__in=list(event_weights)
+    ).values('product_id').annotate(weight=strongest).values_list('product_id', 'weight')
+    return dict(rows)
+
+
+def embedding_similarity(user_id, product_ids):
+    """Cosine similarity of the user's embedding to each product (0 where missing)."""
+    similarity = np.zeros(len(product_ids), dtype=np.float32)
+    user_emb = UserEmbedding.objects.filter(user_id=user_id).values_list('embedding', flat=True).first()
+    if user_emb is None:
+        return similarity
+
+    rows = ProductEmbedding.objects.filter(product_id__in=product_ids).values_list('product_id', 'embedding')
+    vectors = {pid: decode_embedding(raw) for pid, raw in rows}
+    if not vectors:
+        return similarity
+
+    user_vector = decode_embedding(user_emb)
+    found = [i for i, pid in enumerate(product_ids) if pid in vectors]
+    matrix = np.vstack([vectors[product_ids[i]] for i in found])
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(user_vector)
+    norms[norms == 0] = np.inf
+    similarity[found] = (matrix @ user_vector) / norms
+    return similarity
+
+
+def rank_for_user(user_id: int, featured, top_n=20):
+    """Score ``featured`` items for ``user_id`` with one query per signal and one dot product."""
+    featured = list(featured)
+    if not featured:
+        return []
+    weights, event_weights = personalization_weights()
+    product_ids = [f.product_id for f in featured]
+
+    wishlist_ids = set(
+        Wishlist.objects.filter(user_id=user_id, product_id__in=product_ids).values_list('product_id', flat=True)
+    )
+    user_ratings = dict(
+        ProductReview.objects.filter(user_id=user_id, product_id__in=product_ids, rating__isnull=False)
+        .values_list('product_id', 'rating')
+    )
+    events = event_scores(user_id, product_ids, event_weights)
+
+    scores = (
+        weights['wishlist'] * np.array([pid in wishlist_ids for pid in product_ids], dtype=np.float32)
+        + weights['rating'] * np.array([user_ratings.get(pid, 0) / 5.0 for pid in product_ids], dtype=np.float32)
+        + weights['embedding'] * embedding_similarity(user_id, product_ids)
+        + weights['events'] * np.array([events.get(pid, 0) for pid in product_ids], dtype=np.float32)
+    )
+    order = np.argsort(-scores, kind='stable')[:top_n]
+    return [featured[i].product for i in order]
+
+
+def personalized_featured(user_id: int, top_n=20):
+    return rank_for_user(user_id, active_featured(), top_n=top_n)
@@ -1,5 +1,5 @@
-import numpy as np
 from ai.models import RecommendationFeedback, UserEmbedding, ProductEmbedding
+from .quantization import decode_embedding, encode_embedding
 
 def update_user_embedding_from_feedback(user_id: int, product_id: int, weight=0.1):
     try:
@@ -8,8 +8,9 @@ def update_user_embedding_from_feedback(user_id: int, product_id: int, weight=0.
     except (UserEmbedding.DoesNotExist, ProductEmbedding.DoesNotExist):
         return
 
-    user_vector = np.frombuffer(user_emb.embedding, dtype=np.float32)
-    product_vector = np.frombuffer(product_emb.embedding, dtype=np.float32)
+    user_vector = decode_embedding(user_emb.embedding)
+    product_vector = decode_embedding(product_emb.embedding)
     new_vector = user_vector + weight * (product_vector - user_vector)
-    user_emb.embedding = new_vector.tobytes()
+    user_emb.embedding = encode_embedding(new_vector)
+    user_emb.embedding_vector = new_vector
     user_emb.save()
\ No newline at end of file
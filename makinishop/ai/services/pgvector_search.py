@@ -0,0 +1,51 @@
+"""
+SQL-side similarity search over the pgvector ``embedding_vector`` columns.
+
+Used instead of the in-process index when ``settings.AI_EMBEDDING_STORAGE``
+is ``'pgvector'``. The HNSW index answers ``ORDER BY embedding_vector <=> q
+LIMIT k`` directly, so only the winning ids leave the database.
+"""
+from django.db import connection
+from pgvector.django import CosineDistance
+
+from ai.models import ProductEmbedding, UserEmbedding
+
+
+def similar_products(product_id, k=10):
+    """Ids of the ``k`` products closest to ``product_id``, or ``None`` if it has no vector."""
+    vector = (
+        ProductEmbedding.objects.filter(product_id=product_id, embedding_vector__isnull=False)
+        .values_list("embedding_vector", flat=True)
+        .first()
+    )
+    if vector is None:
+        return None
+    return list(
+        ProductEmbedding.objects.exclude(product_id=product_id)
+        .filter(embedding_vector__isnull=False)
+        .order_by(CosineDistance("embedding_vector", vector))
+        .values_list("product_id", flat=True)[:k]
+    )
+
+
+def recommend_for_users(user_ids, k=10):
+    """Top-k product ids per user in one statement, one HNSW scan per user via LATERAL."""
+    sql = f"""
+        SELECT u.user_id, p.product_id
+        FROM {UserEmbedding._meta.db_table} u
+        CROSS JOIN LATERAL (
+            SELECT pe.product_id, pe.embedding_vector <=> u.embedding_vector AS distance
+            FROM {ProductEmbedding._meta.db_table} pe
+            WHERE pe.embedding_vector IS NOT NULL
+            ORDER BY pe.embedding_vector <=> u.embedding_vector
+            LIMIT %s
+        ) p
+        WHERE u.user_id = ANY(%s) AND u.embedding_vector IS NOT NULL
+        ORDER BY u.user_id, p.distance
+    """
+    results = {}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [k, list(user_ids)])
+        for user_id, product_id in cursor.fetchall():
+            results.setdefault(user_id, []).append(product_id)
+    return results
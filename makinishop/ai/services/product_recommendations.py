@@ -0,0 +1,110 @@
+"""
+Batch job that precomputes item-to-item ProductRecommendation rows.
+
+Neighbours are found by scoring blocks of the embedding matrix against the
+whole catalog, then upserted with ``bulk_create(update_conflicts=True)`` so
+``ProductRecommendationView`` stays a single indexed read. Incremental runs
+recompute the products whose embedding changed since the previous run, plus
+every product whose neighbour list a changed product leaves or now enters.
+"""
+import logging
+import time
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from ai.models import ProductEmbedding, ProductRecommendation
+from .vector_index import EmbeddingIndex, normalize
+
+logger = logging.getLogger(__name__)
+
+LAST_RUN_KEY = "ai:product_recommendations:last_run"
+NEIGHBOURS = 10
+BLOCK_SIZE = 512  # products scored per matrix product
+WRITE_CHUNK = 1000  # rows per bulk_create statement
+
+
+def compute_product_recommendations(incremental=True, k=NEIGHBOURS, block_size=BLOCK_SIZE):
+    """Recompute top-k neighbours and return the number of products processed."""
+    started = timezone.now()
+    t0 = time.perf_counter()
+    index = EmbeddingIndex.from_db()
+
+    last_run = cache.get(LAST_RUN_KEY) if incremental else None
+    if last_run is None:
+        product_ids = index.ids.tolist()
+    else:
+        changed = ProductEmbedding.objects.filter(updated_at__gt=last_run).values_list("product_id", flat=True)
+        product_ids = affected_products(index, list(changed), k, block_size)
+
+    positions = index.positions(product_ids)
+    for start in range(0, len(positions), block_size):
+        block = positions[start:start + block_size]
+        # Ask for one extra neighbour: the product itself always scores highest.
+        results = index.top_k_batch(index.matrix[block], k=k + 1, exact=True)
+        _write_block(index.ids[block].tolist(), results, k, started)
+
+    cache.set(LAST_RUN_KEY, started, timeout=None)
+    logger.info(
+        f"Product recommendations: {len(positions)} products "
+        f"({'incremental' if last_run else 'full'}) in {time.perf_counter() - t0:.1f}s"
+    )
+    return len(positions)
+
+
+def affected_products(index, changed_ids, k, block_size=BLOCK_SIZE):
+    """``changed_ids`` plus the products whose stored top-``k`` one of them leaves or enters."""
+    affected = set(changed_ids)
+    if not affected:
+        return []
+    stored = ProductRecommendation.objects.filter(user__isnull=True)
+    # Lists naming a changed product may now rank it lower or drop it.
+    affected.update(stored.filter(recommended_product_id__in=affected).values_list("product_id", flat=True))
+
+    # A changed product enters a full list when it beats that list's weakest score;
+    # lists shorter than k take anything.
+    floor = np.full(len(index), -np.inf, dtype=np.float32)
+    full_lists = stored.values("product_id").annotate(weakest=Min("score"), size=Count("id")).filter(size__gte=k)
+    rows = list(full_lists.values_list("product_id", "weakest"))
+    if rows:
+        ids = np.fromiter((pid for pid, _ in rows), dtype=np.int64, count=len(rows))
+        weakest = np.fromiter((score for _, score in rows), dtype=np.float32, count=len(rows))
+        present = np.isin(ids, index.ids)
+        floor[index.positions(ids[present])] = weakest[present]
+    positions = index.positions(set(changed_ids))
+    for start in range(0, len(positions), block_size):
+        scores = index.matrix.dot(normalize(index.matrix[positions[start:start + block_size]]))
+        affected.update(index.ids[scores.max(axis=0) > floor].tolist())
+    return sorted(affected)
+
+
+def _write_block(product_ids, results, k, started):
+    rows = []
+    for product_id, (neighbour_ids, scores) in zip(product_ids, results):
+        neighbours = [(nid, score) for nid, score in zip(neighbour_ids, scores) if nid != product_id][:k]
+        rows.extend(
+            ProductRecommendation(
+                user=None,
+                product_id=product_id,
+                recommended_product_id=nid,
+                score=score,
+                created_at=started,
+            )
+            for nid, score in neighbours
+        )
+
+    with transaction.atomic():
+        for start in range(0, len(rows), WRITE_CHUNK):
+            ProductRecommendation.objects.bulk_create(
+                rows[start:start + WRITE_CHUNK],
+                update_conflicts=True,
+                unique_fields=["user", "product", "recommended_product"],
+                update_fields=["score", "created_at"],
+            )
+        # Neighbours that dropped out of the top-k were not touched by this run.
+        ProductRecommendation.objects.filter(
+            user__isnull=True, product_id__in=product_ids, created_at__lt=started
+        ).delete()
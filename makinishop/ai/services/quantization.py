@@ -0,0 +1,122 @@
+"""
+Compact encodings for embedding vectors.
+
+``float32`` is the historical raw format (4 bytes per dimension), ``float16``
+halves it and ``int8`` stores one signed byte per dimension plus a float32
+scale per vector (``value ~= code * scale``). The first byte of every
+encoded vector names its codec, so decoding never guesses from the length and
+a table holding a mix of encodings (e.g. halfway through a re-encode) still
+decodes row by row.
+"""
+import numpy as np
+from django.conf import settings
+
+CODECS = ("float32", "float16", "int8")  # position = header byte
+ROW_CHUNK = 65536  # product rows dequantized at a time when scoring
+
+DEFAULT_QUANTIZATION = {
+    "STORAGE": "float32",
+    "INDEX": "float32",
+    "RESCORE_FACTOR": 4,
+}
+
+
+def quantization_settings():
+    return {**DEFAULT_QUANTIZATION, **getattr(settings, "AI_EMBEDDING_QUANTIZATION", {})}
+
+
+def _int8_codes(matrix):
+    scales = np.abs(matrix).max(axis=-1, keepdims=True) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scales), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def encode_embedding(vector, codec=None) -> bytes:
+    """Serialize one vector for the ``embedding`` BinaryField: codec byte, then the payload."""
+    codec = codec or quantization_settings()["STORAGE"]
+    if codec not in CODECS:
+        raise ValueError(f"Unknown embedding codec {codec!r}; expected one of {CODECS}")
+    vector = np.asarray(vector, dtype=np.float32)
+    if codec == "float16":
+        payload = vector.astype(np.float16).tobytes()
+    elif codec == "int8":
+        codes, scale = _int8_codes(vector)
+        payload = scale.tobytes() + codes.tobytes()
+    else:
+        payload = vector.tobytes()
+    return bytes([CODECS.index(codec)]) + payload
+
+
+def decode_embedding(raw) -> np.ndarray:
+    """Inverse of ``encode_embedding``; always returns float32."""
+    raw = bytes(raw)
+    if not raw or raw[0] >= len(CODECS):
+        raise ValueError("Embedding bytes do not start with a known codec header")
+    codec, payload = CODECS[raw[0]], raw[1:]
+    if codec == "float16":
+        return np.frombuffer(payload, dtype=np.float16).astype(np.float32)
+    if codec == "int8":
+        scale = np.frombuffer(payload[:4], dtype=np.float32)[0]
+        return np.frombuffer(payload[4:], dtype=np.int8).astype(np.float32) * scale
+    return np.frombuffer(payload, dtype=np.float32)
+
+
+class QuantizedMatrix:
+    """Row-major vector block stored as float32, float16 or per-row scaled int8.
+
+    Indexing (``m[rows]``, ``m[a:b]``) returns dequantized float32 rows, so
+    code written against a plain ndarray keeps working on the compact form.
+    """
+
+    def __init__(self, codes, codec="float32", scales=None):
+        self.codes = codes
+        self.codec = codec
+        self.scales = scales
+
+    @classmethod
+    def encode(cls, matrix, codec="float32"):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown embedding codec {codec!r}; expected one of {CODECS}")
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if codec == "float16":
+            return cls(np.ascontiguousarray(matrix, dtype=np.float16), codec)
+        if codec == "int8":
+            codes, scales = _int8_codes(matrix)
+            return cls(np.ascontiguousarray(codes), codec, scales[..., 0])
+        return cls(np.ascontiguousarray(matrix), codec)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __getitem__(self, key):
+        if self.codec == "float32":
+            return self.codes[key]
+        rows = self.codes[key].astype(np.float32)
+        if self.scales is not None:
+            scales = self.scales[key]
+            rows *= scales[..., None] if np.ndim(scales) else scales
+        return rows
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[:], dtype=dtype)
+
+    def dot(self, queries):
+        """``queries @ rows.T`` without materialising the whole float32 matrix."""
+        if self.codec == "float32":
+            return queries @ self.codes.T
+        scores = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), ROW_CHUNK):
+            chunk = self.codes[start:start + ROW_CHUNK].astype(np.float32)
+            scores[:, start:start + ROW_CHUNK] = queries @ chunk.T
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
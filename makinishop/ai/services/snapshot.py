@@ -0,0 +1,112 @@
+"""
+On-disk product embedding snapshot shared by every worker process.
+
+Layout (little endian)::
+
+    header   HEADER_SIZE bytes: magic, format version, dim, count, generation,
+             codec, model name
+    ids      int64[count], ascending product ids
+    vectors  codec dtype[count, dim], L2-normalised rows
+    scales   float32[count] (int8 codec only)
+
+Readers map the file with ``np.memmap`` instead of loading it, so gunicorn and
+Celery workers on one host share a single page-cached copy and startup only
+costs an ``mmap`` call. Writers build the file next to the target and
+``os.replace`` it into place: processes that still map the old inode keep a
+consistent view until they reload on the next generation.
+"""
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from .quantization import QuantizedMatrix
+
+MAGIC = b"MKEMBSNP"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIQQ8s32s")
+HEADER_SIZE = 128
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _align(offset, boundary=8):
+    return -(-offset // boundary) * boundary
+
+
+def _offsets(count, dim, codec):
+    ids_at = HEADER_SIZE
+    vectors_at = _align(ids_at + 8 * count)
+    scales_at = _align(vectors_at + count * dim * np.dtype(DTYPES[codec]).itemsize)
+    return ids_at, vectors_at, scales_at
+
+
+def write_snapshot(path, ids, matrix: QuantizedMatrix, generation, model=""):
+    """Atomically write ``ids`` and the (already normalised) ``matrix`` to ``path``."""
+    ids = np.asarray(ids, dtype=np.int64)
+    order = np.argsort(ids, kind="stable")
+    count, dim = (len(ids), matrix.shape[1]) if len(ids) else (0, 0)
+    ids_at, vectors_at, scales_at = _offsets(count, dim, matrix.codec)
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".snapshot")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            header = HEADER.pack(
+                MAGIC, FORMAT_VERSION, dim, count, generation,
+                matrix.codec.encode(), model.encode()[:32],
+            )
+            fh.write(header.ljust(HEADER_SIZE, b"\0"))
+            fh.seek(ids_at)
+            fh.write(ids[order].tobytes())
+            fh.seek(vectors_at)
+            fh.write(np.ascontiguousarray(matrix.codes[order]).tobytes())
+            if matrix.scales is not None:
+                fh.seek(scales_at)
+                fh.write(np.ascontiguousarray(matrix.scales[order], dtype=np.float32).tobytes())
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_header(path):
+    with open(path, "rb") as fh:
+        raw = fh.read(HEADER_SIZE)
+    if len(raw) < HEADER.size:
+        raise SnapshotError(f"{path} is truncated")
+    magic, version, dim, count, generation, codec, model = HEADER.unpack_from(raw)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise SnapshotError(f"{path} is not an embedding snapshot (v{FORMAT_VERSION})")
+    codec = codec.rstrip(b"\0").decode()
+    if codec not in DTYPES:
+        raise SnapshotError(f"{path} uses unknown codec {codec!r}")
+    return {
+        "dim": dim,
+        "count": count,
+        "generation": generation,
+        "codec": codec,
+        "model": model.rstrip(b"\0").decode(),
+    }
+
+
+def open_snapshot(path):
+    """Return ``(header, ids, matrix)`` backed by read-only memory maps of ``path``."""
+    header = read_header(path)
+    count, dim, codec = header["count"], header["dim"], header["codec"]
+    if not count:
+        return header, np.empty(0, dtype=np.int64), QuantizedMatrix(np.empty((0, 0), dtype=np.float32))
+    ids_at, vectors_at, scales_at = _offsets(count, dim, codec)
+    ids = np.memmap(path, dtype=np.int64, mode="r", offset=ids_at, shape=(count,))
+    codes = np.memmap(path, dtype=DTYPES[codec], mode="r", offset=vectors_at, shape=(count, dim))
+    scales = None
+    if codec == "int8":
+        scales = np.memmap(path, dtype=np.float32, mode="r", offset=scales_at, shape=(count,))
+    return header, ids, QuantizedMatrix(codes, codec, scales)
@@ -0,0 +1,333 @@
+"""
+Process-wide product embedding index.
+
+Every ProductEmbedding is held as one contiguous, L2-normalised matrix next
+to an array of product ids, so a similarity query is a single
+matrix-vector product followed by ``argpartition`` instead of a Python loop
+over the whole table; many queries at once become one matrix-matrix product
+per block. The index is rebuilt lazily when the embedding version
+stored in the cache is bumped (see ``ai.signals``).
+
+``settings.AI_VECTOR_INDEX['BACKEND']`` selects how the matrix is searched:
+``exact`` scores every product, ``ivf`` routes queries through the inverted
+file index in ``ai.services.ann``, whose centroids are trained once and kept
+in the shared cache. With ``settings.AI_EMBEDDING_STORAGE = 'pgvector'`` the
+module-level helpers skip the in-process index altogether and search in
+Postgres (see ``ai.services.pgvector_search``).
+
+``settings.AI_EMBEDDING_QUANTIZATION['INDEX']`` stores the matrix as float16
+or int8 (see ``ai.services.quantization``). Quantized indexes over-fetch
+``RESCORE_FACTOR * k`` candidates and rescore them against the float32
+``embedding_vector`` column, so the final ranking does not carry the
+quantization error. Rows without that copy fall back to the ``embedding``
+bytes, which are only exact when ``STORAGE`` is float32.
+
+With ``settings.AI_VECTOR_INDEX['SNAPSHOT']`` set, workers do not load the
+embeddings from the database at all: they memory-map the snapshot file written
+by the recompute job (see ``ai.services.snapshot``) and remap it whenever the
+snapshot generation in the cache changes.
+"""
+import logging
+import threading
+import uuid
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from ai.models import ProductEmbedding, UserEmbedding
+from catalog.models import Product
+from . import pgvector_search
+from .ann import IVFIndex, default_nlist, train_centroids
+from .quantization import QuantizedMatrix, decode_embedding, quantization_settings
+from .snapshot import SnapshotError, open_snapshot, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION_KEY = "ai:embedding_index:version"
+SNAPSHOT_GENERATION_KEY = "ai:embedding_snapshot:generation"
+IVF_CENTROIDS_KEY = "ai:ivf:centroids"
+IVF_TRAIN_LOCK_KEY = "ai:ivf:train_lock"
+IVF_TRAIN_LOCK_TTL = 15 * 60
+SCORE_BLOCK_SIZE = 256  # query rows scored per matrix product
+
+DEFAULT_INDEX_SETTINGS = {
+    "BACKEND": "exact",
+    "NLIST": 0,  # 0 = sqrt(number of products)
+    "NPROBE": 8,
+    "SNAPSHOT": None,  # path of the shared memory-mapped snapshot; None = load from the DB
+}
+
+
+def index_settings():
+    return {**DEFAULT_INDEX_SETTINGS, **getattr(settings, "AI_VECTOR_INDEX", {})}
+
+
+def uses_pgvector():
+    return getattr(settings, "AI_EMBEDDING_STORAGE", "binary") == "pgvector"
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    """Return a float32 copy of ``matrix`` with unit-length rows (zero rows stay zero)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+class EmbeddingIndex:
+    def __init__(self, ids, matrix, version=None, codec="float32", rescore_factor=None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        if isinstance(matrix, QuantizedMatrix):
+            self.matrix = matrix  # already normalised, e.g. a snapshot memory map
+        else:
+            self.matrix = QuantizedMatrix.encode(normalize(matrix), codec)
+        self.version = version
+        self.rescore_factor = rescore_factor or quantization_settings()["RESCORE_FACTOR"]
+        self.ann = None
+        # Ids are looked up by binary search rather than a per-process dict, so
+        # a memory-mapped index adds no per-product memory to each worker.
+        if np.all(self.ids[1:] > self.ids[:-1]):
+            self._order, self._sorted_ids = None, self.ids
+        else:
+            self._order = np.argsort(self.ids, kind="stable")
+            self._sorted_ids = self.ids[self._order]
+
+    @classmethod
+    def from_db(cls, version=None):
+        ids, vectors = [], []
+        rows = ProductEmbedding.objects.order_by("product_id").values_list("product_id", "embedding").iterator(
+            chunk_size=2000
+        )
+        for product_id, raw in rows:
+            ids.append(product_id)
+            vectors.append(decode_embedding(raw))
+        matrix = np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+        return cls(ids, matrix, version=version, codec=quantization_settings()["INDEX"])
+
+    @property
+    def quantized(self):
+        return self.matrix.codec != "float32"
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_snapshot(cls, path):
+        header, ids, matrix = open_snapshot(path)
+        return cls(ids, matrix, version=header["generation"])
+
+    def positions(self, product_ids):
+        """Matrix rows of the given products, skipping ids that are not indexed."""
+        wanted = np.fromiter(product_ids, dtype=np.int64)
+        if not len(self) or not len(wanted):
+            return []
+        at = np.minimum(np.searchsorted(self._sorted_ids, wanted), len(self) - 1)
+        at = at[self._sorted_ids[at] == wanted]
+        return (at if self._order is None else self._order[at]).tolist()
+
+    def vector_for(self, product_id):
+        pos = self.positions([product_id])
+        return self.matrix[pos[0]] if pos else None
+
+    def top_k(self, vector, k=10, exclude=()):
+        """Return ``(product_ids, scores)`` of the ``k`` most cosine-similar products."""
+        return self.top_k_batch(np.atleast_2d(vector), k=k, exclude=exclude)[0]
+
+    def top_k_batch(self, vectors, k=10, exclude=(), exact=False, nprobe=None):
+        """Score a block of query vectors at once; one ``(product_ids, scores)`` per row.
+
+        Uses the ANN backend when one is attached unless ``exact`` is set.
+        """
+        vectors = np.atleast_2d(vectors)
+        excluded = self.positions(set(exclude))
+        k = min(k, len(self) - len(excluded))
+        if k <= 0:
+            return [([], []) for _ in range(len(vectors))]
+
+        queries = normalize(vectors)
+        fetch = min(k * self.rescore_factor, len(self) - len(excluded)) if self.quantized else k
+        if self.ann is not None and not exact:
+            results = self.ann.search_batch(self.matrix, self.ids, queries, fetch, excluded, nprobe=nprobe)
+        else:
+            results = []
+            for start in range(0, len(queries), SCORE_BLOCK_SIZE):
+                scores = self.matrix.dot(queries[start:start + SCORE_BLOCK_SIZE])
+                if excluded:
+                    scores[:, excluded] = -np.inf
+                top = np.argpartition(-scores, fetch - 1, axis=1)[:, :fetch]
+                top_scores = np.take_along_axis(scores, top, axis=1)
+                order = np.argsort(-top_scores, axis=1)
+                top = np.take_along_axis(top, order, axis=1)
+                top_scores = np.take_along_axis(top_scores, order, axis=1)
+                results.extend(zip(self.ids[top].tolist(), top_scores.tolist()))
+        if self.quantized:
+            results = self.rescore(queries, results, k)
+        return results
+
+    def exact_vectors(self, product_ids):
+        """Float32 vectors for ``product_ids``, fetched in one query."""
+        rows = ProductEmbedding.objects.filter(product_id__in=product_ids).values_list(
+            "product_id", "embedding_vector", "embedding"
+        )
+        return {
+            product_id: decode_embedding(raw) if vector is None else np.asarray(vector, dtype=np.float32)
+            for product_id, vector, raw in rows
+        }
+
+    def rescore(self, queries, results, k):
+        """Re-rank quantized candidates with the stored vectors and keep the best ``k``."""
+        exact = self.exact_vectors({pid for product_ids, _ in results for pid in product_ids})
+        rescored = []
+        for query, (product_ids, _) in zip(queries, results):
+            if not product_ids:
+                rescored.append(([], []))
+                continue
+            # Rows deleted since the index was built fall back to their quantized vector.
+            candidates = normalize(np.vstack([
+                exact[pid] if pid in exact else self.vector_for(pid) for pid in product_ids
+            ]))
+            scores = candidates @ query
+            order = np.argsort(-scores, kind="stable")[:k]
+            rescored.append(([product_ids[i] for i in order], scores[order].tolist()))
+        return rescored
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def _load_index(version):
+    snapshot = index_settings()["SNAPSHOT"]
+    if snapshot:
+        try:
+            return EmbeddingIndex.from_snapshot(snapshot)
+        except (OSError, SnapshotError) as exc:
+            logger.warning(f"Embedding snapshot {snapshot} unusable, loading from the database: {exc}")
+    return EmbeddingIndex.from_db(version=version)
+
+
+def index_version():
+    """Version of the product embeddings every process should be serving."""
+    key = SNAPSHOT_GENERATION_KEY if index_settings()["SNAPSHOT"] else INDEX_VERSION_KEY
+    return cache.get(key)
+
+
+def get_product_index() -> EmbeddingIndex:
+    """Return this process's index, rebuilding it if the embeddings changed."""
+    global _index
+    version = index_version()
+    index = _index
+    if index is not None and index.version == version and not _needs_ann(index):
+        return index
+    with _lock:
+        if _index is None or _index.version != version:
+            index = _load_index(version)
+            index.version = version
+            _index = index
+        if _needs_ann(_index):
+            _index.ann = load_or_train_ivf(_index)
+        return _index
+
+
+def _needs_ann(index):
+    return index.ann is None and len(index) and index_settings()["BACKEND"] == "ivf"
+
+
+def load_or_train_ivf(index: EmbeddingIndex, retrain=False):
+    """Attach the shared IVF quantizer to ``index``, training it if none is stored yet.
+
+    The centroids live in the shared cache, so web and Celery containers all
+    route queries through the same cells. Training runs under a lease: while
+    another process holds it this returns ``None`` and the index keeps
+    searching exactly until the centroids are published.
+    """
+    conf = index_settings()
+    if not retrain:
+        centroids = cache.get(IVF_CENTROIDS_KEY)
+        if centroids is not None and centroids.shape[1] == index.matrix.shape[1]:
+            return IVFIndex(centroids, index.matrix, nprobe=conf["NPROBE"])
+
+    token = uuid.uuid4().hex
+    if not cache.add(IVF_TRAIN_LOCK_KEY, token, IVF_TRAIN_LOCK_TTL):
+        return None
+    try:
+        centroids = train_centroids(index.matrix[:], conf["NLIST"] or default_nlist(len(index)))
+        cache.set(IVF_CENTROIDS_KEY, centroids, timeout=None)
+    finally:
+        if cache.get(IVF_TRAIN_LOCK_KEY) == token:
+            cache.delete(IVF_TRAIN_LOCK_KEY)
+    return IVFIndex(centroids, index.matrix, nprobe=conf["NPROBE"])
+
+
+def warm_up():
+    """Load the index (and ANN quantizer) before the first request hits this worker."""
+    try:
+        get_product_index()
+    except Exception as exc:
+        logger.warning(f"Product index warm-up failed: {exc}")
+
+
+def _incr(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+        return 1
+
+
+def bump_index_version():
+    """Invalidate the product index in every process."""
+    _incr(INDEX_VERSION_KEY)
+
+
+def publish_snapshot(model=""):
+    """Write a fresh embedding snapshot and point every worker at it.
+
+    No-op unless ``AI_VECTOR_INDEX['SNAPSHOT']`` is configured. Returns the new
+    generation.
+    """
+    path = index_settings()["SNAPSHOT"]
+    if not path:
+        return None
+    index = EmbeddingIndex.from_db()
+    generation = _incr(f"{SNAPSHOT_GENERATION_KEY}:next")
+    write_snapshot(path, index.ids, index.matrix, generation, model=model)
+    # Publish only once the file is in place, so a reader never maps an older
+    # file under the new generation.
+    cache.set(SNAPSHOT_GENERATION_KEY, generation, timeout=None)
+    logger.info(f"Embedding snapshot generation {generation}: {len(index)} products at {path}")
+    return generation
+
+
+def fetch_products_in_order(product_ids):
+    """Hydrate ``product_ids`` in one query, preserving the given order."""
+    products = Product.objects.in_bulk(product_ids)
+    return [products[pid] for pid in product_ids if pid in products]
+
+
+def similar_products(product_id, k=10):
+    """Ids of the ``k`` products most similar to ``product_id``, or ``None`` if it has no embedding."""
+    if uses_pgvector():
+        return pgvector_search.similar_products(product_id, k=k)
+    index = get_product_index()
+    vector = index.vector_for(product_id)
+    if vector is None:
+        return None
+    product_ids, _ = index.top_k(vector, k=k, exclude=[product_id])
+    return product_ids
+
+
+def recommend_for_users(user_ids, k=10):
+    """Return ``{user_id: [product_id, ...]}`` for every user that has an embedding."""
+    if uses_pgvector():
+        return pgvector_search.recommend_for_users(user_ids, k=k)
+    rows = UserEmbedding.objects.filter(user_id__in=user_ids).values_list("user_id", "embedding")
+    found, vectors = [], []
+    for user_id, raw in rows:
+        found.append(user_id)
+        vectors.append(decode_embedding(raw))
+    if not found:
+        return {}
+    results = get_product_index().top_k_batch(np.vstack(vectors), k=k)
+    return {user_id: product_ids for user_id, (product_ids, _) in zip(found, results)}
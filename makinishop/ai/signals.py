@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import ProductEmbedding
+from .services.vector_index import bump_index_version, index_settings
+
+
+@receiver(post_save, sender=ProductEmbedding)
+@receiver(post_delete, sender=ProductEmbedding)
+def invalidate_product_index(sender, instance, **kwargs):
+    transaction.on_commit(bump_index_version)
+    if index_settings()["SNAPSHOT"]:
+        # Every publish rewrites the whole file: debounce single-row saves into one.
+        from .tasks import schedule_snapshot_publish
+        transaction.on_commit(schedule_snapshot_publish)
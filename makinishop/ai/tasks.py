@@ -1,8 +1,96 @@
 # ai/tasks.py
-from celery import shared_task
-from ai.services.embeddings import update_product_embeddings, update_user_embeddings
+import logging
+from celery import shared_task, chord
+from django.core.cache import cache
+from django.db.models import Min, Max
+from catalog.models import Product
+from users.models import UserAccount
+from ai.services.embeddings import PRODUCT_MODEL, update_product_embeddings, update_user_embeddings
+from ai.services.product_recommendations import compute_product_recommendations
+from ai.services.vector_index import (
+    EmbeddingIndex, index_settings, load_or_train_ivf, bump_index_version, publish_snapshot,
+)
+
+logger = logging.getLogger(__name__)
+
+SHARD_SIZE = 5000  # primary keys per recompute shard
+SNAPSHOT_DEBOUNCE = 30  # seconds of single-row embedding changes folded into one snapshot publish
+SNAPSHOT_PENDING_KEY = "ai:embedding_snapshot:pending"
+
+def id_shards(queryset, shard_size=SHARD_SIZE):
+    """Split the pk range of ``queryset`` into half-open ``[start, end)`` shards."""
+    bounds = queryset.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return []
+    return [(start, start + shard_size) for start in range(bounds['low'], bounds['high'] + 1, shard_size)]
+
+@shared_task
+def recompute_all_embeddings(shard_size=SHARD_SIZE):
+    """Fan the recompute out over the ai queue by pk range, then rebuild derived indexes once."""
+    shards = [recompute_embedding_shard.s('product', start, end) for start, end in id_shards(Product.objects, shard_size)]
+    shards += [recompute_embedding_shard.s('user', start, end) for start, end in id_shards(UserAccount.objects, shard_size)]
+    if not shards:
+        return None
+    result = chord(shards)(finalize_embedding_recompute.s())
+    return result.id
+
+@shared_task
+def recompute_embedding_shard(kind, start_id, end_id):
+    """Recompute one pk range; each batch commits on its own so a failed shard can simply be retried."""
+    if kind == 'product':
+        stats = update_product_embeddings(start_id=start_id, end_id=end_id, invalidate=False)
+    else:
+        stats = update_user_embeddings(start_id=start_id, end_id=end_id)
+    stats.update(start_id=start_id, end_id=end_id)
+    return stats
+
+@shared_task
+def finalize_embedding_recompute(shard_stats):
+    """Chord callback: report per-shard timing and rebuild everything derived from product embeddings."""
+    for stats in shard_stats:
+        logger.info(
+            f"{stats['kind']} shard [{stats['start_id']}, {stats['end_id']}): "
+            f"{stats['rows']} rows in {stats['seconds']}s ({stats['rows_per_sec']} rows/s)"
+        )
+    summary = {
+        'shards': len(shard_stats),
+        'rows': sum(stats['rows'] for stats in shard_stats),
+        'slowest_shard_seconds': max((stats['seconds'] for stats in shard_stats), default=0),
+        'shard_stats': shard_stats,
+    }
+
+    if any(stats['kind'] == 'product' and stats['rows'] for stats in shard_stats):
+        if index_settings()["BACKEND"] == "ivf":
+            # Before the new snapshot generation, so workers reload onto the new centroids.
+            train_ann_index()
+        bump_index_version()
+        summary['snapshot_generation'] = publish_snapshot(model=PRODUCT_MODEL)
+        summary['recommendations'] = compute_product_recommendations(incremental=True)
+    return summary
+
+@shared_task
+def train_ann_index():
+    """Retrain the IVF quantizer on the current embeddings and tell workers to reload."""
+    index = EmbeddingIndex.from_db()
+    if not len(index):
+        return
+    load_or_train_ivf(index, retrain=True)
+    bump_index_version()
+
+@shared_task
+def publish_embedding_snapshot():
+    """Rewrite the shared embedding snapshot; workers remap it on their next lookup."""
+    # Cleared first, so changes committed while this runs queue the next publish.
+    cache.delete(SNAPSHOT_PENDING_KEY)
+    return publish_snapshot(model=PRODUCT_MODEL)
+
+def schedule_snapshot_publish():
+    """Queue a snapshot rewrite unless one is already pending; bulk paths publish directly."""
+    # The lease outlives the countdown so a lost task only delays, never blocks, the next publish.
+    if cache.add(SNAPSHOT_PENDING_KEY, 1, SNAPSHOT_DEBOUNCE * 10):
+        publish_embedding_snapshot.apply_async(countdown=SNAPSHOT_DEBOUNCE)
 
 @shared_task
-def recompute_all_embeddings():
-    update_product_embeddings()
-    update_user_embeddings()
+def precompute_product_recommendations(incremental=True):
+    """Refresh item-to-item ProductRecommendation rows from the product embeddings."""
+    return compute_product_recommendations(incremental=incremental)
@@ -1,3 +1,260 @@
-from django.test import TestCase
+import os
+import tempfile
+import numpy as np
+from unittest import mock, skipUnless
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from catalog.models import Product, FeaturedProduct, Wishlist
+from user_events.models import UserEvent
+from users.models import UserAccount
+from .models import ProductEmbedding, ProductRecommendation, UserEmbedding, VECTOR_DIM
+from .services.embeddings import update_product_embeddings, _checkpoint_key
+from .services.featured import personalized_featured
+from .services.product_recommendations import compute_product_recommendations
+from .services.ann import IVFIndex, recall_at_k, train_centroids
+from .services.quantization import decode_embedding, encode_embedding
+from .services.snapshot import read_header
+from .services.vector_index import (
+    IVF_TRAIN_LOCK_KEY, EmbeddingIndex, bump_index_version, get_product_index, load_or_train_ivf, publish_snapshot,
+)
+from .tasks import id_shards, recompute_embedding_shard, finalize_embedding_recompute, publish_embedding_snapshot
 
-# Create your tests here.
+
+def make_embedding(product, vector):
+    return ProductEmbedding.objects.create(
+        product=product, embedding=encode_embedding(vector, 'float32'), model='test'
+    )
+
+
+class EmbeddingIndexTest(APITestCase):
+    def test_top_k_matches_brute_force(self):
+        rng = np.random.default_rng(0)
+        matrix = rng.random((50, 8), dtype=np.float32)
+        query = rng.random(8, dtype=np.float32)
+        index = EmbeddingIndex(np.arange(50), matrix)
+
+        ids, _ = index.top_k(query, k=5, exclude=[3])
+
+        scores = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+        scores[3] = -np.inf
+        self.assertEqual(ids, np.argsort(-scores)[:5].tolist())
+
+    def test_ivf_probing_every_cell_matches_exact(self):
+        rng = np.random.default_rng(1)
+        index = EmbeddingIndex(np.arange(400), rng.standard_normal((400, 16)).astype(np.float32))
+        queries = index.matrix[:20]
+        exact = index.top_k_batch(queries, k=10, exclude=[0])
+
+        index.ann = IVFIndex(train_centroids(index.matrix, 16), index.matrix, nprobe=4)
+        self.assertLess(len(index.ann.candidates(queries[0], 4)), 400)
+        self.assertEqual(recall_at_k(exact, index.top_k_batch(queries, k=10, exclude=[0], nprobe=16)), 1.0)
+
+    def test_ivf_centroids_are_trained_once_and_shared(self):
+        cache.clear()
+        rng = np.random.default_rng(4)
+        matrix = rng.standard_normal((100, 8)).astype(np.float32)
+        cache.add(IVF_TRAIN_LOCK_KEY, 'another-worker', 60)
+        self.assertIsNone(load_or_train_ivf(EmbeddingIndex(np.arange(100), matrix)))
+
+        cache.delete(IVF_TRAIN_LOCK_KEY)
+        trained = load_or_train_ivf(EmbeddingIndex(np.arange(100), matrix))
+        cache.add(IVF_TRAIN_LOCK_KEY, 'another-worker', 60)
+        shared = load_or_train_ivf(EmbeddingIndex(np.arange(100), matrix))
+        np.testing.assert_array_equal(shared.centroids, trained.centroids)
+
+    def test_quantized_index_rescores_to_exact_ranking(self):
+        rng = np.random.default_rng(3)
+        matrix = rng.standard_normal((60, VECTOR_DIM)).astype(np.float32)
+        products = [Product.objects.create(name=f'Q{i}') for i in range(60)]
+        for product, vector in zip(products, matrix):
+            # Quantized storage: rescoring must read the float32 column, not these bytes.
+            ProductEmbedding.objects.create(
+                product=product, embedding=encode_embedding(vector, 'int8'), embedding_vector=vector, model='test'
+            )
+        ids = [p.id for p in products]
+        for codec in ('float16', 'int8'):
+            self.assertEqual(len(encode_embedding(matrix[0], codec)), {'float16': 257, 'int8': 133}[codec])
+            np.testing.assert_allclose(decode_embedding(encode_embedding(matrix[0], codec)), matrix[0], atol=0.05)
+        # Byte lengths that used to be mistaken for float16/int8 rows.
+        for dim in (64, 33):
+            np.testing.assert_array_equal(decode_embedding(encode_embedding(matrix[0, :dim], 'float32')), matrix[0, :dim])
+
+        exact = EmbeddingIndex(ids, matrix)
+        quantized = EmbeddingIndex(ids, matrix, codec='int8', rescore_factor=4)
+        self.assertLess(quantized.matrix.nbytes, exact.matrix.nbytes / 3)
+        queries = matrix[:10]
+        for (q_ids, q_scores), (e_ids, e_scores) in zip(quantized.top_k_batch(queries, k=5), exact.top_k_batch(queries, k=5)):
+            self.assertEqual(q_ids, e_ids)
+            np.testing.assert_allclose(q_scores, e_scores, rtol=1e-5)
+
+    def test_snapshot_is_memory_mapped_and_hot_reloaded(self):
+        cache.clear()
+        products = [Product.objects.create(name=f'S{i}') for i in range(3)]
+        for product, vector in zip(products, [[1, 0], [0, 1], [0.9, 0.1]]):
+            make_embedding(product, vector)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'embeddings.snapshot')
+            with override_settings(AI_VECTOR_INDEX={'SNAPSHOT': path}):
+                self.assertEqual(publish_snapshot(model='test'), 1)
+                self.assertEqual(read_header(path)['count'], 3)
+                index = get_product_index()
+                self.assertIsInstance(index.matrix.codes, np.memmap)
+                self.assertEqual(index.top_k([1, 0], k=1, exclude=[products[0].id])[0], [products[2].id])
+
+                make_embedding(Product.objects.create(name='S3'), [1, 0.05])
+                self.assertIs(get_product_index(), index)
+                publish_snapshot(model='test')
+                self.assertEqual(len(get_product_index()), 4)
+
+    @override_settings(AI_VECTOR_INDEX={'SNAPSHOT': '/tmp/unused.snapshot'})
+    def test_single_row_saves_queue_one_snapshot_publish(self):
+        cache.clear()
+        with mock.patch.object(publish_embedding_snapshot, 'apply_async') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                for i in range(3):
+                    make_embedding(Product.objects.create(name=f'D{i}'), [1, i])
+        publish.assert_called_once()
+
+
+class AIProductRecommendationTest(APITestCase):
+    def setUp(self):
+        self.a = Product.objects.create(name='A')
+        self.b = Product.objects.create(name='B')
+        self.c = Product.objects.create(name='C')
+        with self.captureOnCommitCallbacks(execute=True):
+            make_embedding(self.a, [1, 0, 0, 0])
+            make_embedding(self.b, [0, 1, 0, 0])
+            make_embedding(self.c, [0.9, 0.1, 0, 0])
+
+    def test_recommendations_ranked_by_similarity(self):
+        url = reverse('ai-product-recommendation', args=[self.a.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['id'] for p in response.data], [self.c.id, self.b.id])
+
+    def test_missing_embedding_returns_404(self):
+        url = reverse('ai-product-recommendation', args=[0])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'pgvector search needs PostgreSQL')
+@override_settings(AI_EMBEDDING_STORAGE='pgvector')
+class PgvectorRecommendationTest(APITestCase):
+    def test_sql_search_matches_in_memory_ranking(self):
+        rng = np.random.default_rng(2)
+        products = [Product.objects.create(name=f'P{i}') for i in range(12)]
+        for product in products:
+            vector = rng.standard_normal(VECTOR_DIM).astype(np.float32)
+            ProductEmbedding.objects.create(
+                product=product, embedding=encode_embedding(vector, 'float32'), embedding_vector=vector, model='test'
+            )
+
+        response = self.client.get(reverse('ai-product-recommendation', args=[products[0].id]))
+        bump_index_version()
+        with override_settings(AI_EMBEDDING_STORAGE='binary'):
+            expected = self.client.get(reverse('ai-product-recommendation', args=[products[0].id]))
+        self.assertEqual(response.data, expected.data)
+
+
+class AIUserRecommendationBatchTest(APITestCase):
+    def setUp(self):
+        self.admin = UserAccount.objects.create_user(email='admin@example.com', password='pass', is_staff=True)
+        self.user = UserAccount.objects.create_user(email='shopper@example.com', password='pass')
+        self.a = Product.objects.create(name='A')
+        self.b = Product.objects.create(name='B')
+        with self.captureOnCommitCallbacks(execute=True):
+            make_embedding(self.a, [1, 0])
+            make_embedding(self.b, [0, 1])
+        UserEmbedding.objects.create(
+            user=self.user, embedding=encode_embedding([0.2, 1], 'float32'), model='test'
+        )
+
+    def test_batch_matches_single_user_endpoint(self):
+        single = self.client.get(reverse('ai-user-recommendation', args=[self.user.id]))
+        self.client.force_authenticate(user=self.admin)
+        batch = self.client.post(
+            reverse('ai-user-recommendation-batch'), {'user_ids': [self.user.id, self.admin.id]}, format='json'
+        )
+        self.assertEqual(batch.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['id'] for p in single.data], [self.b.id, self.a.id])
+        self.assertEqual(batch.data['results'][0]['recommendations'], single.data)
+        self.assertEqual(batch.data['missing'], [self.admin.id])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'upserts rely on NULLS NOT DISTINCT')
+class PrecomputedProductRecommendationTest(APITestCase):
+    def test_job_populates_and_refreshes_neighbours(self):
+        a, b, c = (Product.objects.create(name=name) for name in 'ABC')
+        make_embedding(a, [1, 0])
+        make_embedding(b, [0.9, 0.1])
+        emb_c = make_embedding(c, [0, 1])
+
+        self.assertEqual(compute_product_recommendations(incremental=False, k=1), 3)
+        response = self.client.get(reverse('product-recommendation', args=[a.id]))
+        self.assertEqual([r['recommended_product']['id'] for r in response.data], [b.id])
+
+        emb_c.embedding = encode_embedding([1, 0.05], 'float32')
+        emb_c.updated_at = emb_c.updated_at.replace(year=emb_c.updated_at.year + 1)
+        emb_c.save()
+        # c changed, and it now beats the stored neighbour of both a and b.
+        self.assertEqual(compute_product_recommendations(incremental=True, k=1), 3)
+        self.assertEqual(ProductRecommendation.objects.filter(product=c).count(), 1)
+        self.assertEqual(ProductRecommendation.objects.get(product=c).recommended_product, a)
+        self.assertEqual(ProductRecommendation.objects.get(product=a).recommended_product, c)
+
+
+class PersonalizedFeaturedBenchmarkTest(APITestCase):
+    def setUp(self):
+        self.user = UserAccount.objects.create_user(email='ranked@example.com', password='pass')
+        self.products = [Product.objects.create(name=f'Featured {i}') for i in range(50)]
+        FeaturedProduct.objects.bulk_create(
+            FeaturedProduct(product=product, priority=i) for i, product in enumerate(self.products)
+        )
+        for i, product in enumerate(self.products):
+            make_embedding(product, [1, 0] if i == 5 else [0, 1])
+        UserEmbedding.objects.create(
+            user=self.user, embedding=encode_embedding([1, 0], 'float32'), model='test'
+        )
+        Wishlist.objects.bulk_create([Wishlist(user=self.user, product=self.products[10])])
+        UserEvent.objects.create(user=self.user, event_type='purchase', product=self.products[20])
+        UserEvent.objects.create(user=self.user, event_type='product_view', product=self.products[20])
+
+    def test_query_count_is_independent_of_candidates(self):
+        # featured, wishlist, ratings, events, user embedding, product embeddings
+        with self.assertNumQueries(6):
+            ranked = personalized_featured(self.user.id, top_n=3)
+        self.assertEqual(ranked, [self.products[10], self.products[5], self.products[20]])
+
+
+class EmbeddingRecomputeTest(APITestCase):
+    def test_streams_in_batches_and_resumes_from_checkpoint(self):
+        products = [Product.objects.create(name=f'P{i}') for i in range(5)]
+        stats = update_product_embeddings(batch_size=2)
+        self.assertEqual((stats['rows'], stats['batches']), (5, 3))
+        self.assertEqual(ProductEmbedding.objects.count(), 5)
+
+        cache.set(_checkpoint_key('product', None, None), products[2].pk)
+        stats = update_product_embeddings(batch_size=2)
+        self.assertEqual(stats['resumed_from'], products[2].pk)
+        self.assertEqual(stats['rows'], 2)
+        self.assertEqual(ProductEmbedding.objects.count(), 5)
+        self.assertIsNone(cache.get(_checkpoint_key('product', None, None)))
+
+
+class ShardedRecomputeTest(APITestCase):
+    def test_shards_cover_every_product_once(self):
+        products = [Product.objects.create(name=f'S{i}') for i in range(5)]
+        shards = id_shards(Product.objects, shard_size=2)
+        self.assertEqual(shards[0][0], products[0].pk)
+
+        shard_stats = [recompute_embedding_shard('product', start, end) for start, end in shards]
+        self.assertEqual(sum(stats['rows'] for stats in shard_stats), 5)
+        self.assertEqual(ProductEmbedding.objects.count(), 5)
+
+        summary = finalize_embedding_recompute(shard_stats)
+        self.assertEqual((summary['shards'], summary['rows']), (len(shards), 5))
@@ -5,6 +5,7 @@ from .views import (
     RecommendationFeedbackView,
     AIProductRecommendationView,
     AIUserRecommendationView,
+    AIUserRecommendationBatchView,
     TrendingProductsView,
     ChatbotView
 )
@@ -15,6 +16,7 @@ urlpatterns = [
     path('recommendations/feedback/', RecommendationFeedbackView.as_view(), name='recommendation-feedback'),
     path('recommendations/product/<int:product_id>/', AIProductRecommendationView.as_view(), name='ai-product-recommendation'),
     path('recommendations/user/<int:user_id>/', AIUserRecommendationView.as_view(), name='ai-user-recommendation'),
+    path('recommendations/users/batch/', AIUserRecommendationBatchView.as_view(), name='ai-user-recommendation-batch'),
     path('trending/', TrendingProductsView.as_view(), name='trending-products'),
     path('chat/', ChatbotView.as_view(), name='ai-chatbot'), 
 
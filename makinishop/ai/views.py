@@ -1,10 +1,14 @@
 
+import hashlib
+
 from rest_framework.views import APIView
 from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
-from rest_framework import status
-from django.db.models import F
+from rest_framework import status, permissions
+from django.db.models import F, Max
 from catalog.models import Product
+from catalog import trending
+from catalog.cache import generation_key_parts, last_modified
 from .models import (
     ProductRecommendation,
     RecommendationFeedback,
@@ -19,14 +23,17 @@ from .serializers import (
     AIProductSerializer,
     ChatbotRequestSerializer,
     ChatSessionSerializer,
+    BatchUserRecommendationRequestSerializer,
 )
-import numpy as np
+from .services.vector_index import similar_products, fetch_products_in_order, recommend_for_users, index_version
 from django.conf import settings
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 
 from django.utils.decorators import method_decorator
 from django_ratelimit.decorators import ratelimit
 from utils.security import block_ip
+from utils.cache_utils import get_or_compute
+from utils.conditional import ConditionalGetMixin, PRIVATE_CACHE_CONTROL
 from google import genai  # new SDK import
 
 # ------------------------
@@ -35,10 +42,17 @@ from google import genai  # new SDK import
 
 @method_decorator(ratelimit(key='ip', rate='30/m', block=True), name='dispatch')
 @method_decorator(block_ip, name='dispatch')
-class ProductRecommendationView(GenericAPIView):
+class ProductRecommendationView(ConditionalGetMixin, GenericAPIView):
     serializer_class = ProductRecommendationSerializer
     queryset = ProductRecommendation.objects.none()  # Suppress schema warnings
 
+    def conditional_validators(self, request, product_id):
+        # Each precompute run stamps the rows it writes; one index range read.
+        written = ProductRecommendation.objects.filter(product_id=product_id, user__isnull=True) \
+            .aggregate(at=Max("created_at"))["at"]
+        stamps = [last_modified()] + ([written.timestamp()] if written else [])
+        return [written, *generation_key_parts()], max(stamps)
+
     @extend_schema(
         responses=ProductRecommendationSerializer(many=True),
         parameters=[
@@ -52,7 +66,8 @@ class ProductRecommendationView(GenericAPIView):
         description="Get product recommendations for a specific product based on similarity.",
     )
     def get(self, request, product_id):
-        recs = ProductRecommendation.objects.filter(product_id=product_id).order_by("-score")[:10]
+        recs = ProductRecommendation.objects.filter(product_id=product_id, user__isnull=True) \
+            .select_related("recommended_product").order_by("-score")[:10]
         serializer = self.get_serializer(recs, many=True)
         return Response(serializer.data)
 
@@ -63,9 +78,15 @@ class ProductRecommendationView(GenericAPIView):
 
 @method_decorator(ratelimit(key='ip', rate='30/m', block=True), name='dispatch')
 @method_decorator(block_ip, name='dispatch')
-class UserRecommendationView(GenericAPIView):
+class UserRecommendationView(ConditionalGetMixin, GenericAPIView):
     serializer_class = ProductRecommendationSerializer
     queryset = ProductRecommendation.objects.none()  # Suppress schema warnings
+    cache_control = PRIVATE_CACHE_CONTROL
+
+    def conditional_validators(self, request, user_id):
+        written = ProductRecommendation.objects.filter(user_id=user_id).aggregate(at=Max("created_at"))["at"]
+        stamps = [last_modified()] + ([written.timestamp()] if written else [])
+        return [written, *generation_key_parts()], max(stamps)
 
     @extend_schema(
         responses=ProductRecommendationSerializer(many=True),
@@ -80,7 +101,8 @@ class UserRecommendationView(GenericAPIView):
         description="Get product recommendations for a specific user.",
     )
     def get(self, request, user_id):
-        recs = ProductRecommendation.objects.filter(user_id=user_id).order_by("-score")[:10]
+        recs = ProductRecommendation.objects.filter(user_id=user_id) \
+            .select_related("recommended_product").order_by("-score")[:10]
         serializer = self.get_serializer(recs, many=True)
         return Response(serializer.data)
 
@@ -108,10 +130,14 @@ class RecommendationFeedbackView(GenericAPIView):
 # ------------------------
 # AI Product Recommendations (Embedding similarity)
 # ------------------------
-class AIProductRecommendationView(GenericAPIView):
+class AIProductRecommendationView(ConditionalGetMixin, GenericAPIView):
     serializer_class = AIProductSerializer
     queryset = Product.objects.none()  # Suppress schema warnings
 
+    def conditional_validators(self, request, product_id):
+        # Neighbours only change with the embedding index; no query needed.
+        return [index_version(), *generation_key_parts()], None
+
     @extend_schema(
         responses=AIProductSerializer(many=True),
         parameters=[
@@ -125,21 +151,11 @@ class AIProductRecommendationView(GenericAPIView):
         description="Get product recommendations based on embedding similarity.",
     )
     def get(self, request, product_id):
-        try:
-            prod_emb = ProductEmbedding.objects.get(product_id=product_id)
-        except ProductEmbedding.DoesNotExist:
+        product_ids = similar_products(product_id, k=10)
+        if product_ids is None:
             return Response({"error": "Embedding not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        vector = np.frombuffer(prod_emb.embedding, dtype=np.float32)
-        all_embeddings = ProductEmbedding.objects.exclude(product_id=product_id)
-        results = []
-        for e in all_embeddings:
-            emb_vector = np.frombuffer(e.embedding, dtype=np.float32)
-            score = np.dot(vector, emb_vector) / (np.linalg.norm(vector) * np.linalg.norm(emb_vector))
-            results.append((score, e.product))
-
-        results.sort(reverse=True)
-        top_products = [p for _, p in results[:10]]
+        top_products = fetch_products_in_order(product_ids)
         serializer = self.get_serializer(top_products, many=True)
         return Response(serializer.data)
 
@@ -147,9 +163,14 @@ class AIProductRecommendationView(GenericAPIView):
 # ------------------------
 # AI User Recommendations
 # ------------------------
-class AIUserRecommendationView(GenericAPIView):
+class AIUserRecommendationView(ConditionalGetMixin, GenericAPIView):
     serializer_class = AIProductSerializer
     queryset = Product.objects.none()  # Suppress schema warnings
+    cache_control = PRIVATE_CACHE_CONTROL
+
+    def conditional_validators(self, request, user_id):
+        embedded = UserEmbedding.objects.filter(user_id=user_id).values_list("updated_at", flat=True).first()
+        return [embedded, index_version(), *generation_key_parts()], None
 
     @extend_schema(
         responses=AIProductSerializer(many=True),
@@ -164,40 +185,96 @@ class AIUserRecommendationView(GenericAPIView):
         description="Get product recommendations for a user based on their embedding.",
     )
     def get(self, request, user_id):
-        try:
-            user_emb = UserEmbedding.objects.get(user_id=user_id)
-        except UserEmbedding.DoesNotExist:
+        recommendations = recommend_for_users([user_id])
+        if user_id not in recommendations:
             return Response({"error": "User embedding not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        user_vector = np.frombuffer(user_emb.embedding, dtype=np.float32)
-        all_products = ProductEmbedding.objects.all()
-        results = []
-        for e in all_products:
-            emb_vector = np.frombuffer(e.embedding, dtype=np.float32)
-            score = np.dot(user_vector, emb_vector) / (np.linalg.norm(user_vector) * np.linalg.norm(emb_vector))
-            results.append((score, e.product))
-
-        results.sort(reverse=True)
-        top_products = [p for _, p in results[:10]]
+        top_products = fetch_products_in_order(recommendations[user_id])
         serializer = self.get_serializer(top_products, many=True)
         return Response(serializer.data)
 
 
+# ------------------------
+# AI User Recommendations (batch)
+# ------------------------
+class AIUserRecommendationBatchView(GenericAPIView):
+    serializer_class = BatchUserRecommendationRequestSerializer
+    permission_classes = [permissions.IsAdminUser]
+    queryset = Product.objects.none()  # Suppress schema warnings
+
+    @extend_schema(
+        request=BatchUserRecommendationRequestSerializer,
+        description="Score many users against the product embeddings in one request.",
+    )
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user_ids = serializer.validated_data["user_ids"]
+
+        recommendations = recommend_for_users(user_ids, k=serializer.validated_data["limit"])
+        products = Product.objects.in_bulk({pid for ids in recommendations.values() for pid in ids})
+        results = [
+            {
+                "user_id": user_id,
+                "recommendations": AIProductSerializer(
+                    [products[pid] for pid in recommendations[user_id] if pid in products], many=True
+                ).data,
+            }
+            for user_id in dict.fromkeys(user_ids)
+            if user_id in recommendations
+        ]
+        missing = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in recommendations]
+        return Response({"results": results, "missing": missing})
+
+
 # ------------------------
 # Trending Products
 # ------------------------
-class TrendingProductsView(GenericAPIView):
+TRENDING_CACHE_KEY = "ai:trending:{scope}:{ranking}"
+TRENDING_CACHE_TIMEOUT = 60  # seconds; the ranking itself is refreshed every minute
+
+
+class TrendingProductsView(ConditionalGetMixin, GenericAPIView):
     serializer_class = AIProductSerializer
     queryset = Product.objects.none()  # Suppress schema warnings
 
+    def conditional_validators(self, request):
+        # The precomputed ranking itself is the validator: one cache read.
+        return self.ranking(request)[1], None
+
+    def ranking(self, request):
+        """``(product ids, validator parts)``, read once so the ETag and the body agree."""
+        if getattr(self, "_ranking", None) is None:
+            product_ids = trending.top_products(self.category_id(request), k=10)
+            self._ranking = product_ids, [*product_ids, *generation_key_parts()]
+        return self._ranking
+
+    def category_id(self, request):
+        try:
+            return int(request.query_params["category_id"])
+        except (KeyError, ValueError):
+            return None
+
     @extend_schema(
+        parameters=[OpenApiParameter("category_id", int, description="Trending within one category")],
         responses=AIProductSerializer(many=True),
-        description="Get the top 10 trending products based on purchase and view counts.",
+        description="Get the top 10 trending products by time-decayed views and purchases.",
     )
     def get(self, request):
-        trending = Product.objects.order_by("-purchase_count", "-view_count")[:10]
-        serializer = self.get_serializer(trending, many=True)
-        return Response(serializer.data)
+        category_id = self.category_id(request)
+        # The ranking is precomputed by catalog.tasks.refresh_trending.
+        product_ids, parts = self.ranking(request)
+
+        def compute():
+            products = fetch_products_in_order(product_ids)
+            return self.get_serializer(products, many=True).data
+
+        # Keyed by the ranking, so a cached body always matches the ETag; every
+        # worker would otherwise recompute it at once when it expires.
+        ranking = hashlib.md5(":".join(map(str, parts)).encode()).hexdigest()
+        key = TRENDING_CACHE_KEY.format(scope=trending.scope_for(category_id), ranking=ranking)
+        data = get_or_compute(key, compute, TRENDING_CACHE_TIMEOUT, endpoint="ai-trending")
+        return Response(data)
 
 
 # ------------------------
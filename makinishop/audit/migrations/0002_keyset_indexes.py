@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("audit", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="auditlog",
+            index=models.Index(
+                fields=["-timestamp", "-id"], name="auditlog_timestamp_id_idx"
+            ),
+        ),
+    ]
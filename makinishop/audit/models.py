@@ -21,6 +21,9 @@ class AuditLog(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['-timestamp', '-id'], name='auditlog_timestamp_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.model_name} {self.object_id} {self.action} by {self.user}"
@@ -12,7 +12,7 @@ TRACKED_MODELS = ['Product', 'Category', 'Wishlist', 'FeaturedProduct']
 def model_to_dict(instance):
     data = {}
     for field in instance._meta.fields:
-        value = getattr(instance, field.name)
+        value = getattr(instance, field.attname)  # FK columns as raw ids, not model instances
         if isinstance(value, datetime):
             data[field.name] = value.isoformat()
         elif isinstance(value, Decimal):
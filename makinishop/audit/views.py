@@ -1,9 +1,11 @@
 # audit/views.py
 from rest_framework import generics, permissions
+from utils.pagination import KeysetPaginationMixin
 from .models import AuditLog
 from .serializers import AuditLogSerializer
 
-class AuditLogListView(generics.ListAPIView):
+class AuditLogListView(KeysetPaginationMixin, generics.ListAPIView):
+    keyset_field = 'timestamp'
     serializer_class = AuditLogSerializer
     permission_classes = [permissions.IsAdminUser]
     queryset = AuditLog.objects.all()
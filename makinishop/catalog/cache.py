@@ -0,0 +1,88 @@
+"""
+Generation counters for catalog caches.
+
+Instead of deleting cached responses, catalog writes bump a counter and cache
+keys embed the counters they depend on, so stale entries are simply never
+read again and age out on their TTL. There is one global counter, bumped by
+every catalog write, and one counter per category, bumped when something in
+that category changes. A response filtered to one category only needs that
+category's counter, so edits elsewhere in the catalog do not evict it.
+Such listings include subcategories, so a change also bumps the counters
+of every ancestor category (``catalog.tree``).
+
+Counters are bumped from ``catalog.signals`` after the transaction commits.
+Writes that bypass model signals (``QuerySet.update``, raw SQL) must call
+``bump_generations`` themselves. Workers read the counters through the
+in-process tier of ``utils.tiered_cache``; a bump tells every worker to drop
+its copy.
+
+``last_modified`` gives the matching ``Last-Modified`` validator: the latest
+``updated_at`` (or bump time, which also covers deletes) for a scope,
+computed once per generation.
+"""
+import time
+
+from django.core.cache import cache
+from django.db.models import Max
+from utils.tiered_cache import local_cache
+from .models import Category, Product
+from .tree import ancestor_ids, subtree_ids
+
+GLOBAL_GENERATION_KEY = "catalog:generation"
+CATEGORY_GENERATION_KEY = "catalog:generation:category:{category_id}"
+CHANGED_AT_KEY = "{key}:changed_at"
+LAST_MODIFIED_KEY = "catalog:last_modified:{scope}"
+LAST_MODIFIED_TIMEOUT = 60 * 60 * 6
+
+
+def _category_key(category_id):
+    return CATEGORY_GENERATION_KEY.format(category_id=category_id)
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # First bump: start above the implicit 0 that readers assume.
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def bump_generations(category_ids=()):
+    """Invalidate catalog caches globally and for each of ``category_ids`` and their ancestors."""
+    category_ids = {int(c) for c in category_ids if c is not None}
+    category_ids |= {a for c in category_ids for a in ancestor_ids(c)}
+    keys = [GLOBAL_GENERATION_KEY] + [_category_key(c) for c in sorted(category_ids)]
+    now = time.time()
+    for key in keys:
+        cache.set(CHANGED_AT_KEY.format(key=key), now, timeout=None)
+        _incr(key)
+        local_cache.invalidate(key)
+
+
+def generation(category_id=None):
+    """Current counter for ``category_id``, or the global one."""
+    key = GLOBAL_GENERATION_KEY if category_id is None else _category_key(category_id)
+    return local_cache.get(key, 0)
+
+
+def generation_key_parts(category_id=None):
+    """Cache key components for a response scoped to ``category_id`` (or the whole catalog)."""
+    if category_id is None:
+        return (f"g{generation()}",)
+    return (f"c{category_id}.{generation(category_id)}",)
+
+
+def last_modified(category_id=None):
+    """Epoch seconds of the last change to ``category_id`` (or the whole catalog)."""
+    key = GLOBAL_GENERATION_KEY if category_id is None else _category_key(category_id)
+    scope = "-".join(generation_key_parts(category_id))
+
+    def compute():
+        products = Product.objects.all() if category_id is None else Product.objects.filter(category_id__in=subtree_ids(category_id))
+        stamps = [products.aggregate(at=Max("updated_at"))["at"], Category.objects.aggregate(at=Max("updated_at"))["at"]]
+        stamps = [stamp.timestamp() for stamp in stamps if stamp is not None]
+        stamps.append(cache.get(CHANGED_AT_KEY.format(key=key)) or 0)
+        return int(max(stamps))
+
+    return local_cache.get_or_set(LAST_MODIFIED_KEY.format(scope=scope), compute, LAST_MODIFIED_TIMEOUT)
@@ -0,0 +1,82 @@
+"""
+``ProductCard`` read model.
+
+A card is everything a listing row shows (name, price, variant price range,
+primary image, stock status, rating, category) copied into one table, so
+card-shaped listings are a single-table scan with no joins or prefetches.
+
+Cards are rebuilt set-wise with one ``INSERT ... SELECT ... ON CONFLICT``
+per batch of products. ``catalog.signals`` refreshes them synchronously,
+inside the writing transaction, when a product, its images or variants, or
+its category change, so a card commits or rolls back with its source rows.
+Writes that bypass signals (``QuerySet.update``, bulk imports) should call
+``refresh_cards`` or queue ``catalog.tasks.refresh_product_cards``.
+"""
+from django.db import connection
+
+from .models import Category, Product, ProductCard, ProductImage, ProductVariant
+
+LOW_STOCK_THRESHOLD = 5
+BATCH_SIZE = 1000
+
+# ``ProductListSerializer`` fields a card can serve.
+CARD_FIELDS = {
+    'id', 'name', 'slug', 'price', 'min_price', 'max_price', 'stock_status',
+    'avg_rating', 'rating_count', 'category', 'primary_image',
+}
+
+REFRESH_SQL = """
+INSERT INTO {card} (
+    product_id, name, slug, price, min_price, max_price, primary_image, stock_status,
+    avg_rating, rating_count, category_id, category_name, category_slug, is_active, created_at, refreshed_at
+)
+SELECT p.id, p.name, p.slug, p.price, v.min_price, v.max_price,
+       (SELECT COALESCE(i.cloudinary_url, i.path) FROM {image} i
+        WHERE i.product_id = p.id ORDER BY i.is_primary DESC, i.id LIMIT 1),
+       CASE WHEN p.stock <= 0 THEN 'out_of_stock' WHEN p.stock <= %s THEN 'low_stock' ELSE 'in_stock' END,
+       p.avg_rating, p.rating_count, p.category_id, c.name, c.slug, p.is_active, p.created_at, now()
+FROM {product} p
+LEFT JOIN {category} c ON c.id = p.category_id
+LEFT JOIN LATERAL (
+    SELECT MIN(price) AS min_price, MAX(price) AS max_price FROM {variant} WHERE product_id = p.id
+) v ON TRUE
+WHERE p.id = ANY(%s)
+ON CONFLICT (product_id) DO UPDATE SET
+    name = EXCLUDED.name, slug = EXCLUDED.slug, price = EXCLUDED.price,
+    min_price = EXCLUDED.min_price, max_price = EXCLUDED.max_price,
+    primary_image = EXCLUDED.primary_image, stock_status = EXCLUDED.stock_status,
+    avg_rating = EXCLUDED.avg_rating, rating_count = EXCLUDED.rating_count,
+    category_id = EXCLUDED.category_id, category_name = EXCLUDED.category_name,
+    category_slug = EXCLUDED.category_slug, is_active = EXCLUDED.is_active,
+    created_at = EXCLUDED.created_at, refreshed_at = EXCLUDED.refreshed_at
+"""
+
+
+def _refresh_sql():
+    quote = connection.ops.quote_name
+    return REFRESH_SQL.format(
+        card=quote(ProductCard._meta.db_table),
+        product=quote(Product._meta.db_table),
+        image=quote(ProductImage._meta.db_table),
+        variant=quote(ProductVariant._meta.db_table),
+        category=quote(Category._meta.db_table),
+    )
+
+
+def refresh_cards(product_ids=None):
+    """Rebuild the cards of ``product_ids`` (every product by default); returns the number written."""
+    if product_ids is None:
+        product_ids = Product.objects.values_list('id', flat=True).order_by('id')
+    product_ids = [pk for pk in product_ids if pk is not None]
+    written = 0
+    sql = _refresh_sql()
+    with connection.cursor() as cursor:
+        for start in range(0, len(product_ids), BATCH_SIZE):
+            cursor.execute(sql, [LOW_STOCK_THRESHOLD, product_ids[start:start + BATCH_SIZE]])
+            written += cursor.rowcount
+    return written
+
+
+def serves_fields(fields):
+    """Whether a listing with these ``ProductListSerializer`` fields can be served from cards."""
+    return set(fields) <= CARD_FIELDS
@@ -0,0 +1,147 @@
+"""
+Buffered product counters (``view_count``, ``purchase_count``).
+
+Views and purchases are counted with ``HINCRBY`` into one Redis hash per
+counter, so the request path never touches the product row. A periodic task
+(``catalog.tasks.flush_product_counters``) folds the deltas into Postgres
+with one ``UPDATE ... FROM (VALUES ...)`` per batch.
+
+Delivery is at-least-once: a flush first ``RENAMENX``es the pending hashes to
+``:flushing`` keys, applies them, and only then deletes them. A flush that
+dies in between leaves the ``:flushing`` keys behind and the next flush
+applies them again before taking new deltas, so a delta can be counted twice
+after a crash but is never lost.
+
+Without a Redis cache backend (e.g. tests) increments are applied directly.
+"""
+import logging
+import time
+from collections import defaultdict
+
+from django.db import connection, transaction
+from redis.exceptions import LockError
+
+from utils.redis_utils import get_redis
+from . import trending
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("view_count", "purchase_count")
+PENDING_KEY = "counters:product:{field}"
+FLUSHING_KEY = "counters:product:{field}:flushing"
+PENDING_SINCE_KEY = "counters:product:pending_since"
+FLUSHING_SINCE_KEY = "counters:product:flushing_since"
+STATS_KEY = "counters:product:stats"
+LOCK_KEY = "counters:product:flush_lock"
+LOCK_TTL = 300
+BATCH_SIZE = 1000
+
+UPDATE_SQL = """
+UPDATE {product} AS p
+SET view_count = p.view_count + v.views, purchase_count = p.purchase_count + v.purchases
+FROM (VALUES {rows}) AS v(id, views, purchases)
+WHERE p.id = v.id
+"""
+
+
+def increment(product_id, field, amount=1):
+    """Count ``amount`` views or purchases of ``product_id``; flushed to the row later."""
+    if field not in FIELDS:
+        raise ValueError(f"Unknown counter: {field}")
+    redis = get_redis()
+    if redis is None:
+        apply_deltas({product_id: {field: amount}})
+        return
+    try:
+        pipe = redis.pipeline(transaction=False)
+        pipe.hincrby(PENDING_KEY.format(field=field), product_id, amount)
+        pipe.set(PENDING_SINCE_KEY, time.time(), nx=True)
+        pipe.execute()
+    except Exception as exc:
+        # Tracking must not fail the request it is counting.
+        logger.warning(f"Counter {field} for product {product_id} dropped: {exc}")
+
+
+def record_view(product_id, category_id=None):
+    increment(product_id, "view_count")
+    trending.record(product_id, category_id, trending.VIEW_WEIGHT)
+
+
+def record_purchase(product_id, quantity=1, category_id=None):
+    increment(product_id, "purchase_count", quantity)
+    trending.record(product_id, category_id, trending.PURCHASE_WEIGHT * quantity)
+
+
+def apply_deltas(deltas):
+    """Add ``{product_id: {field: delta}}`` to the product rows; one statement per batch."""
+    rows = [
+        (int(pk), int(counts.get("view_count", 0)), int(counts.get("purchase_count", 0)))
+        for pk, counts in sorted(deltas.items(), key=lambda item: int(item[0]))
+    ]
+    table = connection.ops.quote_name(Product._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Sorted ids lock rows in a consistent order, so concurrent flushes cannot deadlock.
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            values = ", ".join(["(%s::bigint, %s::bigint, %s::bigint)"] * len(batch))
+            cursor.execute(UPDATE_SQL.format(product=table, rows=values), [value for row in batch for value in row])
+    return len(rows)
+
+
+def flush():
+    """Move buffered deltas into Postgres; returns the number of products updated."""
+    redis = get_redis()
+    if redis is None:
+        return 0
+    # A token lock: a flush that outlives LOCK_TTL cannot release the next holder's lock.
+    lock = redis.lock(LOCK_KEY, timeout=LOCK_TTL, blocking=False)
+    if not lock.acquire():
+        return 0
+    try:
+        # Leftovers from a failed flush keep their :flushing keys and go first;
+        # RENAMENX then leaves the new deltas pending for the next round.
+        for pending, flushing in [(PENDING_KEY.format(field=f), FLUSHING_KEY.format(field=f)) for f in FIELDS] + [
+            (PENDING_SINCE_KEY, FLUSHING_SINCE_KEY)
+        ]:
+            if redis.exists(pending):
+                redis.renamenx(pending, flushing)
+
+        deltas = defaultdict(dict)
+        for field in FIELDS:
+            for pk, delta in redis.hgetall(FLUSHING_KEY.format(field=field)).items():
+                deltas[int(pk)][field] = int(delta)
+        since = redis.get(FLUSHING_SINCE_KEY)
+        updated = apply_deltas(deltas) if deltas else 0
+        redis.delete(*[FLUSHING_KEY.format(field=f) for f in FIELDS], FLUSHING_SINCE_KEY)
+
+        now = time.time()
+        redis.hset(STATS_KEY, mapping={
+            "last_flush_at": now,
+            "last_flush_products": updated,
+            "last_flush_lag_seconds": round(now - float(since), 3) if since else 0,
+        })
+        redis.hincrby(STATS_KEY, "flushes", 1)
+        return updated
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            logger.warning("Counter flush outlived its lock; another flush may have overlapped it")
+
+
+def counter_stats():
+    """Flush lag and backlog: how far the product rows trail the counted events."""
+    redis = get_redis()
+    if redis is None:
+        return {"buffered": False}
+    stats = {key.decode(): float(value) for key, value in redis.hgetall(STATS_KEY).items()}
+    since = redis.get(PENDING_SINCE_KEY)
+    return {
+        "buffered": True,
+        "pending_products": {field: redis.hlen(PENDING_KEY.format(field=field)) for field in FIELDS},
+        # Age of the oldest delta not yet in Postgres.
+        "current_lag_seconds": round(time.time() - float(since), 3) if since else 0,
+        "flush_in_progress": bool(redis.exists(FLUSHING_SINCE_KEY, *[FLUSHING_KEY.format(field=f) for f in FIELDS])),
+        **stats,
+    }
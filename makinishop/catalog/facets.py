@@ -0,0 +1,56 @@
+"""
+Facet counts for product listings.
+
+All facets of the current filter set come from one statement: the filtered
+queryset becomes a CTE, each row is assigned its price and rating band, and
+``GROUPING SETS`` counts per category, per price band and per rating band in
+a single pass.
+"""
+from django.db import connection
+
+from .models import Category
+
+# Lower bounds of the price bands; the last band is open-ended.
+PRICE_BAND_EDGES = [0, 25, 50, 100, 250, 500, 1000]
+
+FACETS_SQL = """
+WITH filtered AS ({filtered}),
+banded AS (
+    SELECT category_id,
+           width_bucket(price, %s::numeric[]) AS price_band,
+           FLOOR(avg_rating)::int AS rating_band
+    FROM filtered
+)
+SELECT GROUPING(b.category_id) AS g_category,
+       GROUPING(b.price_band) AS g_price,
+       b.category_id, c.name, b.price_band, b.rating_band, COUNT(*)
+FROM banded b
+LEFT JOIN {category_table} c ON c.id = b.category_id
+GROUP BY GROUPING SETS ((b.category_id, c.name), (b.price_band), (b.rating_band))
+"""
+
+
+def product_facets(queryset):
+    """``{"category": [...], "price": [...], "rating": [...]}`` counts for ``queryset``."""
+    filtered, params = queryset.order_by().values('category_id', 'price', 'avg_rating').query.sql_with_params()
+    sql = FACETS_SQL.format(filtered=filtered, category_table=connection.ops.quote_name(Category._meta.db_table))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, PRICE_BAND_EDGES])
+        rows = cursor.fetchall()
+
+    facets = {'category': [], 'price': [], 'rating': []}
+    for g_category, g_price, category_id, name, price_band, rating_band, count in rows:
+        if g_category == 0:
+            facets['category'].append({'id': category_id, 'name': name, 'count': count})
+        elif g_price == 0:
+            # width_bucket: band i covers [edges[i-1], edges[i]); 0 would be below the first edge.
+            low = PRICE_BAND_EDGES[max(price_band - 1, 0)]
+            high = PRICE_BAND_EDGES[price_band] if price_band < len(PRICE_BAND_EDGES) else None
+            facets['price'].append({'min': low, 'max': high, 'count': count})
+        else:
+            facets['rating'].append({'rating': rating_band, 'count': count})
+
+    facets['category'].sort(key=lambda f: -f['count'])
+    facets['price'].sort(key=lambda f: f['min'])
+    facets['rating'].sort(key=lambda f: -f['rating'])
+    return facets
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from catalog.ratings import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recompute product rating aggregates from reviews and fix any that drifted."
+
+    def handle(self, *args, **options):
+        drifted = reconcile()
+        self.stdout.write(f"{len(drifted)} products corrected")
+        if drifted and options["verbosity"] > 1:
+            self.stdout.write(", ".join(map(str, drifted)))
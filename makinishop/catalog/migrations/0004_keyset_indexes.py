@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0003_productimage_cloudinary_url"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["is_active", "-created_at", "-id"],
+                name="product_active_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productreview",
+            index=models.Index(
+                fields=["product", "-created_at", "-id"],
+                name="review_product_created_idx",
+            ),
+        ),
+    ]
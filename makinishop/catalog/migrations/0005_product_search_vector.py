@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:33
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_search_vectors(apps, schema_editor):
+    Product = apps.get_model("catalog", "Product")
+    Category = apps.get_model("catalog", "Category")
+    category_name = Subquery(
+        Category.objects.filter(pk=OuterRef("category_id")).values("name")[:1]
+    )
+    Product.objects.update(
+        search_vector=SearchVector("name", weight="A", config="english")
+        + SearchVector(Coalesce("sku", Value("")), weight="A", config="english")
+        + SearchVector(Coalesce(category_name, Value("")), weight="B", config="english")
+        + SearchVector(
+            Coalesce("description", Value(""), output_field=TextField()),
+            weight="C",
+            config="english",
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0004_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="idx_product_search_vector"
+            ),
+        ),
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Same statement as catalog.cards.REFRESH_SQL, for every product.
+FILL_CARDS_SQL = """
+INSERT INTO catalog_productcard (
+    product_id, name, slug, price, min_price, max_price, primary_image, stock_status,
+    avg_rating, rating_count, category_id, category_name, category_slug, is_active, created_at, refreshed_at
+)
+SELECT p.id, p.name, p.slug, p.price, v.min_price, v.max_price,
+       (SELECT COALESCE(i.cloudinary_url, i.path) FROM catalog_productimage i
+        WHERE i.product_id = p.id ORDER BY i.is_primary DESC, i.id LIMIT 1),
+       CASE WHEN p.stock <= 0 THEN 'out_of_stock' WHEN p.stock <= 5 THEN 'low_stock' ELSE 'in_stock' END,
+       p.avg_rating, p.rating_count, p.category_id, c.name, c.slug, p.is_active, p.created_at, now()
+FROM catalog_product p
+LEFT JOIN catalog_category c ON c.id = p.category_id
+LEFT JOIN LATERAL (
+    SELECT MIN(price) AS min_price, MAX(price) AS max_price
+    FROM catalog_productvariant WHERE product_id = p.id
+) v ON TRUE
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0005_product_search_vector"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductCard",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="card",
+                        serialize=False,
+                        to="catalog.product",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255)),
+                ("slug", models.SlugField(max_length=255)),
+                ("price", models.DecimalField(decimal_places=2, max_digits=12)),
+                (
+                    "min_price",
+                    models.DecimalField(decimal_places=2, max_digits=12, null=True),
+                ),
+                (
+                    "max_price",
+                    models.DecimalField(decimal_places=2, max_digits=12, null=True),
+                ),
+                ("primary_image", models.TextField(null=True)),
+                (
+                    "stock_status",
+                    models.CharField(
+                        choices=[
+                            ("in_stock", "In stock"),
+                            ("low_stock", "Low stock"),
+                            ("out_of_stock", "Out of stock"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("avg_rating", models.DecimalField(decimal_places=2, max_digits=3)),
+                ("rating_count", models.IntegerField()),
+                ("category_id", models.BigIntegerField(null=True)),
+                ("category_name", models.CharField(max_length=255, null=True)),
+                ("category_slug", models.SlugField(max_length=255, null=True)),
+                ("is_active", models.BooleanField()),
+                ("created_at", models.DateTimeField()),
+                ("refreshed_at", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["is_active", "-created_at", "-product"],
+                        name="card_active_created_idx",
+                    ),
+                    models.Index(
+                        fields=["category_id", "is_active"], name="card_category_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunSQL(FILL_CARDS_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:43
+
+from django.db import migrations, models
+
+# Nothing maintained the aggregates before this migration: compute them once
+# (same grouping as catalog.ratings.RECONCILE_SQL).
+FILL_AGGREGATES_SQL = """
+UPDATE catalog_product AS p
+SET rating_count = a.rating_count, rating_sum = a.rating_sum, review_count = a.review_count,
+    avg_rating = COALESCE(ROUND(a.rating_sum::numeric / NULLIF(a.rating_count, 0), 2), 0)
+FROM (
+    SELECT product_id,
+           COUNT(*) FILTER (WHERE is_public) AS rating_count,
+           COALESCE(SUM(rating) FILTER (WHERE is_public), 0) AS rating_sum,
+           COUNT(*) FILTER (WHERE is_public AND COALESCE(btrim(comment), '') <> '') AS review_count
+    FROM catalog_productreview
+    GROUP BY product_id
+) AS a
+WHERE p.id = a.product_id
+"""
+
+SYNC_CARDS_SQL = """
+UPDATE catalog_productcard AS c
+SET avg_rating = p.avg_rating, rating_count = p.rating_count
+FROM catalog_product p
+WHERE c.product_id = p.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0006_product_card"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_sum",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunSQL(FILL_AGGREGATES_SQL, migrations.RunSQL.noop),
+        migrations.RunSQL(SYNC_CARDS_SQL, migrations.RunSQL.noop),
+    ]
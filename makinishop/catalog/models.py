@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils import timezone
 from django.utils.text import slugify
@@ -12,13 +15,43 @@ class Category(models.Model):
     name = models.CharField(max_length=255, unique=True)
     slug = models.SlugField(max_length=255, unique=True, blank=True)
     description = models.TextField(blank=True, null=True)
+    parent = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='children')
+    # Materialised path of ancestor ids, e.g. "/3/17/" for a child of 17 under 3 ("/" for roots).
+    # The subtree of a category is itself plus every path starting with "<path><id>/".
+    path = models.CharField(max_length=255, default='/', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # varchar_pattern_ops lets "path LIKE 'prefix%'" use the index under any collation.
+            models.Index(fields=['path'], name='category_path_idx', opclasses=['varchar_pattern_ops']),
+        ]
+
+    @property
+    def subtree_prefix(self):
+        return f"{self.path}{self.pk}/"
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        parent_prefix = self.parent.subtree_prefix if self.parent_id else '/'
+        old_prefix = None
+        if self.pk is not None:
+            old_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first()
+            old_prefix = f"{old_path}{self.pk}/" if old_path is not None else None
+            if old_prefix and parent_prefix.startswith(old_prefix):
+                raise ValueError("A category cannot be moved under itself or its descendants.")
+        self.path = parent_prefix
+        self.depth = parent_prefix.count('/') - 1
         super().save(*args, **kwargs)
+        if old_prefix and old_prefix != self.subtree_prefix:
+            # Re-root the whole subtree in one statement.
+            Category.objects.filter(path__startswith=old_prefix).update(
+                path=Concat(Value(self.subtree_prefix), Substr('path', len(old_prefix) + 1)),
+                depth=F('depth') + (self.subtree_prefix.count('/') - old_prefix.count('/')),
+            )
 
     def __str__(self):
         return self.name
@@ -39,9 +72,11 @@ class Product(models.Model):
     metadata = models.JSONField(default=dict, blank=True)
     avg_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0)
     rating_count = models.IntegerField(default=0)
+    rating_sum = models.BigIntegerField(default=0)  # of public ratings; see catalog.ratings
     review_count = models.IntegerField(default=0)
     view_count = models.BigIntegerField(default=0)
     purchase_count = models.BigIntegerField(default=0)
+    search_vector = SearchVectorField(null=True, editable=False)  # maintained by catalog.signals
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -49,7 +84,9 @@ class Product(models.Model):
         indexes = [
             models.Index(fields=['category', 'is_active']),
             models.Index(fields=['price']),
+            models.Index(fields=['is_active', '-created_at', '-id'], name='product_active_created_idx'),
             GinIndex(fields=['name'], name='idx_product_name_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['search_vector'], name='idx_product_search_vector'),
         ]
 
     def save(self, *args, **kwargs):
@@ -165,7 +202,47 @@ class ProductReview(models.Model):
         indexes = [
             models.Index(fields=['product']),
             models.Index(fields=['user']),
+            models.Index(fields=['product', '-created_at', '-id'], name='review_product_created_idx'),
         ]
 
     def __str__(self):
         return f"Review {self.rating}★ for {self.product.name}"
+
+
+# ==========================================================
+# PRODUCT CARD (read model)
+# ==========================================================
+class ProductCard(models.Model):
+    """Ready-to-serve listing row for one product, maintained by ``catalog.cards``."""
+    STOCK_STATUS_CHOICES = [
+        ('in_stock', 'In stock'),
+        ('low_stock', 'Low stock'),
+        ('out_of_stock', 'Out of stock'),
+    ]
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='card')
+    name = models.CharField(max_length=255)
+    slug = models.SlugField(max_length=255)
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+    min_price = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    max_price = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    primary_image = models.TextField(null=True)
+    stock_status = models.CharField(max_length=20, choices=STOCK_STATUS_CHOICES)
+    avg_rating = models.DecimalField(max_digits=3, decimal_places=2)
+    rating_count = models.IntegerField()
+    # Denormalised, not a foreign key: a card never needs a join to render.
+    category_id = models.BigIntegerField(null=True)
+    category_name = models.CharField(max_length=255, null=True)
+    category_slug = models.SlugField(max_length=255, null=True)
+    is_active = models.BooleanField()
+    created_at = models.DateTimeField()
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active', '-created_at', '-product'], name='card_active_created_idx'),
+            models.Index(fields=['category_id', 'is_active'], name='card_category_idx'),
+        ]
+
+    def __str__(self):
+        return f"Card: {self.name}"
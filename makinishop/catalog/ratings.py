@@ -0,0 +1,115 @@
+"""
+Rating aggregates on ``Product``.
+
+Only public reviews count. ``rating_count`` and ``rating_sum`` cover every
+public review and ``review_count`` those with a written comment;
+``avg_rating`` is ``rating_sum / rating_count`` rounded to two places.
+
+``catalog.signals`` applies each review write as a delta: a single
+``UPDATE`` with ``F()`` expressions, so concurrent reviews of one product
+never overwrite each other and nothing is re-aggregated. ``reconcile``
+recomputes every product from the reviews in one grouped statement and is
+run by ``manage.py reconcile_ratings`` to repair drift (e.g. reviews changed
+with ``QuerySet.update``).
+"""
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Value, When
+from django.db.models.functions import Cast, Round
+
+from .cache import bump_generations
+from .cards import refresh_cards
+from .models import Product, ProductReview
+
+NO_CONTRIBUTION = (0, 0, 0)
+
+RECONCILE_SQL = """
+UPDATE {product} AS p
+SET rating_count = a.rating_count, rating_sum = a.rating_sum, review_count = a.review_count,
+    avg_rating = COALESCE(ROUND(a.rating_sum::numeric / NULLIF(a.rating_count, 0), 2), 0)
+FROM (
+    SELECT p2.id,
+           COUNT(r.id) FILTER (WHERE r.is_public) AS rating_count,
+           COALESCE(SUM(r.rating) FILTER (WHERE r.is_public), 0) AS rating_sum,
+           COUNT(r.id) FILTER (WHERE r.is_public AND COALESCE(btrim(r.comment), '') <> '') AS review_count
+    FROM {product} p2
+    LEFT JOIN {review} r ON r.product_id = p2.id
+    GROUP BY p2.id
+) AS a
+WHERE p.id = a.id
+  AND (p.rating_count, p.rating_sum, p.review_count, p.avg_rating) IS DISTINCT FROM (
+      a.rating_count, a.rating_sum, a.review_count,
+      COALESCE(ROUND(a.rating_sum::numeric / NULLIF(a.rating_count, 0), 2), 0)
+  )
+RETURNING p.id, p.category_id
+"""
+
+
+def contribution(product_id, rating, is_public, comment):
+    """``(product_id, (rating_count, rating_sum, review_count))`` one review adds to its product."""
+    if not is_public:
+        return product_id, NO_CONTRIBUTION
+    return product_id, (1, rating, 1 if (comment or '').strip() else 0)
+
+
+def review_contribution(review):
+    return contribution(review.product_id, review.rating, review.is_public, review.comment)
+
+
+def stored_contribution(review_id):
+    """What the saved row of ``review_id`` adds to its product; ``None`` if there is no row."""
+    row = ProductReview.objects.filter(pk=review_id) \
+        .values_list('product_id', 'rating', 'is_public', 'comment').first()
+    return contribution(*row) if row is not None else None
+
+
+def apply_delta(product_id, rating_count, rating_sum, review_count):
+    """Add the deltas to one product and recompute its average in the same ``UPDATE``."""
+    if not (rating_count or rating_sum or review_count):
+        return
+    new_count = F('rating_count') + rating_count
+    new_sum = F('rating_sum') + rating_sum
+    average = ExpressionWrapper(
+        Cast(new_sum, DecimalField(max_digits=20, decimal_places=4)) / new_count,
+        output_field=DecimalField(max_digits=20, decimal_places=4),
+    )
+    Product.objects.filter(pk=product_id).update(
+        rating_count=new_count,
+        rating_sum=new_sum,
+        review_count=F('review_count') + review_count,
+        avg_rating=Case(
+            When(rating_count__gt=-rating_count, then=Round(average, 2)),
+            default=Value(0),
+            output_field=DecimalField(max_digits=3, decimal_places=2),
+        ),
+    )
+    # QuerySet.update skips Product signals: keep the listing card and caches in step.
+    refresh_cards([product_id])
+    category_id = Product.objects.filter(pk=product_id).values_list('category_id', flat=True).first()
+    transaction.on_commit(lambda: bump_generations([category_id]))
+
+
+def apply_change(before, after):
+    """Move a review's contribution from ``before`` to ``after`` (either may be ``None``)."""
+    deltas = {}
+    for state, sign in ((before, -1), (after, 1)):
+        if state is None:
+            continue
+        product_id, values = state
+        current = deltas.get(product_id, NO_CONTRIBUTION)
+        deltas[product_id] = tuple(c + sign * v for c, v in zip(current, values))
+    for product_id, values in sorted(deltas.items()):
+        apply_delta(product_id, *values)
+
+
+def reconcile():
+    """Recompute every product's aggregates in one grouped statement; returns the ids that drifted."""
+    quote = connection.ops.quote_name
+    sql = RECONCILE_SQL.format(product=quote(Product._meta.db_table), review=quote(ProductReview._meta.db_table))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql)
+        rows = cursor.fetchall()
+        if rows:
+            refresh_cards([product_id for product_id, _ in rows])
+            category_ids = {category_id for _, category_id in rows}
+            transaction.on_commit(lambda: bump_generations(category_ids))
+    return [product_id for product_id, _ in rows]
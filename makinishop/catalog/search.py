@@ -0,0 +1,79 @@
+"""
+Ranked product search.
+
+``Product.search_vector`` holds a weighted tsvector (A: name and SKU,
+B: category name, C: description) kept current by ``catalog.signals`` and
+indexed with GIN. A query matches on that vector (``@@``) or, for typo
+tolerance, on trigram similarity of the name (``%``, served by
+``idx_product_name_trgm``), so both branches are index scans. Results are
+ordered by ``ts_rank`` plus a share of the trigram similarity and carry a
+``ts_headline`` snippet.
+"""
+from django.contrib.postgres.search import (
+    SearchHeadline, SearchQuery, SearchRank, SearchVector, TrigramSimilarity,
+)
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import Coalesce
+
+from .models import Category, Product
+
+SEARCH_CONFIG = 'english'
+TRIGRAM_WEIGHT = 0.5  # share of name similarity added to the full-text rank
+HEADLINE_OPTIONS = {
+    'start_sel': '<mark>',
+    'stop_sel': '</mark>',
+    'max_words': 30,
+    'min_words': 10,
+    'max_fragments': 2,
+}
+
+_trigram_available = None
+
+
+def trigram_available():
+    """pg_trgm is installed by initdb/01_pg_trgm.sql; fall back to full text only without it."""
+    global _trigram_available
+    if _trigram_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_available = cursor.fetchone() is not None
+    return _trigram_available
+
+
+def product_search_vector():
+    category_name = Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1])
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Coalesce('sku', Value('')), weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Coalesce(category_name, Value('')), weight='B', config=SEARCH_CONFIG)
+        + SearchVector(Coalesce('description', Value(''), output_field=TextField()), weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(queryset=None):
+    """Recompute ``search_vector`` in one UPDATE for ``queryset`` (all products by default)."""
+    queryset = Product.objects.all() if queryset is None else queryset
+    return queryset.update(search_vector=product_search_vector())
+
+
+def search_products(queryset, text, ranked=True):
+    """Filter ``queryset`` to products matching ``text``; with ``ranked``, best matches first.
+
+    Ranked results are annotated with ``rank`` and a ``highlight`` snippet.
+    """
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    rank = SearchRank(F('search_vector'), query)
+    matches = Q(search_vector=query)
+    if trigram_available():
+        rank = rank + TRIGRAM_WEIGHT * TrigramSimilarity('name', text)
+        matches |= Q(name__trigram_similar=text)
+    queryset = queryset.filter(matches)
+    if not ranked:
+        return queryset
+    return queryset.annotate(
+        rank=rank,
+        highlight=SearchHeadline(
+            Coalesce('description', 'name', output_field=TextField()), query, config=SEARCH_CONFIG, **HEADLINE_OPTIONS
+        ),
+    ).order_by('-rank', '-id')
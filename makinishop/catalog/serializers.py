@@ -1,10 +1,20 @@
+from django.db.models import Max, Min, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
-from .models import Category, Product, ProductImage, ProductVariant, FeaturedProduct, ProductEmbedding, Wishlist,ProductReview
+from .models import Category, Product, ProductImage, ProductVariant, FeaturedProduct, ProductEmbedding, Wishlist,ProductReview, ProductCard
+from .cards import CARD_FIELDS, LOW_STOCK_THRESHOLD
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ['id', 'name', 'slug', 'description', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'slug', 'description', 'parent', 'path', 'depth', 'created_at', 'updated_at']
+        read_only_fields = ['path', 'depth']
+
+    def validate_parent(self, parent):
+        if parent is not None and self.instance is not None:
+            if parent.pk == self.instance.pk or parent.path.startswith(self.instance.subtree_prefix):
+                raise serializers.ValidationError("A category cannot be moved under itself or its descendants.")
+        return parent
 
 class ProductImageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -29,15 +39,119 @@ class ProductSerializer(serializers.ModelSerializer):
             'metadata', 'category', 'images', 'variants', 'created_at', 'updated_at'
         ]
 
+class CategoryBriefSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'slug']
+
+class ProductListSerializer(serializers.ModelSerializer):
+    """Compact product rows for listings.
+
+    Rows carry the primary image URL and the variant price range instead of the
+    nested images and variants. Clients pick the shape with ``?fields=`` (only
+    these fields) and ``?expand=`` (defaults plus these), e.g.
+    ``?expand=description,images``; views shape their querysets with
+    ``product_list_queryset`` so unused relations are never loaded.
+    """
+    category = CategoryBriefSerializer(read_only=True)
+    primary_image = serializers.CharField(read_only=True, allow_null=True)
+    min_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True, allow_null=True)
+    max_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True, allow_null=True)
+    stock_status = serializers.SerializerMethodField()
+    images = ProductImageSerializer(many=True, read_only=True)
+    variants = ProductVariantSerializer(many=True, read_only=True)
+
+    default_fields = [
+        'id', 'name', 'slug', 'price', 'min_price', 'max_price', 'stock_status',
+        'avg_rating', 'rating_count', 'category', 'primary_image',
+    ]
+
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'sku', 'name', 'slug', 'description', 'price', 'min_price', 'max_price', 'stock', 'stock_status',
+            'is_active', 'avg_rating', 'rating_count', 'review_count', 'view_count', 'purchase_count',
+            'metadata', 'category', 'primary_image', 'images', 'variants', 'created_at', 'updated_at'
+        ]
+
+    def get_stock_status(self, obj):
+        if obj.stock <= 0:
+            return 'out_of_stock'
+        return 'low_stock' if obj.stock <= LOW_STOCK_THRESHOLD else 'in_stock'
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        wanted = requested_product_fields(request) if request is not None else self.default_fields
+        return {name: field for name, field in fields.items() if name in wanted}
+
+
+def _csv(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+def requested_product_fields(request):
+    """``ProductListSerializer`` fields selected by ``?fields=`` / ``?expand=``; unknown names are ignored."""
+    available = ProductListSerializer.Meta.fields
+    fields = [name for name in _csv(request.query_params.get('fields')) if name in available]
+    fields = fields or list(ProductListSerializer.default_fields)
+    fields += [name for name in _csv(request.query_params.get('expand')) if name in available and name not in fields]
+    return fields
+
+def product_list_queryset(queryset, fields):
+    """Load only what ``fields`` of ``ProductListSerializer`` need: no unused joins, prefetches or columns."""
+    if 'category' in fields:
+        queryset = queryset.select_related('category')
+    if 'images' in fields:
+        queryset = queryset.prefetch_related(Prefetch('images', queryset=ProductImage.objects.all()))
+    if 'variants' in fields:
+        queryset = queryset.prefetch_related(Prefetch('variants', queryset=ProductVariant.objects.all()))
+    if 'primary_image' in fields:
+        images = ProductImage.objects.filter(product=OuterRef('pk')).order_by('-is_primary', 'id')
+        queryset = queryset.annotate(primary_image=Subquery(
+            images.annotate(url=Coalesce('cloudinary_url', 'path')).values('url')[:1]
+        ))
+    for name, aggregate in (('min_price', Min), ('max_price', Max)):
+        if name in fields:
+            prices = ProductVariant.objects.filter(product=OuterRef('pk')).values('product')
+            queryset = queryset.annotate(**{name: Subquery(prices.annotate(value=aggregate('price')).values('value'))})
+    return queryset.defer(*[name for name in ('description', 'metadata', 'search_vector') if name not in fields])
+
+class ProductCardSerializer(serializers.ModelSerializer):
+    """Renders a ``ProductCard`` exactly like ``ProductListSerializer`` renders the product."""
+    id = serializers.IntegerField(source='product_id', read_only=True)
+    category = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProductCard
+        fields = [name for name in ProductListSerializer.Meta.fields if name in CARD_FIELDS]
+
+    def get_category(self, card):
+        if card.category_id is None:
+            return None
+        return {'id': card.category_id, 'name': card.category_name, 'slug': card.category_slug}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        wanted = requested_product_fields(request) if request is not None else ProductListSerializer.default_fields
+        return {name: field for name, field in fields.items() if name in wanted}
+
+class ProductSearchSerializer(ProductSerializer):
+    rank = serializers.FloatField(read_only=True)
+    highlight = serializers.CharField(read_only=True)
+
+    class Meta(ProductSerializer.Meta):
+        fields = ProductSerializer.Meta.fields + ['rank', 'highlight']
+
 class FeaturedProductSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+    product = ProductListSerializer(read_only=True)
 
     class Meta:
         model = FeaturedProduct
         fields = ['id', 'product', 'start_date', 'end_date', 'priority', 'is_personalized', 'metadata', 'created_at', 'updated_at']
 
 class WishlistSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+    product = ProductListSerializer(read_only=True)
 
     class Meta:
         model = Wishlist
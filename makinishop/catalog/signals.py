@@ -1,6 +1,13 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, post_init, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import ProductReview, Wishlist
+from .models import Category, Product, ProductCard, ProductImage, ProductVariant, FeaturedProduct, ProductReview, Wishlist
+from .cache import bump_generations
+from .search import update_search_vectors
+from . import suggest
+from .cards import refresh_cards
+from . import tree
+from . import ratings
 from user_events.models import UserEvent
 
 @receiver(post_save, sender=ProductReview)
@@ -21,3 +28,132 @@ def create_wishlist_event(sender, instance, created, **kwargs):
             event_type='wishlist_add',
             product=instance.product
         )
+
+
+# -----------------------------
+# Cache generations
+# -----------------------------
+def _bump_on_commit(*category_ids):
+    transaction.on_commit(lambda: bump_generations(category_ids))
+
+@receiver(post_init, sender=Product)
+def remember_product_category(sender, instance, **kwargs):
+    # A product moved between categories must invalidate both of them.
+    instance._loaded_category_id = instance.__dict__.get('category_id')
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product(sender, instance, **kwargs):
+    _bump_on_commit(instance.category_id, getattr(instance, '_loaded_category_id', None))
+    instance._loaded_category_id = instance.category_id
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=FeaturedProduct)
+@receiver(post_delete, sender=FeaturedProduct)
+def invalidate_product_child(sender, instance, **kwargs):
+    category_id = Product.objects.filter(pk=instance.product_id).values_list('category_id', flat=True).first()
+    _bump_on_commit(category_id)
+
+@receiver(post_init, sender=Category)
+def remember_category_path(sender, instance, **kwargs):
+    # A category moved in the tree must invalidate its old ancestors too.
+    instance._loaded_path = instance.__dict__.get('path')
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category(sender, instance, **kwargs):
+    transaction.on_commit(tree.bump_tree_version)
+    ancestors = tree.ancestor_ids(instance.pk, instance.path)
+    ancestors += tree.ancestor_ids(instance.pk, getattr(instance, '_loaded_path', None) or '/')
+    _bump_on_commit(instance.pk, *ancestors)
+    instance._loaded_path = instance.path
+
+@receiver(pre_delete, sender=Category)
+def lift_category_children(sender, instance, **kwargs):
+    tree.lift_children(instance)
+
+
+# -----------------------------
+# Search vectors
+# -----------------------------
+SEARCHABLE_FIELDS = {'name', 'sku', 'description', 'category', 'category_id'}
+
+@receiver(post_save, sender=Product)
+def refresh_product_search_vector(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCHABLE_FIELDS & set(update_fields):
+        return  # e.g. counter updates
+    update_search_vectors(Product.objects.filter(pk=instance.pk))
+
+@receiver(post_save, sender=Category)
+def refresh_category_search_vectors(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vectors(Product.objects.filter(category_id=instance.pk))
+
+
+# -----------------------------
+# Typeahead index
+# -----------------------------
+SUGGEST_FIELDS = {'name', 'slug', 'is_active'}
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def refresh_product_suggestions(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SUGGEST_FIELDS & set(update_fields):
+        return
+    product_id = instance.pk  # cleared on the instance once a delete completes
+    transaction.on_commit(lambda: suggest.update_product(product_id))
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def refresh_category_suggestions(sender, instance, **kwargs):
+    category_id = instance.pk
+    transaction.on_commit(lambda: suggest.update_category(category_id))
+
+
+# -----------------------------
+# Product cards
+# -----------------------------
+# Refreshed inside the writing transaction, so a card commits with its source rows.
+CARD_SOURCE_FIELDS = {'name', 'slug', 'price', 'stock', 'avg_rating', 'rating_count', 'category', 'category_id', 'is_active', 'created_at'}
+
+@receiver(post_save, sender=Product)
+def refresh_product_card(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not CARD_SOURCE_FIELDS & set(update_fields):
+        return
+    refresh_cards([instance.pk])
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def refresh_card_of_product(sender, instance, **kwargs):
+    refresh_cards([instance.product_id])
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def refresh_category_cards(sender, instance, **kwargs):
+    # After a delete the products are already detached; their cards still name the category.
+    refresh_cards(list(ProductCard.objects.filter(category_id=instance.pk).values_list('product_id', flat=True)))
+
+
+# -----------------------------
+# Rating aggregates
+# -----------------------------
+@receiver(pre_save, sender=ProductReview)
+@receiver(pre_delete, sender=ProductReview)
+def remember_review_contribution(sender, instance, **kwargs):
+    # What the stored row adds to its product, so the write can apply the difference.
+    # Read from the row itself: the instance may have deferred fields, or have been
+    # refreshed or edited since it was loaded.
+    instance._rating_contribution = None if instance._state.adding else ratings.stored_contribution(instance.pk)
+
+@receiver(post_save, sender=ProductReview)
+def update_rating_aggregates(sender, instance, created, **kwargs):
+    ratings.apply_change(instance._rating_contribution, ratings.review_contribution(instance))
+
+@receiver(post_delete, sender=ProductReview)
+def remove_rating_aggregates(sender, instance, **kwargs):
+    ratings.apply_change(instance._rating_contribution, None)
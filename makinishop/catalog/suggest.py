@@ -0,0 +1,415 @@
+"""
+Typeahead suggestions over product and category names.
+
+Every word of a name starts one index term ("red running shoe" is found by
+"red", "run" and "shoe"), so a lookup is an ordered scan over the terms that
+start with the typed text. Matches are ordered by a popularity weight
+(``purchase_count`` counts more than ``view_count``).
+
+With Redis the terms are members of one sorted set, ``"<term>\\0<kind>:<id>"``
+all scored 0, so ``ZRANGEBYLEX`` walks them in order, and each document's
+label, slug and weight sit in a hash. Short prefixes match too many terms to
+scan, so every prefix of up to ``PREFIX_LEN`` characters also gets a sorted
+set of its documents scored by weight; those lookups read the best documents
+first, and a longer prefix whose term scan would be cut off walks the set of
+its first ``PREFIX_LEN`` characters the same way. Product and category writes
+patch all of these in one watched ``MULTI`` (``update_product``/
+``update_category``): a few O(log n) set operations, with no shared blob to
+rewrite and nothing for other workers to reload. ``rebuild_index`` recomputes
+everything, including weights, into keys of a new build and swaps them into
+place; it runs periodically from ``catalog.tasks`` because counter updates do
+not fire signals, and is queued there when a lookup finds no index. A patch
+that commits while a rebuild is reading the catalog may be undone by it until
+the next rebuild.
+
+Without a Redis cache backend (e.g. tests) the same terms are kept in a
+sorted list in this process and searched with ``bisect``.
+"""
+import json
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db.models import Sum
+
+from utils.redis_utils import get_redis
+from utils.tiered_cache import local_cache
+from .models import Category, Product
+
+logger = logging.getLogger(__name__)
+
+TERMS_KEY = "catalog:suggest:terms"
+DOCS_KEY = "catalog:suggest:docs"
+BUILT_FIELD = "built_at"  # in DOCS_KEY once a full rebuild has populated it
+BUILD_FIELD = "build"  # in DOCS_KEY: the build whose prefix sets are live
+PREFIX_KEY = "catalog:suggest:prefix:{build}:{prefix}"
+PREFIXES_KEY = "catalog:suggest:prefixes:{build}"  # every prefix of a build, for cleanup
+VERSION_KEY = "catalog:suggest:version"
+REBUILD_LOCK_KEY = "catalog:suggest:rebuild_lock"
+REBUILD_LOCK_TTL = 10 * 60
+REBUILD_QUEUED_KEY = "catalog:suggest:rebuild_queued"
+REBUILD_BATCH = 1000  # documents written per pipeline round trip
+RETIRED_BUILD_TTL = 60  # lookups that read the previous build id finish against it
+PURCHASE_WEIGHT = 3.0  # a purchase is worth this many views
+PREFIX_LEN = 3  # prefixes up to this length have a weight-ordered set
+MAX_SCAN = 2000  # entries examined per lookup, by term or by weight
+SCAN_PAGE = 200
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+
+PRODUCT = "product"
+CATEGORY = "category"
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text):
+    """Lower-case, accent-free, single-spaced words."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def popularity(purchases, views):
+    return round(math.log1p(PURCHASE_WEIGHT * (purchases or 0) + (views or 0)), 4)
+
+
+def _terms(name):
+    words = normalize(name).split(" ")
+    return {" ".join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+def _prefixes(terms):
+    return {term[:n] for term in terms for n in range(1, min(len(term), PREFIX_LEN) + 1)}
+
+
+def ref_key(ref):
+    return f"{ref[0]}:{ref[1]}"
+
+
+def parse_ref(key):
+    kind, pk = key.split(":")
+    return kind, int(pk)
+
+
+def documents():
+    """``(ref, label, slug, weight)`` for every active product and every category."""
+    products = Product.objects.filter(is_active=True).values_list(
+        "id", "name", "slug", "purchase_count", "view_count"
+    )
+    for pk, name, slug, purchases, views in products.iterator(chunk_size=5000):
+        yield (PRODUCT, pk), name, slug, popularity(purchases, views)
+    categories = Category.objects.annotate(
+        purchases=Sum("product__purchase_count"), views=Sum("product__view_count")
+    ).values_list("id", "name", "slug", "purchases", "views")
+    for pk, name, slug, purchases, views in categories:
+        yield (CATEGORY, pk), name, slug, popularity(purchases, views)
+
+
+def rank(docs, limit):
+    """Best ``limit`` of ``{ref: (label, slug, weight)}`` as API results."""
+    ranked = sorted(docs, key=lambda ref: (-docs[ref][2], docs[ref][0]))[:limit]
+    return [{"type": kind, "id": pk, "label": docs[(kind, pk)][0], "slug": docs[(kind, pk)][1]} for kind, pk in ranked]
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        if not cache.add(VERSION_KEY, 1, timeout=None):
+            cache.incr(VERSION_KEY)
+    local_cache.invalidate(VERSION_KEY)
+
+
+# -- in-process fallback ------------------------------------------------------
+class SuggestIndex:
+    """Sorted ``terms`` with the document each one points at, plus document metadata."""
+
+    def __init__(self):
+        self.terms = []
+        self.refs = []
+        # (kind, id) -> (label, slug, weight)
+        self.docs = {}
+
+    @classmethod
+    def build(cls):
+        index = cls()
+        for ref, label, slug, weight in documents():
+            index.add(ref, label, slug, weight)
+        order = sorted(range(len(index.terms)), key=index.terms.__getitem__)
+        index.terms = [index.terms[i] for i in order]
+        index.refs = [index.refs[i] for i in order]
+        return index
+
+    def add(self, ref, name, slug, weight, keep_sorted=False):
+        self.docs[ref] = (name, slug, weight)
+        for term in _terms(name):
+            if keep_sorted:
+                position = bisect_left(self.terms, term)
+                self.terms.insert(position, term)
+                self.refs.insert(position, ref)
+            else:
+                self.terms.append(term)
+                self.refs.append(ref)
+
+    def remove(self, ref):
+        if self.docs.pop(ref, None) is None:
+            return
+        kept = [(term, r) for term, r in zip(self.terms, self.refs) if r != ref]
+        self.terms = [term for term, _ in kept]
+        self.refs = [r for _, r in kept]
+
+    def lookup(self, prefix, limit):
+        start = bisect_left(self.terms, prefix)
+        end = bisect_left(self.terms, prefix + "\U0010ffff", start)
+        matches = set(self.refs[start:end])
+        return rank({ref: self.docs[ref] for ref in matches}, limit)
+
+
+_local = {"index": None}
+_local_lock = threading.RLock()
+
+
+def _local_index():
+    with _local_lock:
+        if _local["index"] is None:
+            _local["index"] = SuggestIndex.build()
+        return _local["index"]
+
+
+# -- Redis --------------------------------------------------------------------
+def _member(term, ref):
+    return f"{term}\0{ref_key(ref)}"
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _load_docs(redis, keys):
+    return {
+        parse_ref(key): tuple(json.loads(raw))
+        for key, raw in zip(keys, redis.hmget(DOCS_KEY, keys))
+        if raw is not None
+    }
+
+
+def _queue_rebuild():
+    # First lookup after a deploy or a flushed Redis: build in a worker, once.
+    if cache.add(REBUILD_QUEUED_KEY, 1, REBUILD_LOCK_TTL):
+        from .tasks import rebuild_suggest_index
+
+        rebuild_suggest_index.delay()
+
+
+def _lookup_by_weight(redis, build, prefix, limit):
+    """Walk the weight-ordered set of ``prefix``'s first ``PREFIX_LEN`` characters, best first."""
+    key = PREFIX_KEY.format(build=build, prefix=prefix[:PREFIX_LEN])
+    docs = {}
+    for start in range(0, MAX_SCAN, SCAN_PAGE):
+        keys = [_decode(member) for member in redis.zrevrange(key, start, start + SCAN_PAGE - 1)]
+        if keys:
+            for ref, doc in _load_docs(redis, keys).items():
+                if len(prefix) <= PREFIX_LEN or any(term.startswith(prefix) for term in _terms(doc[0])):
+                    docs[ref] = doc
+        if len(docs) >= limit or len(keys) < SCAN_PAGE:
+            break
+    return docs
+
+
+def _redis_lookup(redis, prefix, limit):
+    low = b"[" + prefix.encode()
+    pipe = redis.pipeline(transaction=False)
+    pipe.hget(DOCS_KEY, BUILD_FIELD)
+    if len(prefix) > PREFIX_LEN:
+        pipe.zrangebylex(TERMS_KEY, low, low + b"\xff", start=0, num=MAX_SCAN)
+    build, *scanned = pipe.execute()
+    if build is None:
+        _queue_rebuild()
+        return []
+    if scanned and len(scanned[0]) < MAX_SCAN:
+        # Every matching term was read: rank all of their documents.
+        keys = list(dict.fromkeys(_decode(member).split("\0", 1)[1] for member in scanned[0]))
+        return rank(_load_docs(redis, keys), limit) if keys else []
+    return rank(_lookup_by_weight(redis, _decode(build), prefix, limit), limit)
+
+
+def _drop_build(redis, build, ttl=None):
+    """Delete (or expire after ``ttl``) the prefix sets of ``build``."""
+    prefixes_key = PREFIXES_KEY.format(build=build)
+    keys = [PREFIX_KEY.format(build=build, prefix=_decode(p)) for p in redis.smembers(prefixes_key)]
+    pipe = redis.pipeline(transaction=False)
+    for key in [*keys, prefixes_key]:
+        if ttl is None:
+            pipe.delete(key)
+        else:
+            pipe.expire(key, ttl)
+    pipe.execute()
+
+
+def _redis_rebuild(redis):
+    build = uuid.uuid4().hex
+    terms_key, docs_key = f"{TERMS_KEY}:build:{build}", f"{DOCS_KEY}:build:{build}"
+    documents_written = 0
+    swapped = False
+    try:
+        pipe = redis.pipeline(transaction=False)
+        prefixes = set()
+        for ref, label, slug, weight in documents():
+            terms = _terms(label)
+            if terms:
+                pipe.zadd(terms_key, {_member(term, ref): 0 for term in terms})
+            for prefix in _prefixes(terms):
+                pipe.zadd(PREFIX_KEY.format(build=build, prefix=prefix), {ref_key(ref): weight})
+                prefixes.add(prefix)
+            pipe.hset(docs_key, ref_key(ref), json.dumps([label, slug, weight]))
+            documents_written += 1
+            if documents_written % REBUILD_BATCH == 0:
+                pipe.execute()
+        if prefixes:
+            pipe.sadd(PREFIXES_KEY.format(build=build), *prefixes)
+        pipe.hset(docs_key, mapping={BUILT_FIELD: time.time(), BUILD_FIELD: build})
+        pipe.execute()
+
+        has_terms = redis.exists(terms_key)
+        previous = redis.hget(DOCS_KEY, BUILD_FIELD)
+        swap = redis.pipeline(transaction=True)
+        if has_terms:
+            swap.rename(terms_key, TERMS_KEY)
+        else:
+            swap.delete(TERMS_KEY)
+        swap.rename(docs_key, DOCS_KEY)
+        swap.execute()
+        swapped = True
+        if previous is not None:
+            _drop_build(redis, _decode(previous), ttl=RETIRED_BUILD_TTL)
+    finally:
+        redis.delete(terms_key, docs_key)  # only left over if the build failed
+        if not swapped:
+            _drop_build(redis, build)
+    return documents_written
+
+
+def _redis_patch(redis, ref, document):
+    key = ref_key(ref)
+
+    def apply(pipe):
+        build = pipe.hget(DOCS_KEY, BUILD_FIELD)
+        if build is None:
+            return  # nothing built yet; the first lookup queues a build
+        build = _decode(build)
+        previous = pipe.hget(DOCS_KEY, key)
+        stale = _terms(json.loads(previous)[0]) if previous is not None else set()
+        pipe.multi()
+        if stale:
+            pipe.zrem(TERMS_KEY, *[_member(term, ref) for term in stale])
+        for prefix in _prefixes(stale):
+            pipe.zrem(PREFIX_KEY.format(build=build, prefix=prefix), key)
+        if document is None:
+            pipe.hdel(DOCS_KEY, key)
+        else:
+            terms = _terms(document[0])
+            if terms:
+                pipe.zadd(TERMS_KEY, {_member(term, ref): 0 for term in terms})
+            prefixes = _prefixes(terms)
+            for prefix in prefixes:
+                pipe.zadd(PREFIX_KEY.format(build=build, prefix=prefix), {key: document[2]})
+            if prefixes:
+                pipe.sadd(PREFIXES_KEY.format(build=build), *prefixes)
+            pipe.hset(DOCS_KEY, key, json.dumps(list(document)))
+
+    # Watching the hash retries the patch if another write or a rebuild lands in between.
+    redis.transaction(apply, DOCS_KEY)
+
+
+def _previous_weight(ref):
+    redis = get_redis()
+    if redis is None:
+        previous = _local["index"].docs.get(ref) if _local["index"] is not None else None
+        return previous[2] if previous else 0.0
+    raw = redis.hget(DOCS_KEY, ref_key(ref))
+    return json.loads(raw)[2] if raw is not None else 0.0
+
+
+# -- public API ---------------------------------------------------------------
+def suggest(text, limit=DEFAULT_LIMIT):
+    prefix = normalize(text)
+    if not prefix:
+        return []
+    redis = get_redis()
+    if redis is None:
+        return _local_index().lookup(prefix, limit)
+    return _redis_lookup(redis, prefix, limit)
+
+
+def rebuild_index():
+    """Recompute the whole index (names and weights); returns the document count.
+
+    Returns ``None`` without doing anything while another process is rebuilding.
+    """
+    redis = get_redis()
+    if redis is None:
+        with _local_lock:
+            _local["index"] = SuggestIndex.build()
+            count = len(_local["index"].docs)
+    else:
+        token = uuid.uuid4().hex
+        if not cache.add(REBUILD_LOCK_KEY, token, REBUILD_LOCK_TTL):
+            return None
+        try:
+            count = _redis_rebuild(redis)
+        finally:
+            if cache.get(REBUILD_LOCK_KEY) == token:
+                cache.delete(REBUILD_LOCK_KEY)
+            cache.delete(REBUILD_QUEUED_KEY)
+    _bump_version()
+    return count
+
+
+def _patch(ref, document):
+    """Replace the terms and metadata of ``ref`` with ``document`` ``(label, slug, weight)``; ``None`` drops it."""
+    redis = get_redis()
+    try:
+        if redis is None:
+            with _local_lock:
+                index = _local["index"]
+                if index is None:
+                    return  # built from the database on the first lookup
+                index.remove(ref)
+                if document is not None:
+                    index.add(ref, *document, keep_sorted=True)
+        else:
+            _redis_patch(redis, ref, document)
+    except Exception as exc:
+        # Runs after the write committed; the next rebuild picks the change up.
+        logger.warning(f"Typeahead patch for {ref_key(ref)} failed: {exc}")
+        return
+    _bump_version()
+
+
+def update_product(product_id):
+    """Re-index one product after it was saved or deleted."""
+    product = Product.objects.filter(pk=product_id, is_active=True).values_list(
+        "name", "slug", "purchase_count", "view_count"
+    ).first()
+    document = None
+    if product is not None:
+        name, slug, purchases, views = product
+        document = (name, slug, popularity(purchases, views))
+    _patch((PRODUCT, product_id), document)
+
+
+def update_category(category_id):
+    """Re-index one category after it was saved or deleted; its weight is kept until the next rebuild."""
+    category = Category.objects.filter(pk=category_id).values_list("name", "slug").first()
+    ref = (CATEGORY, category_id)
+    document = None
+    if category is not None:
+        document = (*category, _previous_weight(ref))
+    _patch(ref, document)
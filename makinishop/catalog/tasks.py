@@ -0,0 +1,25 @@
+# catalog/tasks.py
+from celery import shared_task
+from catalog.cards import refresh_cards
+from catalog import counters, trending
+from catalog.suggest import rebuild_index
+
+@shared_task
+def rebuild_suggest_index():
+    """Refresh typeahead weights; view and purchase counters change without signals."""
+    return {'documents': rebuild_index()}
+
+@shared_task
+def refresh_product_cards(product_ids=None):
+    """Rebuild listing cards after writes that skip signals (bulk imports, ``QuerySet.update``)."""
+    return refresh_cards(product_ids)
+
+@shared_task
+def flush_product_counters():
+    """Fold buffered view/purchase deltas into the product rows."""
+    return counters.flush()
+
+@shared_task
+def refresh_trending():
+    """Precompute the decayed top-N per scope so trending reads are a key lookup."""
+    return trending.refresh()
@@ -1,8 +1,22 @@
 
+import time
+from decimal import Decimal
+from unittest import mock
 from rest_framework.test import APITestCase
 from rest_framework import status
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from .models import Category, Product
+from django.utils import timezone
+from utils.cache_utils import cache_stats, get_or_compute
+from utils.tiered_cache import local_cache
+from users.models import UserAccount
+from . import counters, ratings, suggest, trending
+from .cache import bump_generations
+from .cards import refresh_cards
+from .models import Category, Product, ProductCard, ProductImage, ProductReview, ProductVariant, Wishlist
 
 class CategoryPublicTest(APITestCase):
 	def test_list_categories_public(self):
@@ -15,3 +29,505 @@ class ProductModelTest(APITestCase):
 		cat = Category.objects.create(name='TestCat')
 		prod = Product.objects.create(name='TestProd', category=cat)
 		self.assertTrue(Product.objects.filter(name='TestProd').exists())
+
+class ProductListCacheTest(APITestCase):
+	def setUp(self):
+		cache.clear()
+		local_cache.invalidate()
+		Product.objects.create(name='Cached', price=10)
+
+	def test_hit_serves_rendered_page_without_queries(self):
+		url = reverse('product-list')
+		first = self.client.get(url, {'min_price': 5, 'page': 1})
+		self.assertEqual(first['X-Cache'], 'MISS')
+		with self.assertNumQueries(0):
+			second = self.client.get(url + '?max_price=&min_price=5')
+		self.assertEqual(second['X-Cache'], 'HIT')
+		self.assertEqual(second.json(), first.json())
+		self.assertEqual(self.client.get(url, {'min_price': 20})['X-Cache'], 'MISS')
+
+
+class CatalogGenerationTest(APITestCase):
+	def setUp(self):
+		cache.clear()
+		local_cache.invalidate()
+		self.shoes = Category.objects.create(name='Shoes')
+		self.hats = Category.objects.create(name='Hats')
+		self.boot = Product.objects.create(name='Boot', price=10, category=self.shoes)
+		Product.objects.create(name='Cap', price=5, category=self.hats)
+
+	def test_price_change_invalidates_only_affected_pages(self):
+		url = reverse('product-list')
+		self.client.get(url)
+		self.client.get(url, {'category_id': self.shoes.id})
+		self.client.get(url, {'category_id': self.hats.id})
+
+		with self.captureOnCommitCallbacks(execute=True):
+			self.boot.price = 12
+			self.boot.save()
+
+		response = self.client.get(url)
+		self.assertEqual(response['X-Cache'], 'MISS')
+		prices = {p['name']: p['price'] for p in response.json()['results']}
+		self.assertEqual(prices['Boot'], '12.00')
+		self.assertEqual(self.client.get(url, {'category_id': self.shoes.id})['X-Cache'], 'MISS')
+		self.assertEqual(self.client.get(url, {'category_id': self.hats.id})['X-Cache'], 'HIT')
+
+
+class StampedeProtectionTest(APITestCase):
+	def setUp(self):
+		cache.clear()
+		local_cache.invalidate()
+		self.compute = mock.Mock(return_value='fresh')
+
+	def test_expired_value_is_served_while_another_worker_recomputes(self):
+		cache.set('hot', ('stale', time.time() - 1, 0.5), 600)
+		cache.add('hot:lock', 'other-worker', 10)
+		self.assertEqual(get_or_compute('hot', self.compute, 60, endpoint='hot'), 'stale')
+		self.compute.assert_not_called()
+		self.assertEqual(cache_stats()['hot']['stale'], 1)
+
+	def test_concurrent_miss_waits_for_lease_holder(self):
+		cache.add('hot:lock', 'other-worker', 10)
+		finish = lambda _: cache.set('hot', ('computed elsewhere', time.time() + 60, 0.1), 600)
+		with mock.patch('utils.cache_utils.time.sleep', side_effect=finish):
+			self.assertEqual(get_or_compute('hot', self.compute, 60, endpoint='hot'), 'computed elsewhere')
+		self.compute.assert_not_called()
+		self.assertEqual(cache_stats()['hot']['coalesced'], 1)
+
+	def test_single_recompute_then_hits(self):
+		for _ in range(3):
+			self.assertEqual(get_or_compute('hot', self.compute, 60, endpoint='hot'), 'fresh')
+		self.compute.assert_called_once()
+		self.assertIsNone(cache.get('hot:lock'))
+
+
+class TwoTierCacheTest(APITestCase):
+	def setUp(self):
+		cache.clear()
+		local_cache.invalidate()
+
+	def test_category_list_served_from_worker_memory_until_invalidated(self):
+		Category.objects.create(name='Toys')
+		url = reverse('category-list')
+		self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+		with self.assertNumQueries(0):
+			self.assertEqual(self.client.get(url)['X-Cache'], 'HIT-LOCAL')
+		self.assertGreater(local_cache.stats()['local_hit_ratio'], 0)
+		with self.captureOnCommitCallbacks(execute=True):
+			Category.objects.create(name='Games')
+		response = self.client.get(url)
+		self.assertEqual(response['X-Cache'], 'MISS')
+		self.assertEqual(response.json()['count'], 2)
+
+	def test_invalidation_during_remote_read_is_not_overwritten(self):
+		cache.set('tiered-test', 'old')
+		remote_get = cache.get
+
+		def racing_get(key, default=None):
+			value = remote_get(key, default)
+			cache.set(key, 'new')
+			local_cache.invalidate(key)
+			return value
+
+		with mock.patch.object(cache, 'get', side_effect=racing_get):
+			self.assertEqual(local_cache.get('tiered-test'), 'old')
+		self.assertEqual(local_cache.get('tiered-test'), 'new')
+
+
+class ProductKeysetPaginationTest(APITestCase):
+	def setUp(self):
+		cache.clear()
+		local_cache.invalidate()
+		now = timezone.now()
+		# Two products per timestamp, so the id tiebreaker matters.
+		Product.objects.bulk_create([
+			Product(name=f'K{i}', slug=f'k{i}', created_at=now - timezone.timedelta(minutes=i // 2))
+			for i in range(7)
+		])
+		refresh_cards()  # bulk_create skips the signals that maintain listing cards
+
+	def test_cursor_pages_cover_every_product_once_without_count(self):
+		url = reverse('product-list')
+		response = self.client.get(url, {'pagination': 'cursor', 'page_size': 3})
+		seen = []
+		while True:
+			self.assertNotIn('count', response.json())
+			seen += [p['id'] for p in response.json()['results']]
+			if not response.json()['next']:
+				break
+			response = self.client.get(response.json()['next'])
+		expected = list(Product.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+		self.assertEqual(seen, expected)
+
+	def test_invalid_cursor_is_404(self):
+		response = self.client.get(reverse('product-list'), {'cursor': 'garbage'})
+		self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ProductSearchTest(APITestCase):
+	def setUp(self):
+		cache.clear()
+		local_cache.invalidate()
+		shoes = Category.objects.create(name='Running Shoes')
+		Product.objects.create(name='Trail Runner', description='Lightweight shoe for muddy trails', category=shoes)
+		Product.objects.create(name='Leather Boot', description='A boot that pairs with any runner outfit')
+		Product.objects.create(name='Coffee Mug', description='Ceramic mug')
+
+	def test_ranked_results_with_highlights(self):
+		response = self.client.get(reverse('product-search'), {'q': 'runner'})
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		results = response.json()
+		self.assertEqual([r['name'] for r in results], ['Trail Runner', 'Leather Boot'])
+		paged = self.client.get(reverse('product-search'), {'q': 'runner', 'pagination': 'page'}).json()
+		self.assertEqual((paged['count'], paged['results']), (2, results))
+		self.assertGreater(results[0]['rank'], results[1]['rank'])
+		self.assertIn('<mark>runner</mark>', results[1]['highlight'])
+
+	def test_category_name_is_searchable_and_kept_current(self):
+		self.assertEqual(self.client.get(reverse('product-list'), {'q': 'shoes'}).json()['count'], 1)
+		category = Category.objects.get(name='Running Shoes')
+		category.name = 'Trail Footwear'
+		category.save()
+		cache.clear()
+		self.assertEqual(self.client.get(reverse('product-list'), {'q': 'footwear'}).json()['count'], 1)
+
+
+class ProductFacetTest(APITestCase):
+	def setUp(self):
+		cache.clear()
+		local_cache.invalidate()
+		self.shoes = Category.objects.create(name='Shoes')
+		Product.objects.create(name='Runner', price=30, avg_rating=4.5, category=self.shoes)
+		Product.objects.create(name='Boot', price=120, avg_rating=4.1, category=self.shoes)
+		Product.objects.create(name='Sock', price=5, avg_rating=3.2)
+		Product.objects.create(name='Hidden', price=5, is_active=False)
+
+	def test_facets_for_current_filter_set_in_one_query(self):
+		url = reverse('product-list')
+		with self.assertNumQueries(5):  # Last-Modified (2, once per generation), page count, page, facets
+			response = self.client.get(url, {'facets': 1})
+		facets = response.json()['facets']
+		self.assertEqual(facets['category'], [
+			{'id': self.shoes.id, 'name': 'Shoes', 'count': 2}, {'id': None, 'name': None, 'count': 1},
+		])
+		self.assertEqual(facets['price'], [
+			{'min': 0, 'max': 25, 'count': 1}, {'min': 25, 'max': 50, 'count': 1}, {'min': 100, 'max': 250, 'count': 1},
+		])
+		self.assertEqual(facets['rating'], [{'rating': 4, 'count': 2}, {'rating': 3, 'count': 1}])
+
+		filtered = self.client.get(url, {'facets': 1, 'max_price': 50}).json()['facets']
+		self.assertEqual(sum(f['count'] for f in filtered['price']), 2)
+
+
+class ProductSuggestTest(APITestCase):
+	def setUp(self):
+		cache.clear()
+		local_cache.invalidate()
+		self.shoes = Category.objects.create(name='Shoes')
+		self.runner = Product.objects.create(name='Trail Runner', category=self.shoes, purchase_count=50)
+		self.shoe = Product.objects.create(name='Running Shoe', category=self.shoes, view_count=10)
+		Product.objects.create(name='Café Mug', view_count=1)
+		suggest.rebuild_index()
+
+	def test_prefix_matches_any_word_ordered_by_popularity(self):
+		url = reverse('product-suggest')
+		results = self.client.get(url, {'q': 'run'}).json()['results']
+		self.assertEqual([r['id'] for r in results], [self.runner.id, self.shoe.id])
+		# Accents and case are normalised; categories are suggested too.
+		self.assertEqual(self.client.get(url, {'q': 'CAFE'}).json()['results'][0]['label'], 'Café Mug')
+		# A category weighs as much as all of its products together.
+		results = self.client.get(url, {'q': 'sho'}).json()['results']
+		self.assertEqual([(r['type'], r['id']) for r in results], [('category', self.shoes.id), ('product', self.shoe.id)])
+
+		# Served from the index alone: no database queries.
+		with self.assertNumQueries(0):
+			self.client.get(url, {'q': 'tr'})
+
+	def test_product_changes_patch_the_index(self):
+		url = reverse('product-suggest')
+		with self.captureOnCommitCallbacks(execute=True):
+			self.shoe.name = 'Xtreme Shoe'
+			self.shoe.save()
+		self.assertEqual([r['id'] for r in self.client.get(url, {'q': 'xtr'}).json()['results']], [self.shoe.id])
+		self.assertEqual(self.client.get(url, {'q': 'running'}).json()['results'], [])
+		with self.captureOnCommitCallbacks(execute=True):
+			self.runner.delete()
+		self.assertEqual(self.client.get(url, {'q': 'trail'}).json()['results'], [])
+
+	@override_settings(RATELIMIT_ENABLE=True)
+	def test_typeahead_has_its_own_rate_limit(self):
+		for _ in range(61):
+			self.assertEqual(self.client.get(reverse('product-suggest'), {'q': 'r'}).status_code, 200)
+		self.assertEqual(self.client.get(reverse('product-list')).status_code, 200)
+
+
+class ProductListShapeTest(APITestCase):
+	def setUp(self):
+		cache.clear()
+		local_cache.invalidate()
+		self.product = Product.objects.create(name='Lamp', price=40, description='Long text', category=Category.objects.create(name='Home'))
+		ProductImage.objects.create(product=self.product, path='lamp-side.jpg')
+		ProductImage.objects.create(product=self.product, path='lamp.jpg', cloudinary_url='https://cdn/lamp.jpg', is_primary=True)
+		ProductVariant.objects.create(product=self.product, name='Small', price=35)
+		ProductVariant.objects.create(product=self.product, name='Large', price=55)
+
+	def test_compact_rows_by_default(self):
+		url = reverse('product-list')
+		with self.assertNumQueries(4):  # Last-Modified (2, once per generation), count, page with image/price subqueries
+			row = self.client.get(url).json()['results'][0]
+		self.assertEqual(row['primary_image'], 'https://cdn/lamp.jpg')
+		self.assertEqual((row['min_price'], row['max_price']), ('35.00', '55.00'))
+		self.assertEqual(row['category'], {'id': self.product.category_id, 'name': 'Home', 'slug': 'home'})
+		self.assertNotIn('description', row)
+		self.assertNotIn('images', row)
+
+	def test_fields_and_expand(self):
+		url = reverse('product-list')
+		row = self.client.get(url, {'fields': 'id,name,bogus'}).json()['results'][0]
+		self.assertEqual(set(row), {'id', 'name'})
+		with self.assertNumQueries(3):  # count, page, images
+			row = self.client.get(url, {'expand': 'description,images'}).json()['results'][0]
+		self.assertEqual(row['description'], 'Long text')
+		self.assertEqual(len(row['images']), 2)
+
+	def test_wishlist_nests_the_same_shape(self):
+		user = UserAccount.objects.create_user(email='wish@example.com', password='pass')
+		Wishlist.objects.create(user=user, product=self.product)
+		self.client.force_authenticate(user=user)
+		response = self.client.get(reverse('wishlist-list'), {'fields': 'id,primary_image'})
+		results = response.json()
+		results = results.get('results', results)
+		self.assertEqual(results[0]['product'], {'id': self.product.id, 'primary_image': 'https://cdn/lamp.jpg'})
+
+
+class ProductCardTest(APITestCase):
+	def setUp(self):
+		cache.clear()
+		local_cache.invalidate()
+		self.category = Category.objects.create(name='Garden')
+		self.product = Product.objects.create(name='Hose', price=20, stock=3, category=self.category)
+
+	def card(self):
+		return ProductCard.objects.get(pk=self.product.pk)
+
+	def test_card_follows_product_images_variants_and_category(self):
+		self.assertEqual((self.card().stock_status, self.card().category_name), ('low_stock', 'Garden'))
+		ProductImage.objects.create(product=self.product, path='hose.jpg')
+		variant = ProductVariant.objects.create(product=self.product, name='30m', price=25)
+		self.assertEqual((self.card().primary_image, self.card().max_price), ('hose.jpg', 25))
+		variant.delete()
+		self.assertIsNone(self.card().max_price)
+		self.category.name = 'Outdoor'
+		self.category.save()
+		self.assertEqual(self.card().category_name, 'Outdoor')
+		self.category.delete()
+		self.assertIsNone(self.card().category_id)
+
+	def test_default_listing_reads_cards_only(self):
+		url = reverse('product-list')
+		from_cards = self.client.get(url).json()['results']
+		# Any field a card lacks falls back to the product query, with the same shape for shared fields.
+		from_products = self.client.get(url, {'expand': 'sku'}).json()['results']
+		self.assertEqual(from_cards[0], {k: v for k, v in from_products[0].items() if k != 'sku'})
+		self.assertEqual(from_cards[0]['stock_status'], 'low_stock')
+
+
+class ProductCounterTest(APITestCase):
+	def test_deltas_applied_in_one_statement(self):
+		a = Product.objects.create(name='A', view_count=5)
+		b = Product.objects.create(name='B', purchase_count=1)
+		with CaptureQueriesContext(connection) as queries:
+			counters.apply_deltas({b.id: {'view_count': 2, 'purchase_count': 3}, a.id: {'view_count': 1}})
+		self.assertEqual([q['sql'].split()[0] for q in queries if 'SAVEPOINT' not in q['sql']], ['UPDATE'])
+		self.assertEqual(list(Product.objects.order_by('id').values_list('view_count', 'purchase_count')), [(6, 0), (2, 4)])
+
+	def test_product_detail_counts_a_view(self):
+		product = Product.objects.create(name='Viewed')
+		self.client.get(reverse('product-detail', args=[product.id]))
+		counters.flush()  # a no-op unless views are buffered in Redis
+		product.refresh_from_db()
+		self.assertEqual(product.view_count, 1)
+
+
+class TrendingTest(APITestCase):
+	def test_buckets_cover_the_window_once_with_decay(self):
+		now = 1_000_000 * 3600 + 1234.0
+		weights = trending.bucket_weights('all', now)
+		minutes = [k for k in weights if k.startswith('trending:m:')]
+		hours = [k for k in weights if k.startswith('trending:h:')]
+		# The last hour reaches back into hour 999_999, so minute buckets cover all of it.
+		self.assertEqual(minutes[0], f'trending:m:{999_999 * 60}:all')
+		self.assertEqual(len(minutes), 60 + 21)
+		self.assertEqual(hours[-1], f'trending:h:{999_998}:all')
+		self.assertEqual(len(hours), trending.WINDOW_HOURS)
+		self.assertLess(weights[hours[0]], weights[hours[-1]])
+		self.assertLess(weights[hours[-1]], weights[minutes[0]])
+
+	def test_endpoint_filters_by_category(self):
+		cache.clear()
+		shoes = Category.objects.create(name='Shoes')
+		hot = Product.objects.create(name='Hot', purchase_count=9)
+		shoe = Product.objects.create(name='Shoe', purchase_count=1, category=shoes)
+		url = reverse('trending-products')
+		# Ranked from the Redis buckets, or from lifetime counters when there are none.
+		trending.record(hot.id, None, 9 * trending.PURCHASE_WEIGHT)
+		trending.record(shoe.id, shoes.id, trending.PURCHASE_WEIGHT)
+		trending.refresh()
+		self.assertEqual([p['id'] for p in self.client.get(url).json()], [hot.id, shoe.id])
+		self.assertEqual([p['id'] for p in self.client.get(url, {'category_id': shoes.id}).json()], [shoe.id])
+
+	def test_lifetime_fallback_is_cached_per_generation(self):
+		cache.clear()
+		local_cache.invalidate()
+		hot = Product.objects.create(name='Hot', purchase_count=9)
+		cold = Product.objects.create(name='Cold', purchase_count=1)
+		self.assertEqual(trending.top_products(), [hot.id, cold.id])
+		with self.assertNumQueries(0):
+			self.assertEqual(trending.top_products(), [hot.id, cold.id])
+		with self.captureOnCommitCallbacks(execute=True):
+			hot.is_active = False
+			hot.save()
+		self.assertEqual(trending.top_products(), [cold.id])
+
+
+class RatingAggregateTest(APITestCase):
+	def setUp(self):
+		self.product = Product.objects.create(name='Kettle')
+		self.user = UserAccount.objects.create_user(email='rater@example.com', password='pass')
+
+	def aggregates(self):
+		return Product.objects.filter(pk=self.product.pk).values_list('rating_count', 'rating_sum', 'review_count', 'avg_rating').get()
+
+	def test_review_writes_update_aggregates_incrementally(self):
+		ProductReview.objects.create(product=self.product, user=self.user, rating=5, comment='Great')
+		quiet = ProductReview.objects.create(product=self.product, rating=2)
+		self.assertEqual(self.aggregates(), (2, 7, 1, Decimal('3.50')))
+		self.assertEqual(ProductCard.objects.get(pk=self.product.pk).avg_rating, Decimal('3.50'))
+
+		quiet.is_public = False
+		quiet.save()
+		self.assertEqual(self.aggregates(), (1, 5, 1, Decimal('5.00')))
+		quiet.is_public = True
+		quiet.rating = 3
+		quiet.save()
+		self.assertEqual(self.aggregates(), (2, 8, 1, Decimal('4.00')))
+		ProductReview.objects.all().delete()
+		self.assertEqual(self.aggregates(), (0, 0, 0, Decimal('0.00')))
+
+	def test_reconcile_repairs_drift(self):
+		ProductReview.objects.create(product=self.product, rating=4, comment='Fine')
+		ProductReview.objects.filter(product=self.product).update(rating=1)  # skips signals
+		self.assertEqual(ratings.reconcile(), [self.product.pk])
+		self.assertEqual(self.aggregates(), (1, 1, 1, Decimal('1.00')))
+		self.assertEqual(ratings.reconcile(), [])
+
+	def test_deferred_and_refreshed_reviews_apply_the_stored_difference(self):
+		review = ProductReview.objects.create(product=self.product, rating=4, comment='Fine')
+		deferred = ProductReview.objects.only('id').get(pk=review.pk)
+		deferred.rating = 2
+		deferred.save()
+		self.assertEqual(self.aggregates(), (1, 2, 1, Decimal('2.00')))
+		review.refresh_from_db()
+		review.rating = 5
+		review.save()
+		self.assertEqual(self.aggregates(), (1, 5, 1, Decimal('5.00')))
+
+
+class ConditionalGetTest(APITestCase):
+	def setUp(self):
+		cache.clear()
+		local_cache.invalidate()
+		self.product = Product.objects.create(name='Chair')
+
+	def test_unchanged_list_is_304_without_queries(self):
+		url = reverse('product-list')
+		first = self.client.get(url)
+		self.assertIn('public', first['Cache-Control'])
+		self.assertIn('Last-Modified', first)
+		with self.assertNumQueries(0):
+			again = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+		self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+		self.assertEqual(again['ETag'], first['ETag'])
+		since = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+		self.assertEqual(since.status_code, status.HTTP_304_NOT_MODIFIED)
+
+		# Other query strings and catalog writes change the validator.
+		self.assertNotEqual(self.client.get(url, {'page_size': 5})['ETag'], first['ETag'])
+		bump_generations([])
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, status.HTTP_200_OK)
+
+	def test_detail_is_never_short_circuited(self):
+		url = reverse('product-detail', args=[self.product.id])
+		first = self.client.get(url)
+		self.assertNotIn('ETag', first)
+		self.assertIn('private', first['Cache-Control'])
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='*').status_code, status.HTTP_200_OK)
+		counters.flush()
+		self.product.refresh_from_db()
+		self.assertEqual(self.product.view_count, 2)
+
+	def test_trending_body_follows_the_ranking_in_its_etag(self):
+		url = reverse('trending-products')
+		hot = Product.objects.create(name='Hot', purchase_count=9)
+		first = self.client.get(url)
+		self.assertEqual(first.json()[0]['id'], hot.id)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.product.purchase_count = 20
+			self.product.save()
+		second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+		self.assertEqual(second.status_code, status.HTTP_200_OK)
+		self.assertEqual(second.json()[0]['id'], self.product.id)
+
+	def test_personalized_featured_is_not_cached(self):
+		response = self.client.get(reverse('featured-personalized-featured-products'))
+		self.assertNotIn('ETag', response)
+		self.assertIn('no-cache', response['Cache-Control'])
+		self.assertIn('private', response['Cache-Control'])
+
+
+class CategoryTreeTest(APITestCase):
+	def setUp(self):
+		cache.clear()
+		local_cache.invalidate()
+		self.electronics = Category.objects.create(name='Electronics')
+		self.audio = Category.objects.create(name='Audio', parent=self.electronics)
+		self.headphones = Category.objects.create(name='Headphones', parent=self.audio)
+		self.books = Category.objects.create(name='Books')
+		Product.objects.create(name='Radio', category=self.audio)
+		Product.objects.create(name='Earbuds', category=self.headphones)
+		Product.objects.create(name='Novel', category=self.books)
+
+	def names(self, category):
+		results = self.client.get(reverse('product-list'), {'category_id': category.id}).json()['results']
+		return sorted(p['name'] for p in results)
+
+	def test_category_filter_includes_subtree(self):
+		self.assertEqual(self.headphones.path, f'/{self.electronics.id}/{self.audio.id}/')
+		self.assertEqual(self.names(self.electronics), ['Earbuds', 'Radio'])
+		self.assertEqual(self.names(self.headphones), ['Earbuds'])
+
+	def test_moving_and_deleting_rewrites_descendant_paths(self):
+		self.audio.parent = self.books
+		self.audio.save()
+		self.headphones.refresh_from_db()
+		self.assertEqual((self.headphones.path, self.headphones.depth), (f'/{self.books.id}/{self.audio.id}/', 2))
+		with self.assertRaises(ValueError):
+			self.books.parent = self.headphones
+			self.books.save()
+
+		self.audio.delete()
+		self.headphones.refresh_from_db()
+		self.assertEqual((self.headphones.parent_id, self.headphones.path), (self.books.id, f'/{self.books.id}/'))
+
+	def test_tree_is_served_from_one_cached_blob(self):
+		url = reverse('category-tree')
+		tree = self.client.get(url).json()
+		self.assertEqual([node['name'] for node in tree], ['Books', 'Electronics'])
+		self.assertEqual(tree[1]['children'][0]['children'][0]['name'], 'Headphones')
+		with self.assertNumQueries(0):
+			self.client.get(url, HTTP_IF_NONE_MATCH='"stale"')
+		with self.captureOnCommitCallbacks(execute=True):
+			Category.objects.create(name='Cables', parent=self.electronics)
+		tree = self.client.get(url).json()
+		self.assertEqual([c['name'] for c in tree[1]['children']], ['Audio', 'Cables'])
@@ -0,0 +1,72 @@
+"""
+Category tree.
+
+Categories keep a materialised path of their ancestors (``Category.path``),
+so a subtree is one indexed prefix scan. Most readers never run even that:
+the whole tree is cached as a single blob (nested for rendering, plus a flat
+``{id: path}`` map for subtree and ancestor lookups) under a tree version
+that ``catalog.signals`` bumps whenever a category changes. Workers read the
+version through ``utils.tiered_cache``, so a warm lookup costs no queries.
+"""
+from django.core.cache import cache
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
+
+from utils.tiered_cache import local_cache
+from .models import Category
+
+TREE_VERSION_KEY = "catalog:category_tree:version"
+TREE_KEY = "catalog:category_tree:{version}"
+TREE_TIMEOUT = 60 * 60 * 24
+
+
+def bump_tree_version():
+    try:
+        cache.incr(TREE_VERSION_KEY)
+    except ValueError:
+        if not cache.add(TREE_VERSION_KEY, 1, timeout=None):
+            cache.incr(TREE_VERSION_KEY)
+    local_cache.invalidate(TREE_VERSION_KEY)
+
+
+def build_tree():
+    rows = list(Category.objects.order_by("depth", "name").values("id", "name", "slug", "parent_id", "path", "depth"))
+    nodes = {row["id"]: {**row, "children": []} for row in rows}
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node.pop("parent_id"))
+        (parent["children"] if parent else roots).append(node)
+    return {"tree": roots, "paths": {row["id"]: row["path"] for row in rows}}
+
+
+def category_tree():
+    """``{"tree": [nested nodes], "paths": {id: path}}`` for the current tree version."""
+    version = local_cache.get(TREE_VERSION_KEY, 0)
+    return local_cache.get_or_set(TREE_KEY.format(version=version), build_tree, TREE_TIMEOUT)
+
+
+def subtree_ids(category_id):
+    """``category_id`` and all its descendants (just ``[category_id]`` if it is unknown)."""
+    category_id = int(category_id)
+    paths = category_tree()["paths"]
+    if category_id not in paths:
+        return [category_id]
+    prefix = f"{paths[category_id]}{category_id}/"
+    return [category_id] + [pk for pk, path in paths.items() if path.startswith(prefix)]
+
+
+def ancestor_ids(category_id, path=None):
+    """Ids above ``category_id``, from ``path`` or the cached tree."""
+    if path is None:
+        path = category_tree()["paths"].get(category_id, "/")
+    return [int(pk) for pk in path.strip("/").split("/") if pk]
+
+
+def lift_children(category):
+    """Before ``category`` is deleted, hand its subtree to its parent."""
+    prefix = category.subtree_prefix
+    Category.objects.filter(parent=category).update(parent=category.parent_id)
+    Category.objects.filter(path__startswith=prefix).update(
+        path=Concat(Value(category.path), Substr("path", len(prefix) + 1)),
+        depth=F("depth") - 1,
+    )
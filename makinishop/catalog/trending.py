@@ -0,0 +1,141 @@
+"""
+Time-decayed trending products.
+
+Every counted view or purchase (``catalog.counters``) is also added to two
+Redis sorted sets: the bucket of the current minute and the bucket of the
+current hour, once for the whole catalog and once for the product's category.
+Once a minute ``refresh`` merges the recent buckets with ``ZUNIONSTORE``,
+weighting each by an exponential decay of its age: the last hour, back to the
+start of the hour it began in, comes from minute buckets, older hours (up to
+``WINDOW_HOURS``) from hour buckets. The
+top ``TOP_N`` active products of every scope is stored in the cache, so
+reading trending products is a single key lookup plus one ``in_bulk`` of
+``k`` rows.
+
+Without a Redis cache backend, before the first refresh, or when nothing
+happened in the window, ``top_products`` falls back to lifetime counters.
+That ranking is cached too, keyed by the catalog generation so activating or
+deactivating a product shows up at once.
+"""
+import logging
+import time
+
+from django.core.cache import cache
+
+from utils.redis_utils import get_redis
+from .cache import generation_key_parts
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+VIEW_WEIGHT = 1.0
+PURCHASE_WEIGHT = 10.0
+HALF_LIFE = 6 * 3600  # seconds for an event's contribution to halve
+WINDOW_HOURS = 24
+TOP_N = 50
+TOP_TTL = 5 * 60  # a precomputed list outlives a few missed refreshes
+FALLBACK_TTL = 5 * 60
+
+ALL = "all"
+MINUTE_BUCKET_KEY = "trending:m:{minute}:{scope}"
+HOUR_BUCKET_KEY = "trending:h:{hour}:{scope}"
+ACTIVE_SCOPES_KEY = "trending:scopes:{hour}"
+MERGED_KEY = "trending:merged:{scope}"
+TOP_KEY = "trending:top:{scope}"
+FALLBACK_KEY = "trending:fallback:{scope}:{generation}"
+
+
+def scope_for(category_id=None):
+    return ALL if category_id is None else f"c{category_id}"
+
+
+def record(product_id, category_id=None, weight=VIEW_WEIGHT, now=None):
+    """Add ``weight`` to ``product_id`` in the current minute and hour buckets."""
+    redis = get_redis()
+    if redis is None:
+        return
+    now = now or time.time()
+    minute, hour = int(now // 60), int(now // 3600)
+    scopes = [ALL] if category_id is None else [ALL, scope_for(category_id)]
+    try:
+        pipe = redis.pipeline(transaction=False)
+        for scope in scopes:
+            minute_key = MINUTE_BUCKET_KEY.format(minute=minute, scope=scope)
+            hour_key = HOUR_BUCKET_KEY.format(hour=hour, scope=scope)
+            pipe.zincrby(minute_key, weight, product_id)
+            pipe.expire(minute_key, 2 * 3600)
+            pipe.zincrby(hour_key, weight, product_id)
+            pipe.expire(hour_key, (WINDOW_HOURS + 2) * 3600)
+        scopes_key = ACTIVE_SCOPES_KEY.format(hour=hour)
+        pipe.sadd(scopes_key, *scopes)
+        pipe.expire(scopes_key, (WINDOW_HOURS + 2) * 3600)
+        pipe.execute()
+    except Exception as exc:
+        logger.warning(f"Trending event for product {product_id} dropped: {exc}")
+
+
+def decay(age_seconds):
+    return 0.5 ** (age_seconds / HALF_LIFE)
+
+
+def bucket_weights(scope, now=None):
+    """``{bucket key: decay weight}`` covering the window ending at ``now``.
+
+    Minute buckets cover the last 60 minutes and the rest of the hour the
+    oldest of them falls in (60 to 119 buckets, all within their two-hour
+    TTL). Hour buckets cover the hours that ended before that, so every event
+    is counted exactly once.
+    """
+    now = now or time.time()
+    minute = int(now // 60)
+    first_hour = (minute - 59) // 60
+    weights = {}
+    for m in range(first_hour * 60, minute + 1):
+        weights[MINUTE_BUCKET_KEY.format(minute=m, scope=scope)] = decay(now - (m * 60 + 30))
+    for h in range(first_hour - WINDOW_HOURS, first_hour):
+        weights[HOUR_BUCKET_KEY.format(hour=h, scope=scope)] = decay(now - (h * 3600 + 1800))
+    return weights
+
+
+def refresh(now=None):
+    """Recompute and store the top ``TOP_N`` of every scope active in the window."""
+    redis = get_redis()
+    if redis is None:
+        return 0
+    now = now or time.time()
+    hour = int(now // 3600)
+    scope_keys = [ACTIVE_SCOPES_KEY.format(hour=h) for h in range(hour - WINDOW_HOURS, hour + 1)]
+    scopes = {s.decode() if isinstance(s, bytes) else s for s in redis.sunion(scope_keys)} | {ALL}
+    for scope in scopes:
+        merged = MERGED_KEY.format(scope=scope)
+        redis.zunionstore(merged, bucket_weights(scope, now))
+        # Twice the list size leaves room for products deactivated since their events.
+        ranked = [(int(pk), round(score, 4)) for pk, score in redis.zrevrange(merged, 0, 2 * TOP_N - 1, withscores=True)]
+        redis.delete(merged)
+        active = set(Product.objects.filter(pk__in=[pk for pk, _ in ranked], is_active=True).values_list("id", flat=True))
+        top = [(pk, score) for pk, score in ranked if pk in active][:TOP_N]
+        cache.set(TOP_KEY.format(scope=scope), top, TOP_TTL)
+    return len(scopes)
+
+
+def top_products(category_id=None, k=10):
+    """Ids of the ``k`` trending products, best first."""
+    top = cache.get(TOP_KEY.format(scope=scope_for(category_id)))
+    if top:
+        return [pk for pk, _ in top[:k]]
+    # No Redis, no refresh has covered this scope yet, or nothing happened in the window.
+    return lifetime_top(category_id)[:k]
+
+
+def lifetime_top(category_id=None):
+    """Ids of the ``TOP_N`` active products with the most purchases, then views."""
+    key = FALLBACK_KEY.format(scope=scope_for(category_id), generation="-".join(generation_key_parts(category_id)))
+    ids = cache.get(key)
+    if ids is None:
+        # A whole-table sort: computed once per generation and TTL, an empty list included.
+        queryset = Product.objects.filter(is_active=True)
+        if category_id is not None:
+            queryset = queryset.filter(category_id=category_id)
+        ids = list(queryset.order_by("-purchase_count", "-view_count").values_list("id", flat=True)[:TOP_N])
+        cache.set(key, ids, FALLBACK_TTL)
+    return ids
@@ -1,7 +1,8 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 from .views import (
     CategoryViewSet, ProductViewSet, FeaturedProductViewSet,
-    WishlistViewSet, ProductReviewViewSet
+    WishlistViewSet, ProductReviewViewSet, CacheStatsView, CounterStatsView
 )
 
 router = DefaultRouter()
@@ -11,4 +12,7 @@ router.register(r'featured', FeaturedProductViewSet, basename='featured')
 router.register(r'wishlist', WishlistViewSet, basename='wishlist')
 router.register(r'products/(?P<product_id>\d+)/reviews', ProductReviewViewSet, basename='product-review')
 
-urlpatterns = router.urls
+urlpatterns = [
+    path('cache-stats/', CacheStatsView.as_view(), name='catalog-cache-stats'),
+    path('counter-stats/', CounterStatsView.as_view(), name='catalog-counter-stats'),
+] + router.urls
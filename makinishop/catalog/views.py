@@ -1,37 +1,73 @@
 
+import time
+from functools import partial
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from django.utils import timezone
 from django.db.models import Q, Prefetch
-from django.core.cache import cache
+from django.utils.cache import patch_cache_control
 from django.utils.text import slugify
-from .models import Category, Product, ProductImage, ProductVariant, FeaturedProduct, Wishlist, ProductReview
+from .models import Category, Product, ProductCard, ProductImage, ProductVariant, FeaturedProduct, Wishlist, ProductReview
 from .serializers import (
-    CategorySerializer, ProductSerializer, FeaturedProductSerializer,
-    WishlistSerializer, ProductReviewSerializer
+    CategorySerializer, ProductSerializer, ProductListSerializer, ProductCardSerializer, ProductSearchSerializer,
+    FeaturedProductSerializer, WishlistSerializer, ProductReviewSerializer,
+    product_list_queryset, requested_product_fields
 )
 from django.utils.decorators import method_decorator
 from django_ratelimit.decorators import ratelimit
 from utils.security import block_ip
+from utils.cache_utils import CachedResponseMixin, cache_stats
+from utils.tiered_cache import local_cache
+from utils.pagination import MODE_PARAM, PAGE_MODE, KeysetPaginationMixin
+from utils.conditional import ConditionalGetMixin, NO_CACHE_CONTROL, PRIVATE_CACHE_CONTROL
+from .cache import generation_key_parts, last_modified
+from .search import search_products
+from .facets import product_facets
+from .cards import serves_fields
+from .tree import category_tree, subtree_ids
+from .counters import counter_stats, record_view
+from . import suggest as typeahead
 from utils.cloudinary_utils import upload_image_to_cloudinary
 from utils.email_utils import send_templated_email
 
 
-CACHE_TIMEOUT = 60  # seconds
+# Catalog writes bump the generations embedded in these keys (catalog/cache.py),
+# so the TTLs only bound memory, not staleness.
+CATEGORY_LIST_CACHE_TIMEOUT = 60 * 60 * 6
+PRODUCT_LIST_CACHE_TIMEOUT = 60 * 60 * 6
+PRODUCT_SEARCH_CACHE_TIMEOUT = 60 * 60 * 6
+FEATURED_WINDOW = 5 * 60  # seconds; featured validators change at least this often
 
 # -----------------------------
 # Category
 # -----------------------------
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    response_cache_ttls = {'list': CATEGORY_LIST_CACHE_TIMEOUT}
+    response_cache_local_ttl = 30
+
+    def response_cache_parts(self):
+        return generation_key_parts()
+
+    def conditional_validators(self, request, *args, **kwargs):
+        return generation_key_parts(), last_modified()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, partial(super().list, request, *args, **kwargs))
 
     def perform_create(self, serializer):
         name = serializer.validated_data.get('name')
         serializer.save(slug=slugify(name))
 
+    @action(detail=False, methods=['GET'], url_path='tree')
+    def tree(self, request):
+        """The whole category hierarchy, nested, from one cached blob."""
+        return Response(category_tree()['tree'])
+
     @action(detail=False, methods=['GET'], url_path='search')
     def search(self, request):
         if getattr(self, "swagger_fake_view", False):
@@ -45,9 +81,15 @@ class CategoryViewSet(viewsets.ModelViewSet):
 # -----------------------------
 # Product
 # -----------------------------
-@method_decorator(ratelimit(key='ip', rate='60/m', block=True), name='dispatch')
+def product_rate(group, request):
+    # Typeahead fires on every keystroke; the suggest action has its own limit.
+    match = request.resolver_match
+    return None if match is not None and match.url_name == 'product-suggest' else '60/m'
+
+
+@method_decorator(ratelimit(key='ip', rate=product_rate, block=True), name='dispatch')
 @method_decorator(block_ip, name='dispatch')
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ConditionalGetMixin, KeysetPaginationMixin, CachedResponseMixin, viewsets.ModelViewSet):
     # Example: override create to handle image upload
     def create(self, request, *args, **kwargs):
         # If image file is present in request.FILES, upload to Cloudinary
@@ -62,58 +104,175 @@ class ProductViewSet(viewsets.ModelViewSet):
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     queryset = Product.objects.none()  # safe default
+    # Rendered pages are cached per normalised query string (see utils.cache_utils)
+    response_cache_ttls = {
+        'list': PRODUCT_LIST_CACHE_TIMEOUT,
+        'search': PRODUCT_SEARCH_CACHE_TIMEOUT,
+    }
+
+    def response_cache_parts(self):
+        # A category-filtered page only depends on that category's generation.
+        return generation_key_parts(self.request.query_params.get('category_id') or None)
+
+    def conditional_validators(self, request, *args, **kwargs):
+        if self.action == 'retrieve':
+            # Every detail view must reach the handler to be counted, and its
+            # view/purchase counters move without bumping any generation.
+            return None
+        if self.action == 'suggest':
+            # The typeahead index has its own version (catalog.suggest).
+            return (local_cache.get(typeahead.VERSION_KEY, 0),), None
+        category_id = request.query_params.get('category_id') or None
+        return generation_key_parts(category_id), last_modified(category_id)
 
     def get_queryset(self):
         if getattr(self, "swagger_fake_view", False):
             return Product.objects.none()
 
-        # Build cache key based on all query params
-        cache_key = f"product_list:{self.request.query_params.urlencode()}"
-        cached = cache.get(cache_key)
-        if cached:
-            return cached
+        if self.serves_cards():
+            return self.filter_products(ProductCard.objects.filter(is_active=True)).order_by('-created_at')
 
-        qs = Product.objects.filter(is_active=True) \
-            .select_related('category') \
-            .prefetch_related(
+        qs = Product.objects.filter(is_active=True)
+        if self.action == 'list':
+            # Listings load only what the requested fields need (?fields= / ?expand=).
+            qs = product_list_queryset(qs, requested_product_fields(self.request))
+        else:
+            qs = qs.select_related('category').prefetch_related(
                 Prefetch('images', queryset=ProductImage.objects.all()),
                 Prefetch('variants', queryset=ProductVariant.objects.all())
             )
 
-        # Filtering
+        qs = self.filter_products(qs)
+        search = self.request.query_params.get('q')
+        if search:
+            # The search action ranks matches; plain listings keep newest first.
+            if self.action == 'search':
+                return search_products(qs, search)
+            qs = search_products(qs, search, ranked=False)
+
+        return qs.order_by('-created_at')
+
+    def filter_products(self, qs):
+        # Shared by products and cards: both carry category_id and price.
         category_id = self.request.query_params.get('category_id')
         min_price = self.request.query_params.get('min_price')
         max_price = self.request.query_params.get('max_price')
-        search = self.request.query_params.get('q')
-
         if category_id:
-            qs = qs.filter(category_id=category_id)
+            # The category and all of its subcategories (ids from the cached tree).
+            qs = qs.filter(category_id__in=subtree_ids(category_id))
         if min_price:
             qs = qs.filter(price__gte=min_price)
         if max_price:
             qs = qs.filter(price__lte=max_price)
-        if search:
-            qs = qs.filter(name__icontains=search)
-
-        qs = qs.order_by('-created_at')
-        cache.set(cache_key, qs, CACHE_TIMEOUT)
         return qs
 
+    def serves_cards(self):
+        """Plain listings whose fields a ``ProductCard`` covers are read from the card table alone."""
+        return (
+            self.action == 'list'
+            and not self.request.query_params.get('q')
+            and serves_fields(requested_product_fields(self.request))
+        )
+
+    def get_serializer_class(self):
+        if self.action == 'search' and self.request.query_params.get('q'):
+            return ProductSearchSerializer
+        if self.serves_cards():
+            return ProductCardSerializer
+        if self.action == 'list':
+            return ProductListSerializer
+        return super().get_serializer_class()
+
+    def wants_keyset_pagination(self):
+        # Ranked results have no (created_at, id) order to resume from.
+        return self.action != 'search' and super().wants_keyset_pagination()
+
+    def paginate_queryset(self, queryset):
+        # /search/ has always answered a bare list; pages are opt-in there.
+        if self.action == 'search' and not self.wants_paged_search():
+            return None
+        return super().paginate_queryset(queryset)
+
+    def wants_paged_search(self):
+        params = self.request.query_params
+        return params.get(MODE_PARAM) == PAGE_MODE or 'page' in params
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, partial(self.list_with_facets, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        category = response.data.get('category')
+        record_view(response.data['id'], category['id'] if category else None)  # buffered; see catalog.counters
+        # Live counters: keep shared caches from answering (and skipping the count) for us.
+        patch_cache_control(response, **PRIVATE_CACHE_CONTROL)
+        return response
+
     @action(detail=False, methods=['GET'], url_path='search')
     def search(self, request):
-        qs = self.get_queryset()
-        serializer = self.get_serializer(qs, many=True)
-        return Response(serializer.data)
+        """Ranked full-text + trigram search over name, SKU, category and description (``?q=``).
+
+        A bare list unless ``?pagination=page`` (or ``?page=``) asks for pages,
+        which ``?facets=1`` needs to attach its counts.
+        """
+        return self.cached_response(request, partial(self.list_with_facets, request))
+
+    def list_with_facets(self, request, *args, **kwargs):
+        """The page, plus category/price/rating counts for the whole filter set with ``?facets=1``."""
+        response = super().list(request, *args, **kwargs)
+        paged = isinstance(response.data, dict)
+        if request.query_params.get('facets') in ('1', 'true') and response.status_code == 200 and paged:
+            response.data['facets'] = product_facets(self.filter_queryset(self.get_queryset()))
+        return response
+
+    @method_decorator(ratelimit(key='ip', rate='300/m', block=True))
+    @action(detail=False, methods=['GET'], url_path='suggest', pagination_class=None)
+    def suggest(self, request):
+        """Typeahead: popular products and categories with a name word starting with ``?q=``."""
+        text = request.query_params.get('q', '')
+        try:
+            limit = int(request.query_params.get('limit', typeahead.DEFAULT_LIMIT))
+        except ValueError:
+            limit = typeahead.DEFAULT_LIMIT
+        limit = max(1, min(limit, typeahead.MAX_LIMIT))
+        return Response({'query': text, 'results': typeahead.suggest(text, limit)})
+
+
+# -----------------------------
+# Cache statistics
+# -----------------------------
+class CacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        # Tier counters are per process: they describe the worker that answered.
+        return Response({'endpoints': cache_stats(), 'tiers': local_cache.stats()})
+
+
+class CounterStatsView(APIView):
+    """Backlog and flush lag of the buffered view/purchase counters."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(counter_stats())
 
 
 # -----------------------------
 # Featured Products
 # -----------------------------
-class FeaturedProductViewSet(viewsets.ModelViewSet):
+class FeaturedProductViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = FeaturedProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     queryset = FeaturedProduct.objects.none()  # safe default
 
+    def conditional_validators(self, request, *args, **kwargs):
+        if self.action == 'personalized_featured_products':
+            return None  # ranked from the user's own activity, which no validator tracks
+        # Featured slots start and end with time, not only with writes: validators
+        # roll over every FEATURED_WINDOW seconds as well.
+        window_start = int(time.time() // FEATURED_WINDOW * FEATURED_WINDOW)
+        return [*generation_key_parts(), window_start], max(last_modified(), window_start)
+
     def get_queryset(self):
         if getattr(self, "swagger_fake_view", False):
             return FeaturedProduct.objects.none()
@@ -122,10 +281,13 @@ class FeaturedProductViewSet(viewsets.ModelViewSet):
             start_date__lte=now,
             is_personalized=False
         ).filter(Q(end_date__gte=now) | Q(end_date__isnull=True)) \
-         .select_related('product', 'product__category') \
-         .prefetch_related('product__images', 'product__variants') \
+         .prefetch_related(self.product_prefetch()) \
          .order_by('-priority', '-start_date')
 
+    def product_prefetch(self):
+        fields = requested_product_fields(self.request)
+        return Prefetch('product', queryset=product_list_queryset(Product.objects.all(), fields))
+
     @action(detail=False, methods=['GET'], url_path='personalized')
     def personalized_featured_products(self, request):
         if getattr(self, "swagger_fake_view", False):
@@ -136,21 +298,20 @@ class FeaturedProductViewSet(viewsets.ModelViewSet):
             start_date__lte=now,
             is_personalized=True
         ).filter(Q(end_date__gte=now) | Q(end_date__isnull=True)) \
-         .select_related('product', 'product__category') \
-         .prefetch_related('product__images', 'product__variants')
+         .prefetch_related(self.product_prefetch())
 
         if not user:
-            serializer = self.get_serializer(qs.order_by('-priority', '-start_date'), many=True)
-            return Response(serializer.data)
+            items = qs.order_by('-priority', '-start_date')
+        else:
+            wishlist_ids = set(Wishlist.objects.filter(user=user).values_list('product_id', flat=True))
 
-        wishlist_ids = set(Wishlist.objects.filter(user=user).values_list('product_id', flat=True))
+            def score(fp):
+                return (fp.priority / 100) + (1.0 if fp.product.id in wishlist_ids else 0.0)
 
-        def score(fp):
-            return (fp.priority / 100) + (1.0 if fp.product.id in wishlist_ids else 0.0)
-
-        items = sorted(qs, key=score, reverse=True)
-        serializer = self.get_serializer(items, many=True)
-        return Response(serializer.data)
+            items = sorted(qs, key=score, reverse=True)
+        response = Response(self.get_serializer(items, many=True).data)
+        patch_cache_control(response, **NO_CACHE_CONTROL)
+        return response
 
     @action(detail=False, methods=['GET'], url_path='search')
     def search(self, request):
@@ -181,9 +342,9 @@ class WishlistViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if not user.is_authenticated:
             return Wishlist.objects.none()
+        fields = requested_product_fields(self.request)
         return Wishlist.objects.filter(user=user) \
-            .select_related('product', 'product__category') \
-            .prefetch_related('product__images', 'product__variants')
+            .prefetch_related(Prefetch('product', queryset=product_list_queryset(Product.objects.all(), fields)))
 
     def perform_create(self, serializer):
         wishlist = serializer.save(user=self.request.user)
@@ -218,7 +379,7 @@ class WishlistViewSet(viewsets.ModelViewSet):
 # -----------------------------
 # Product Review
 # -----------------------------
-class ProductReviewViewSet(viewsets.ModelViewSet):
+class ProductReviewViewSet(KeysetPaginationMixin, viewsets.ModelViewSet):
     serializer_class = ProductReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     queryset = ProductReview.objects.none()  # safe default
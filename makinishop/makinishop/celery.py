@@ -8,6 +8,7 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # Define multiple queues
 from kombu import Queue
+from celery.schedules import crontab
 app.conf.task_queues = (
     Queue('default'),
     Queue('emails'),
@@ -15,10 +16,36 @@ app.conf.task_queues = (
     Queue('ai'),
 )
 
+# Anything unrouted goes to a queue the workers consume (not Celery's implicit "celery")
+app.conf.task_default_queue = 'default'
+
 # Route tasks to queues
 app.conf.task_routes = {
     'notifications.tasks.send_notification_email': {'queue': 'emails'},
+    'ai.tasks.*': {'queue': 'ai'},
+    'catalog.tasks.*': {'queue': 'default'},
     # Add more task routes as needed
 }
 
+# Periodic jobs (run by the celery_beat service)
+app.conf.beat_schedule = {
+    'precompute-product-recommendations': {
+        'task': 'ai.tasks.precompute_product_recommendations',
+        'schedule': crontab(minute=15),
+        'kwargs': {'incremental': True},
+    },
+    'flush-product-counters': {
+        'task': 'catalog.tasks.flush_product_counters',
+        'schedule': 60.0,
+    },
+    'refresh-trending': {
+        'task': 'catalog.tasks.refresh_trending',
+        'schedule': 60.0,
+    },
+    'rebuild-suggest-index': {
+        'task': 'catalog.tasks.rebuild_suggest_index',
+        'schedule': crontab(minute='*/10'),
+    },
+}
+
 app.autodiscover_tasks()
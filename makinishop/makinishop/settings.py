@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # WhiteNoise development helper
     'whitenoise.runserver_nostatic', 
 
@@ -127,6 +128,14 @@ CACHES = {
 }
 SESSION_CACHE_ALIAS = "default"
 
+# Per-process tier in front of CACHES['default'] for small hot values
+# (utils/tiered_cache.py); entries are dropped via Redis pub/sub on change.
+LOCAL_CACHE = {
+    'MAXSIZE': env.int('LOCAL_CACHE_MAXSIZE', default=2048),
+    'TTL': env.int('LOCAL_CACHE_TTL', default=30),
+    'CHANNEL': 'cache:invalidate',
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
@@ -219,6 +228,39 @@ DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL')
 # AI configuration
 GEMINI_API_KEY = env('GEMINI_API_KEY')
 
+# Personalised featured ranking; empty dicts keep the defaults in
+# ai/services/featured.py (signal weights, and per-event-type weights).
+AI_PERSONALIZATION = {
+    'WEIGHTS': {},
+    'EVENT_WEIGHTS': {},
+}
+
+# Where embedding similarity runs: 'binary' (in-process NumPy index over the
+# BinaryField bytes) or 'pgvector' (HNSW-indexed vector column in Postgres).
+AI_EMBEDDING_STORAGE = env('AI_EMBEDDING_STORAGE', default='binary')
+
+# Product embedding search: 'exact' brute force or 'ivf' approximate search.
+# NLIST=0 sizes the IVF quantizer as sqrt(#products); raise NPROBE for recall.
+# The trained IVF centroids are kept in the shared cache, not on disk.
+# SNAPSHOT is a file on a volume shared by web and Celery workers; when set,
+# workers memory-map it instead of each loading the embeddings from the DB.
+AI_VECTOR_INDEX = {
+    'BACKEND': env('AI_VECTOR_BACKEND', default='exact'),
+    'NLIST': env.int('AI_IVF_NLIST', default=0),
+    'NPROBE': env.int('AI_IVF_NPROBE', default=8),
+    'SNAPSHOT': env('AI_EMBEDDING_SNAPSHOT_PATH', default=''),
+}
+
+# Embedding encodings: 'float32', 'float16' or 'int8' (per-vector scale).
+# STORAGE is used for the BinaryField bytes, INDEX for the in-process matrix;
+# a quantized index rescores RESCORE_FACTOR * k candidates with the float32
+# embedding_vector copy.
+AI_EMBEDDING_QUANTIZATION = {
+    'STORAGE': env('AI_EMBEDDING_STORAGE_CODEC', default='float32'),
+    'INDEX': env('AI_INDEX_CODEC', default='float32'),
+    'RESCORE_FACTOR': env.int('AI_RESCORE_FACTOR', default=4),
+}
+
 SWAGGER_SETTINGS = {
     'USE_SESSION_AUTH': False,
     'SECURITY_DEFINITIONS': {
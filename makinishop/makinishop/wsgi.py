@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "makinishop.settings")
 
 application = get_wsgi_application()
+
+# Each gunicorn worker imports this module, so load the embedding index here
+# rather than on the first recommendation request.
+from ai.services.vector_index import warm_up  # noqa: E402
+
+warm_up()
@@ -0,0 +1,8 @@
+"""
+Cache keys for order data shared by views and signals.
+
+Kept apart from ``orders.views`` so ``orders.signals`` can import them at app
+start without pulling in DRF and the rest of the view layer.
+"""
+SHIPPING_METHODS_CACHE_KEY = "orders:shipping_methods"
+SHIPPING_METHODS_CACHE_TIMEOUT = 60 * 60  # invalidated by orders.signals on change
@@ -0,0 +1,13 @@
+# orders/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from utils.tiered_cache import local_cache
+from .models import ShippingMethod
+from .cache import SHIPPING_METHODS_CACHE_KEY
+
+
+@receiver(post_save, sender=ShippingMethod)
+@receiver(post_delete, sender=ShippingMethod)
+def invalidate_shipping_methods(sender, **kwargs):
+    transaction.on_commit(lambda: local_cache.delete(SHIPPING_METHODS_CACHE_KEY))
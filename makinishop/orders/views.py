@@ -24,6 +24,10 @@ from orders.serializers import (
 from django.utils.decorators import method_decorator
 from django_ratelimit.decorators import ratelimit
 from utils.security import block_ip
+from utils.tiered_cache import local_cache
+from utils.pagination import KeysetPaginationMixin
+from catalog.counters import record_purchase
+from orders.cache import SHIPPING_METHODS_CACHE_KEY, SHIPPING_METHODS_CACHE_TIMEOUT
 
 # ------------------------
 # Cart Views
@@ -148,8 +152,14 @@ class ChapaPaymentConfirmView(APIView):
                 status="paid",
                 transaction_reference=tx_ref
             )
-            order.status = "paid"
-            order.save()
+            # Conditional UPDATE: of concurrent confirmations only the one that
+            # flips the order to paid records its purchases.
+            newly_paid = CustomerOrder.objects.filter(pk=order.pk).exclude(status="paid") \
+                .update(status="paid", updated_at=timezone.now())
+            if newly_paid:
+                items = order.items.values_list("product_id", "quantity", "product__category_id")
+                for product_id, quantity, category_id in items:
+                    record_purchase(product_id, quantity, category_id)
 
         return Response({"message": "Payment processed"})
 
@@ -157,7 +167,7 @@ class ChapaPaymentConfirmView(APIView):
 # ------------------------
 # Order Views
 # ------------------------
-class OrderListCreateView(generics.ListCreateAPIView):
+class OrderListCreateView(KeysetPaginationMixin, generics.ListCreateAPIView):
     serializer_class = CustomerOrderSerializer
     permission_classes = [permissions.IsAuthenticated]
     queryset = CustomerOrder.objects.none()
@@ -322,6 +332,17 @@ class ShippingMethodViewSet(viewsets.ModelViewSet):
     serializer_class = ShippingMethodSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def list(self, request, *args, **kwargs):
+        methods = local_cache.get_or_set(
+            SHIPPING_METHODS_CACHE_KEY,
+            lambda: self.get_serializer(self.get_queryset().order_by('id'), many=True).data,
+            SHIPPING_METHODS_CACHE_TIMEOUT,
+        )
+        page = self.paginate_queryset(methods)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(methods)
+
 
 class OrderShippingListCreateView(generics.ListCreateAPIView):
     serializer_class = OrderShippingSerializer
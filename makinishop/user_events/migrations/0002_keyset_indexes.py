@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0004_keyset_indexes"),
+        ("orders", "0002_keyset_indexes"),
+        ("user_events", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="userevent",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"], name="userevent_user_created_idx"
+            ),
+        ),
+    ]
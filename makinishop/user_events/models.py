@@ -25,6 +25,7 @@ class UserEvent(models.Model):
         indexes = [
             models.Index(fields=['user', 'event_type', 'created_at']),
             models.Index(fields=['product']),
+            models.Index(fields=['user', '-created_at', '-id'], name='userevent_user_created_idx'),
         ]
 
     def __str__(self):
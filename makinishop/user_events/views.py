@@ -1,8 +1,9 @@
 from rest_framework import generics, permissions
+from utils.pagination import KeysetPaginationMixin
 from .models import UserEvent
 from .serializers import UserEventSerializer
 
-class UserEventListView(generics.ListAPIView):
+class UserEventListView(KeysetPaginationMixin, generics.ListAPIView):
     serializer_class = UserEventSerializer
     permission_classes = [permissions.IsAuthenticated]
 
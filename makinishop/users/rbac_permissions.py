@@ -1,7 +1,37 @@
 # users/rbac_permissions.py
+from django.core.cache import cache
 from rest_framework import permissions
+from utils.tiered_cache import local_cache
 from .models import Permission
 
+RBAC_GENERATION_KEY = "rbac:generation"
+PERMISSIONS_KEY = "rbac:permissions:{generation}:{user_id}"
+PERMISSIONS_TIMEOUT = 60 * 60
+
+
+def bump_rbac_generation():
+    """Invalidate every cached permission set (see users.signals)."""
+    try:
+        cache.incr(RBAC_GENERATION_KEY)
+    except ValueError:
+        if not cache.add(RBAC_GENERATION_KEY, 1, timeout=None):
+            cache.incr(RBAC_GENERATION_KEY)
+    local_cache.invalidate(RBAC_GENERATION_KEY)
+
+
+def user_permission_codes(user):
+    """Role and direct permission codes of ``user``, cached in both cache tiers."""
+    def compute():
+        role_perms = Permission.objects.filter(
+            rolepermission__role__userrole__user=user
+        ).values_list('code', flat=True)
+        user_perms = user.user_permissions.values_list('codename', flat=True)
+        return frozenset(role_perms) | frozenset(user_perms)
+
+    generation = local_cache.get(RBAC_GENERATION_KEY, 0)
+    key = PERMISSIONS_KEY.format(generation=generation, user_id=user.pk)
+    return local_cache.get_or_set(key, compute, PERMISSIONS_TIMEOUT)
+
 class HasPermission(permissions.BasePermission):
     """
     Check if the authenticated user has the required permission.
@@ -20,10 +50,6 @@ class HasPermission(permissions.BasePermission):
 
         # Cache permissions to avoid repeated DB hits
         if not hasattr(user, '_cached_permissions'):
-            role_perms = Permission.objects.filter(
-                rolepermission__role__users=user
-            ).values_list('code', flat=True)
-            user_perms = user.user_permissions.values_list('codename', flat=True)
-            user._cached_permissions = set(role_perms) | set(user_perms)
+            user._cached_permissions = user_permission_codes(user)
 
         return self.codename in user._cached_permissions
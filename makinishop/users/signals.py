@@ -0,0 +1,19 @@
+# users/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from .models import UserAccount, Role, Permission, RolePermission, UserRole
+from .rbac_permissions import bump_rbac_generation
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+@receiver(post_save, sender=RolePermission)
+@receiver(post_delete, sender=RolePermission)
+@receiver(post_save, sender=UserRole)
+@receiver(post_delete, sender=UserRole)
+@receiver(m2m_changed, sender=UserAccount.user_permissions.through)
+def invalidate_permission_sets(sender, **kwargs):
+    transaction.on_commit(bump_rbac_generation)
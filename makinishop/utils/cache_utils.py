@@ -0,0 +1,205 @@
+"""
+Shared response-caching helpers for MakiniShop
+- Normalised cache keys built from sorted query params
+- Rendered-response caching (the final JSON bytes, not ORM objects)
+- Per-endpoint hit/miss counters
+- Stampede protection (single-flight recompute, early refresh, serve-stale)
+"""
+import hashlib
+import math
+import random
+import time
+import uuid
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from .tiered_cache import local_cache
+
+STATS_KEY = "cache_stats:{endpoint}:{outcome}"
+# hit: fresh value served; miss: this request recomputed; early_refresh: a
+# recompute started before expiry; stale: an expired value served while another
+# request recomputes; coalesced: waited for another request's recompute.
+STATS_OUTCOMES = ("hit", "miss", "early_refresh", "stale", "coalesced")
+# Every endpoint that has served through ``get_or_compute`` since the
+# counters were last reset, so the stats view can enumerate them.
+STATS_ENDPOINTS_KEY = "cache_stats:endpoints"
+
+
+def normalized_params(query_params, defaults=None):
+    """Sorted ``(key, value)`` pairs; repeated keys keep every value, defaults fill gaps."""
+    pairs = {(key, value) for key in query_params for value in query_params.getlist(key) if value != ""}
+    present = {key for key, _ in pairs}
+    pairs |= {(key, str(value)) for key, value in (defaults or {}).items() if key not in present}
+    return sorted(pairs)
+
+
+def response_cache_key(endpoint, request, defaults=None, parts=()):
+    """Key for ``endpoint`` that is identical for equivalent requests (param order, blank params)."""
+    query = urlencode(normalized_params(request.query_params, defaults))
+    raw = ":".join([request.get_host(), request.path, query, *map(str, parts)])
+    return f"response:{endpoint}:{hashlib.md5(raw.encode()).hexdigest()}"
+
+
+def record(endpoint, outcome):
+    key = STATS_KEY.format(endpoint=endpoint, outcome=outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+        endpoints = cache.get(STATS_ENDPOINTS_KEY) or []
+        if endpoint not in endpoints:
+            cache.set(STATS_ENDPOINTS_KEY, sorted({*endpoints, endpoint}), timeout=None)
+
+
+def cache_stats():
+    """``{endpoint: {outcome: n, ..., "hit_ratio": r}}`` for every cached endpoint."""
+    stats = {}
+    for endpoint in cache.get(STATS_ENDPOINTS_KEY) or []:
+        keys = {outcome: STATS_KEY.format(endpoint=endpoint, outcome=outcome) for outcome in STATS_OUTCOMES}
+        values = cache.get_many(list(keys.values()))
+        counts = {outcome: values.get(key, 0) for outcome, key in keys.items()}
+        served = counts["hit"] + counts["stale"] + counts["coalesced"]
+        total = served + counts["miss"] + counts["early_refresh"]
+        stats[endpoint] = {**counts, "hit_ratio": round(served / total, 4) if total else None}
+    return stats
+
+
+LOCK_TTL = 10  # seconds a recompute may hold its lease
+STALE_TTL = 300  # seconds an expired value stays available to serve while revalidating
+WAIT_INTERVAL = 0.05
+
+
+def _acquire(lock_key, lock_ttl):
+    token = uuid.uuid4().hex
+    return token if cache.add(lock_key, token, lock_ttl) else None
+
+
+def _release(lock_key, token):
+    # Best effort: do not drop a lease that expired and was taken by someone else.
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def get_or_compute(key, compute, ttl, endpoint=None, lock_ttl=LOCK_TTL, stale_ttl=STALE_TTL, beta=1.0):
+    """Return the cached value for ``key``, recomputing it at most once across processes.
+
+    - A value is refreshed probabilistically ahead of ``ttl`` (XFetch: the
+      closer to expiry and the slower ``compute``, the likelier), so hot keys
+      rarely expire at all.
+    - Only the request holding the ``lock_ttl`` lease recomputes; the others
+      serve the previous value for up to ``stale_ttl`` past expiry, or wait
+      for the new one if there is nothing to serve.
+    - Outcomes are counted under ``endpoint`` (see ``cache_stats``).
+    """
+    lock_key = f"{key}:lock"
+    # Stored as (value, expires_at, seconds the last compute took).
+    envelope = cache.get(key)
+    now = time.time()
+    if envelope is not None:
+        value, expires, delta = envelope
+        if now + delta * beta * -math.log(1.0 - random.random()) < expires:
+            _record(endpoint, "hit")
+            return value
+
+    token = _acquire(lock_key, lock_ttl)
+    if token is None:
+        if envelope is not None:
+            _record(endpoint, "stale" if now >= expires else "hit")
+            return value
+        deadline = now + lock_ttl
+        while time.time() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            envelope = cache.get(key)
+            if envelope is not None:
+                _record(endpoint, "coalesced")
+                return envelope[0]
+            if cache.get(lock_key) is None:
+                break
+        # The lease holder failed or timed out: compute without the lock.
+
+    _record(endpoint, "miss" if envelope is None or now >= expires else "early_refresh")
+    try:
+        started = time.time()
+        value = compute()
+        finished = time.time()
+        cache.set(key, (value, finished + ttl, finished - started), ttl + stale_ttl)
+    finally:
+        if token is not None:
+            _release(lock_key, token)
+    return value
+
+
+def _record(endpoint, outcome):
+    if endpoint:
+        record(endpoint, outcome)
+
+
+class SkipCache(Exception):
+    """Raised from a ``get_or_compute`` callback to return a result without caching it."""
+
+    def __init__(self, result):
+        super().__init__()
+        self.result = result
+
+
+class CachedResponseMixin:
+    """Cache the rendered JSON of selected viewset actions.
+
+    ``response_cache_ttls`` maps action names to a TTL in seconds; actions not
+    listed are never cached. A hit returns the stored bytes directly, so it
+    touches neither the ORM nor the serializers; concurrent misses on one key
+    are collapsed into a single render by ``get_or_compute``.
+    """
+
+    response_cache_ttls = {}
+    response_cache_defaults = {"page": 1}
+    # Also keep rendered bodies in the per-process tier for this many seconds.
+    # Only safe when the key embeds generations that are read through that tier too.
+    response_cache_local_ttl = None
+
+    def response_cache_endpoint(self):
+        return f"{self.basename}-{self.action}"
+
+    def response_cache_parts(self):
+        """Extra key components (e.g. invalidation generations); override per view."""
+        return ()
+
+    def cached_response(self, request, build):
+        ttl = self.response_cache_ttls.get(self.action)
+        renderer = getattr(request, "accepted_renderer", None)
+        if not ttl or request.method != "GET" or not isinstance(renderer, JSONRenderer):
+            return build()
+
+        endpoint = self.response_cache_endpoint()
+        key = response_cache_key(endpoint, request, self.response_cache_defaults, self.response_cache_parts())
+        body = local_cache.peek(key) if self.response_cache_local_ttl else None
+        if body is not None:
+            response = HttpResponse(body, content_type=renderer.media_type)
+            response["X-Cache"] = "HIT-LOCAL"
+            return response
+        built = []
+
+        def render():
+            response = build()
+            built.append(response)
+            if response.status_code != 200:
+                raise SkipCache(response)
+            return renderer.render(response.data)
+
+        try:
+            body = get_or_compute(key, render, ttl, endpoint=endpoint)
+        except SkipCache as skipped:
+            return skipped.result
+        if self.response_cache_local_ttl:
+            local_cache.remember(key, body, self.response_cache_local_ttl)
+        if built:
+            response = built[0]
+            response["X-Cache"] = "MISS"
+            return response
+        response = HttpResponse(body, content_type=renderer.media_type)
+        response["X-Cache"] = "HIT"
+        return response
@@ -0,0 +1,98 @@
+"""
+Conditional GET (ETag / Last-Modified) for MakiniShop API views
+- Validators come from cheap inputs (cache generations, cached ``max(updated_at)``),
+  never from rendering the response
+- The precondition check runs after authentication and permissions but before
+  the handler, so a ``304`` skips the queryset, serializers and renderers
+- ``Cache-Control`` for browsers and CDNs, set per view
+"""
+import hashlib
+from datetime import datetime
+from urllib.parse import urlencode
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .cache_utils import normalized_params
+
+# Shared caches may keep a copy for longer than browsers and refresh it in the background.
+PUBLIC_CACHE_CONTROL = {"public": True, "max_age": 60, "s_maxage": 300, "stale_while_revalidate": 60}
+PRIVATE_CACHE_CONTROL = {"private": True, "max_age": 0, "must_revalidate": True}
+# Per-user responses without validators: never stored by shared caches, refetched by browsers.
+NO_CACHE_CONTROL = {"private": True, "no_cache": True}
+
+
+def to_timestamp(value):
+    """Seconds since the epoch for a datetime or number; ``None`` stays ``None``."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        value = value.timestamp()
+    return int(value)
+
+
+class NotModified(Exception):
+    """Raised from ``initial`` to answer with the prepared ``304``/``412`` response."""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """Answer ``If-None-Match`` / ``If-Modified-Since`` without running the view.
+
+    Views implement ``conditional_validators(request, *args, **kwargs)`` and
+    return ``(etag_parts, last_modified)``, or ``None`` to opt a request out.
+    ``etag_parts`` must change whenever the response body may change (the path,
+    query string and negotiated media type are added here); ``last_modified``
+    is a datetime or epoch seconds.
+    """
+
+    cache_control = PUBLIC_CACHE_CONTROL
+
+    def conditional_validators(self, request, *args, **kwargs):
+        return None
+
+    def conditional_cache_control(self, request):
+        return self.cache_control
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._validators = None
+        if request.method not in ("GET", "HEAD"):
+            return
+        validators = self.conditional_validators(request, *args, **kwargs)
+        if validators is None:
+            return
+        parts, last_modified = validators
+        renderer = getattr(request, "accepted_renderer", None)
+        raw = ":".join([
+            request.path,
+            urlencode(normalized_params(request.query_params)),
+            getattr(renderer, "media_type", ""),
+            *map(str, parts),
+        ])
+        etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+        self._validators = (etag, to_timestamp(last_modified))
+        response = get_conditional_response(request, etag=etag, last_modified=self._validators[1])
+        if response is not None:
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        validators = getattr(self, "_validators", None)
+        if validators and response.status_code in (200, 304):
+            etag, last_modified = validators
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+            cache_control = self.conditional_cache_control(request)
+            patch_cache_control(response, **cache_control)
+            patch_vary_headers(response, ["Accept"] if cache_control.get("public") else ["Accept", "Authorization", "Cookie"])
+        return response
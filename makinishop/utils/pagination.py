@@ -0,0 +1,115 @@
+"""
+Keyset (cursor) pagination for MakiniShop list endpoints
+- Opt-in per request: ``?pagination=cursor`` for the first page, then follow ``next``
+- Cursors encode the last row's ``(timestamp, id)``; the next page is a range
+  scan on a matching composite index, never an ``OFFSET``
+- No ``COUNT(*)``: ``next`` is null on the last page
+Requests without either parameter keep the default ``PageNumberPagination``.
+Endpoints that historically returned a bare list take ``?pagination=page``.
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+MODE_PARAM = "pagination"
+PAGE_MODE = "page"
+CURSOR_PARAM = "cursor"
+PAGE_SIZE_PARAM = "page_size"
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(timestamp, pk):
+    raw = json.dumps([timestamp.isoformat(), pk], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        timestamp, pk = json.loads(raw)
+        timestamp = parse_datetime(timestamp)
+        if timestamp is None or not isinstance(pk, int):
+            raise ValueError(token)
+    except (binascii.Error, ValueError, TypeError):
+        raise NotFound("Invalid cursor.")
+    return timestamp, pk
+
+
+class KeysetPagination(BasePagination):
+    """Newest-first pages over ``(field, id)``; pair it with an index on those columns."""
+
+    def __init__(self, field="created_at"):
+        self.field = field
+        self.page_size = getattr(settings, "REST_FRAMEWORK", {}).get("PAGE_SIZE") or 20
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[PAGE_SIZE_PARAM])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, MAX_PAGE_SIZE))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(f"-{self.field}", "-pk")
+        token = request.query_params.get(CURSOR_PARAM)
+        if token:
+            timestamp, pk = decode_cursor(token)
+            # "field <= t AND NOT (field = t AND pk >= id)" keeps a plain range
+            # condition on the leading column, so the index scan starts at the cursor.
+            queryset = queryset.filter(**{f"{self.field}__lte": timestamp}).exclude(
+                **{self.field: timestamp, "pk__gte": pk}
+            )
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, MODE_PARAM)
+        return replace_query_param(url, CURSOR_PARAM, encode_cursor(getattr(last, self.field), last.pk))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([("next", self.get_next_link()), ("results", data)]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class KeysetPaginationMixin:
+    """Let list views switch to ``KeysetPagination`` when the client asks for it."""
+
+    keyset_field = "created_at"
+
+    def wants_keyset_pagination(self):
+        params = self.request.query_params
+        return params.get(MODE_PARAM) == "cursor" or CURSOR_PARAM in params
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            if getattr(self, "request", None) is not None and self.wants_keyset_pagination():
+                self._paginator = KeysetPagination(self.keyset_field)
+            else:
+                return super().paginator
+        return self._paginator
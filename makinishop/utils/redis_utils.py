@@ -0,0 +1,21 @@
+"""
+Direct Redis access for MakiniShop
+- For features that need Redis data structures (hashes, sorted sets, pub/sub)
+  rather than plain cache values
+- The backend is detected from ``CACHES``, never from a connection attempt:
+  django_redis clients connect lazily, so a missing server only shows up as
+  errors on the first command, which callers handle themselves
+"""
+from django.core.cache import caches
+
+
+def get_redis(alias="default"):
+    """Raw client behind ``CACHES[alias]``, or ``None`` if that cache is not django_redis (e.g. tests)."""
+    try:
+        from django_redis import get_redis_connection
+        from django_redis.cache import RedisCache
+    except ImportError:
+        return None
+    if not isinstance(caches[alias], RedisCache):
+        return None
+    return get_redis_connection(alias)
@@ -0,0 +1,202 @@
+"""
+Two-tier cache for small, very hot values
+- Tier 1: bounded in-process LRU with per-entry TTL (no network round trip)
+- Tier 2: the shared ``django.core.cache`` backend (django_redis)
+- Invalidation fan-out over Redis pub/sub so every worker drops its copy
+- Per-tier hit counters for this process
+
+Only use it for values that are read far more often than written and where a
+short, bounded staleness is acceptable: if an invalidation message is lost
+(e.g. while a subscriber reconnects), the local TTL still caps how long a
+worker can serve the old value.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .redis_utils import get_redis
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCAL_CACHE = {
+    "MAXSIZE": 2048,
+    "TTL": 30,  # seconds an entry may live in a worker without revalidation
+    "CHANNEL": "cache:invalidate",
+}
+CLEAR_ALL = "*"
+_MISSING = object()
+
+
+def local_cache_settings():
+    return {**DEFAULT_LOCAL_CACHE, **getattr(settings, "LOCAL_CACHE", {})}
+
+
+class LRUCache:
+    """Thread-safe LRU map whose entries also expire after a TTL."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # Moves on every delete/clear, so a read that started before an
+        # invalidation can tell its value may already be stale.
+        self.generation = 0
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, generation=None):
+        """Store ``value``; with ``generation``, only if nothing was invalidated since it was read."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self.generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.generation += 1
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierCache:
+    def __init__(self, maxsize=None, ttl=None, channel=None):
+        conf = local_cache_settings()
+        self.local = LRUCache(maxsize or conf["MAXSIZE"])
+        self.ttl = ttl or conf["TTL"]
+        self.channel = channel or conf["CHANNEL"]
+        self.counters = {"local": 0, "remote": 0, "miss": 0}
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+
+    # -- reads ----------------------------------------------------------
+    def get(self, key, default=None, local_ttl=None):
+        self._ensure_listener()
+        value = self.local.get(key)
+        if value is not _MISSING:
+            self.counters["local"] += 1
+            return value
+        generation = self.local.generation
+        value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            self.counters["miss"] += 1
+            return default
+        self.counters["remote"] += 1
+        # An invalidation that arrived during the remote read wins: serve this
+        # value once but do not keep it for the local TTL.
+        self.local.set(key, value, local_ttl or self.ttl, generation=generation)
+        return value
+
+    def peek(self, key):
+        """Local tier only; ``None`` when this worker holds no copy."""
+        self._ensure_listener()
+        value = self.local.get(key, None)
+        if value is not None:
+            self.counters["local"] += 1
+        return value
+
+    def remember(self, key, value, local_ttl=None):
+        """Keep a copy of a value already stored in the shared tier."""
+        self.local.set(key, value, local_ttl or self.ttl)
+
+    def get_or_set(self, key, compute, timeout, local_ttl=None):
+        value = self.get(key, _MISSING, local_ttl=local_ttl)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value, timeout, local_ttl=local_ttl)
+        return value
+
+    # -- writes ---------------------------------------------------------
+    def set(self, key, value, timeout, local_ttl=None):
+        cache.set(key, value, timeout)
+        self.local.set(key, value, min(local_ttl or self.ttl, timeout or self.ttl))
+
+    def delete(self, key):
+        cache.delete(key)
+        self.invalidate(key)
+
+    def invalidate(self, key=CLEAR_ALL):
+        """Drop ``key`` (or everything) from the local tier of every worker.
+
+        Call it after changing the shared value by other means, e.g. ``cache.incr``.
+        """
+        self._drop(key)
+        # Without Redis (e.g. tests) only this process is told; local TTLs still apply.
+        connection = get_redis()
+        if connection is not None:
+            try:
+                connection.publish(self.channel, key)
+            except Exception as exc:
+                logger.warning(f"Local cache invalidation for {key} not published: {exc}")
+
+    def _drop(self, key):
+        if key == CLEAR_ALL:
+            self.local.clear()
+        else:
+            self.local.delete(key)
+
+    # -- pub/sub --------------------------------------------------------
+    def _ensure_listener(self):
+        # One subscriber thread per process; re-created after a fork.
+        if self._listener_pid == os.getpid():
+            return
+        with self._listener_lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self.local.clear()
+            connection = get_redis()
+            if connection is not None:
+                threading.Thread(target=self._listen, args=(connection,), daemon=True, name="cache-invalidation").start()
+
+    def _listen(self, connection):
+        while True:
+            try:
+                pubsub = connection.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Anything may have changed while we were not subscribed.
+                self.local.clear()
+                for message in pubsub.listen():
+                    key = message["data"]
+                    self._drop(key.decode() if isinstance(key, bytes) else key)
+            except Exception as exc:
+                logger.warning(f"Local cache invalidation listener reconnecting: {exc}")
+                time.sleep(1)
+
+    # -- metrics --------------------------------------------------------
+    def stats(self):
+        total = sum(self.counters.values())
+        return {
+            "pid": os.getpid(),
+            "local_entries": len(self.local),
+            **self.counters,
+            "local_hit_ratio": round(self.counters["local"] / total, 4) if total else None,
+            "remote_hit_ratio": round(self.counters["remote"] / total, 4) if total else None,
+        }
+
+
+local_cache = TwoTierCache()